@@ -0,0 +1,145 @@
+"""
+Benchmark and golden-corpus check for services/ingredientParser.py
+
+Usage (from the server folder):
+    python benchmarks/bench_ingredient_parser.py            # timings
+    python benchmarks/bench_ingredient_parser.py --check    # golden diff
+
+The corpus has two parts, and neither is generated from the parser's own
+output:
+- data/ingredient_golden.jsonl: about 80 real ingredient lines in the
+  shapes GPT and users actually write (mixed numbers, unicode fractions,
+  ranges, word quantities, size notes, trailing preparation notes), each
+  with a hand-checked expected parse. Add lines here by hand.
+- data/ingredient_composed.jsonl: about 3000 lines built by
+  compose_ingredient_corpus.py from reviewed tables of quantity forms, unit
+  spellings, names and notes, each table row carrying its expected value.
+  These lines are combinations, not recipes copied from the wild: a
+  corpus of a few thousand individually checked real lines was not
+  practical to assemble, and the combinations exercise every row of the
+  parser's tables against an independent expectation instead.
+--check exits non-zero on any difference so it can gate parser changes.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from fractions import Fraction
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ingredientParser import (  # noqa: E402
+    parse_ingredient_string, parse_ingredient_lines
+)
+
+GOLDEN_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data",
+    "ingredient_golden.jsonl"
+)
+COMPOSED_PATH = os.path.join(
+    os.path.dirname(GOLDEN_PATH), "ingredient_composed.jsonl"
+)
+
+
+# The parser this module replaced, kept only as a timing baseline
+def legacy_parse_ingredient_string(s: str) -> dict:
+    if "to taste" in s.lower():
+        name = s.lower().replace("to taste", "").strip() or "Seasoning"
+        return {"name": name.title(), "quantity": 0.0, "unit": "to taste"}
+
+    parts = s.replace(",", "").split()
+    quantity = float(Fraction(parts[0]))
+    unit = parts[1].lower()
+    name = " ".join(parts[2:])
+
+    known_units = {
+        "tsp", "tbsp", "cups", "cup", "cloves", "pieces", "grams",
+        "ml", "oz", "pint", "liters", "lb", "kg"
+    }
+    if unit not in known_units:
+        name = " ".join([unit] + parts[2:])
+        unit = "units"
+    else:
+        modifiers = {"chopped", "minced", "diced", "grated", "sliced"}
+        tokens = name.split()
+        if tokens and tokens[-1] in modifiers:
+            tokens.pop()
+        name = " ".join(tokens).title()
+
+    return {"name": name, "quantity": quantity, "unit": unit}
+
+
+def load_golden():
+    entries = []
+    for path in (GOLDEN_PATH, COMPOSED_PATH):
+        with open(path, encoding="utf-8") as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    return entries
+
+
+def legacy_batch(lines):
+    out = []
+    for line in lines:
+        try:
+            out.append(legacy_parse_ingredient_string(line))
+        except Exception:
+            out.append(None)
+    return out
+
+
+def run_benchmark(lines, repeat: int) -> None:
+    n = len(lines)
+    # Lines the legacy parser can handle, for a like-for-like comparison
+    simple = [x for x, r in zip(lines, legacy_batch(lines)) if r is not None]
+    print(f"corpus: {n} lines ({len(simple)} legacy-parseable), "
+          f"best of {repeat}")
+    for label, fn, count in (
+        ("legacy batch", lambda: legacy_batch(lines), n),
+        ("legacy simple", lambda: legacy_batch(simple), len(simple)),
+        ("new simple", lambda: parse_ingredient_lines(simple), len(simple)),
+        ("new per-line",
+         lambda: [parse_ingredient_string(x) for x in lines], n),
+        ("new batch", lambda: parse_ingredient_lines(lines), n),
+    ):
+        try:
+            best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        except Exception as e:
+            print(f"  {label:<16} failed: {e!r}")
+            continue
+        print(f"  {label:<16} {best * 1e6 / count:8.2f} us/line")
+
+    legacy_dropped = sum(r is None for r in legacy_batch(lines))
+    new_dropped = sum(r is None for r in parse_ingredient_lines(lines))
+    print(f"  dropped lines: legacy {legacy_dropped}, new {new_dropped}")
+
+
+def run_check(golden) -> int:
+    lines = [g["line"] for g in golden]
+    failures = 0
+    for g, got in zip(golden, parse_ingredient_lines(lines)):
+        if got != g["expected"]:
+            failures += 1
+            if failures <= 20:
+                print(f"MISMATCH {g['line']!r}\n  expected {g['expected']}"
+                      f"\n  got      {got}")
+    print(f"{len(golden) - failures}/{len(golden)} lines match the golden "
+          "corpus")
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    golden = load_golden()
+    if args.check:
+        return run_check(golden)
+    run_benchmark([g["line"] for g in golden], args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Benchmark of the GET /recipes serialization path
+
+Compares, for pages of 10, 100 and 1000 recipe documents:
+- legacy: the per-doc fix-up loop, RecipeOut.from_mongo(...).model_dump(),
+  then FastAPI's response_model validation and json.dumps (what the route
+  did before serialization.py)
+- trusted: models/recipe.recipe_out_dict and the orjson FastJSONResponse
+
+Only serialization is timed; the documents are built in memory, shaped like
+the ones the API writes (canonical ingredient fields, naive UTC datetimes
+as Motor returns them). --check also asserts both paths produce the same
+JSON.
+
+Usage (from the server folder):
+    python benchmarks/bench_list_recipes.py
+    python benchmarks/bench_list_recipes.py --check
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from typing import List, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from models.recipe import (  # noqa: E402
+    RecipeOut, RecipeSummary, recipe_out_dict
+)
+from serialization import FastJSONResponse  # noqa: E402
+from services.units import canonicalize_ingredients  # noqa: E402
+
+SIZES = (10, 100, 1000)
+
+RESPONSE_FIELD = create_response_field(
+    name="response", type_=List[Union[RecipeOut, RecipeSummary]]
+)
+
+
+def make_docs(n: int) -> List[dict]:
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    docs = []
+    for i in range(n):
+        created = start + timedelta(minutes=i, milliseconds=i % 1000)
+        docs.append({
+            "_id": ObjectId(),
+            "title": f"Recipe {i}",
+            "description": "A weeknight dinner " * 4,
+            "ingredients": canonicalize_ingredients([
+                {"name": f"Ingredient {j}", "quantity": float(j + 1),
+                 "unit": ("cup", "g", "tbsp", "each")[j % 4]}
+                for j in range(10)
+            ]),
+            "steps": [f"Step {j}: do the next thing." for j in range(8)],
+            "prep_time": 10,
+            "cook_time": 25,
+            "servings": 4,
+            "image_url": (None if i % 3 else
+                          f"https://img.example.com/r/{i}.jpg"),
+            "user_id": "bench-user",
+            "created_at": created,
+            "updated_at": created,
+        })
+    return docs
+
+
+async def legacy(docs: List[dict]) -> bytes:
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+        if doc.get("image_url") in [None, "None", "null"]:
+            doc["image_url"] = None
+        for ing in doc.get("ingredients", []):
+            ing["quantity"] = float(ing["quantity"])
+    content = [
+        RecipeOut.from_mongo(doc).model_dump(by_alias=True, mode="json")
+        for doc in docs
+    ]
+    content = await serialize_response(
+        field=RESPONSE_FIELD, response_content=content,
+        exclude_unset=True, is_coroutine=True,
+    )
+    return JSONResponse(content).body
+
+
+def trusted(docs: List[dict]) -> bytes:
+    return FastJSONResponse([recipe_out_dict(doc) for doc in docs]).body
+
+
+def _run(coro):
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("legacy path awaited real I/O")
+
+
+def check() -> None:
+    docs = make_docs(50)
+    old = json.loads(_run(legacy(copy.deepcopy(docs))))
+    new = json.loads(trusted(copy.deepcopy(docs)))
+    if old != new:
+        for a, b in zip(old, new):
+            if a != b:
+                print("legacy :", a)
+                print("trusted:", b)
+                break
+        sys.exit("trusted path output differs from legacy")
+    print(f"ok: {len(new)} recipes serialize identically")
+
+
+def bench() -> None:
+    print(f"{'recipes':>8} {'legacy ms':>10} {'trusted ms':>11} "
+          f"{'speedup':>8}")
+    for n in SIZES:
+        docs = make_docs(n)
+        number = max(1, 2000 // n)
+        # Each run gets a fresh copy: the legacy path mutates documents
+        copies = [copy.deepcopy(docs) for _ in range(2 * number)]
+        old = timeit.timeit(
+            lambda: _run(legacy(copies.pop())), number=number
+        ) / number
+        new = timeit.timeit(
+            lambda: trusted(copies.pop()), number=number
+        ) / number
+        print(f"{n:>8} {old * 1000:>10.3f} {new * 1000:>11.3f} "
+              f"{old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--check", action="store_true",
+                        help="compare outputs instead of timing")
+    args = parser.parse_args()
+    check() if args.check else bench()
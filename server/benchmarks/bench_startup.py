@@ -0,0 +1,126 @@
+"""
+Startup profile: what a cold start spends importing and building
+
+Runs `import main` in fresh interpreters (as a new Cloud Run instance
+does) and reports:
+- the median wall time of the import
+- the slowest modules main imports directly, by cumulative import time
+- the slowest third-party packages, by their own import time
+- what is deferred to first use: the OpenAPI schema (built vs loaded from
+  an exported file) and the LLM client (importing openai and building it)
+
+Nothing connects to Mongo, Firebase or OpenAI.
+
+Usage (from the server folder):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Timed inside the child so module caches start cold
+LAZY_PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.app.openapi_schema = None
+main.custom_openapi()
+built = time.perf_counter()
+path = sys.argv[1]
+with open(path, "w") as f:
+    json.dump(main.app.openapi_schema, f)
+main.app.openapi_schema = None
+main.OPENAPI_SCHEMA_FILE = path
+loaded_start = time.perf_counter()
+main.custom_openapi()
+loaded = time.perf_counter()
+from services import gptClient
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+client_start = time.perf_counter()
+gptClient.get_client()
+client = time.perf_counter()
+print(json.dumps({
+    "import main": imported - start,
+    "openapi build": built - imported,
+    "openapi load": loaded - loaded_start,
+    "llm client": client - client_start,
+}))
+"""
+
+
+def _child_env() -> dict:
+    env = dict(os.environ)
+    env.pop("OPENAPI_SCHEMA_FILE", None)
+    return env
+
+
+# -X importtime lines: "import time: self | cumulative | <indent>name"
+def import_times() -> List[Tuple[int, int, str, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         "import main"],
+        cwd=SERVER_DIR, env=_child_env(), capture_output=True, text=True,
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), name.strip(), depth))
+    return rows
+
+
+def lazy_costs() -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run(
+            [sys.executable, "-c", LAZY_PROBE,
+             os.path.join(tmp, "openapi.json")],
+            cwd=SERVER_DIR, env=_child_env(), capture_output=True,
+            text=True, check=True,
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(runs: int, top: int) -> None:
+    samples = [lazy_costs() for _ in range(runs)]
+    print(f"median of {runs} cold runs (ms)")
+    for key in samples[0]:
+        median = statistics.median(s[key] for s in samples)
+        print(f"  {key:<16} {median * 1000:>9.1f}")
+
+    rows = import_times()
+    direct = [r for r in rows if r[3] == 1]
+    print("\nslowest direct imports of main (cumulative ms)")
+    for _, cumulative, name, _ in sorted(direct, key=lambda r: -r[1])[:top]:
+        print(f"  {name:<40} {cumulative / 1000:>9.1f}")
+
+    local = {name.split(".")[0] for name in os.listdir(SERVER_DIR)}
+    packages: Dict[str, int] = defaultdict(int)
+    for self_us, _, name, _ in rows:
+        package = name.split(".")[0]
+        if package not in local:
+            packages[package] += self_us
+    print("\nslowest packages (own import time, ms)")
+    for package, self_us in sorted(packages.items(),
+                                   key=lambda p: -p[1])[:top]:
+        print(f"  {package:<40} {self_us / 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    report(args.runs, args.top)
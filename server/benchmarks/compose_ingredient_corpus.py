@@ -0,0 +1,140 @@
+"""
+Compose the large ingredient corpus from reviewed tables
+
+data/ingredient_golden.jsonl holds real ingredient lines checked one by one;
+it is too small on its own to catch a regression in one row of the parser's
+tables. This script writes data/ingredient_composed.jsonl: a few thousand
+lines combining the quantity forms, unit spellings, names and trailing notes
+below. Every table row carries the value a person expects for that part
+("1 1/2" -> 1.5, "Tbsp" -> "tbsp", "fresh basil" -> "Basil"), so each line's
+expected parse is assembled from the tables, never from the parser's own
+output. Review a table change like any other golden data.
+
+Usage (from the server folder):
+    python benchmarks/compose_ingredient_corpus.py
+"""
+import itertools
+import json
+import os
+import random
+
+COMPOSED_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data",
+    "ingredient_composed.jsonl"
+)
+SEED = 2024
+SIZE = 3000
+
+# (as written, quantity)
+QUANTITIES = [
+    ("1", 1.0), ("2", 2.0), ("12", 12.0), ("250", 250.0),
+    ("1/2", 0.5), ("3/4", 0.75), ("1 1/2", 1.5), ("2 1/4", 2.25),
+    ("½", 0.5), ("¼", 0.25), ("1½", 1.5), ("1 ½", 1.5),
+    ("0.25", 0.25), ("1.5", 1.5), (".5", 0.5),
+    ("2-3", 3.0), ("2 - 3", 3.0), ("2 to 3", 3.0), ("1–2", 2.0),
+    ("1-1/2", 1.5),
+    ("a", 1.0), ("an", 1.0), ("one", 1.0), ("two", 2.0), ("Three", 3.0),
+    ("half", 0.5), ("a couple of", 2.0), ("a few", 3.0),
+]
+
+# (as written, canonical unit); None writes no unit
+UNITS = [
+    ("cups", "cup"), ("cup", "cup"), ("Cups", "cup"), ("c.", "cup"),
+    ("c", "cup"),
+    ("tablespoons", "tbsp"), ("tbsp", "tbsp"), ("Tbsp", "tbsp"),
+    ("TBSP", "tbsp"), ("tbsp.", "tbsp"), ("tbs", "tbsp"), ("T", "tbsp"),
+    ("T.", "tbsp"),
+    ("teaspoons", "tsp"), ("tsp", "tsp"), ("tsp.", "tsp"), ("t", "tsp"),
+    ("t.", "tsp"),
+    ("g", "g"), ("grams", "g"), ("kg", "kg"), ("oz", "oz"), ("oz.", "oz"),
+    ("ounces", "oz"), ("lb", "lb"), ("lbs", "lb"), ("pounds", "lb"),
+    ("ml", "ml"), ("milliliters", "ml"), ("l", "l"), ("liters", "l"),
+    ("fl oz", "fl oz"), ("fluid ounces", "fl oz"),
+    ("cloves", "clove"), ("cans", "can"), ("can", "can"),
+    ("pinch", "pinch"), ("dash", "dash"), ("slices", "slice"),
+    ("sticks", "stick"), ("sprigs", "sprig"), ("bunch", "bunch"),
+    ("jar", "jar"), ("packages", "package"), ("pints", "pint"),
+    ("quarts", "quart"), ("whole", "units"),
+    (None, "units"),
+]
+
+# (as written, name); leading and trailing preparation words are dropped
+# and the rest is title-cased
+NAMES = [
+    ("all-purpose flour", "All-Purpose Flour"),
+    ("granulated sugar", "Granulated Sugar"),
+    ("brown sugar, packed", "Brown Sugar"),
+    ("unsalted butter", "Unsalted Butter"),
+    ("butter, softened", "Butter"),
+    ("skim milk", "Skim Milk"),
+    ("heavy cream", "Heavy Cream"),
+    ("olive oil", "Olive Oil"),
+    ("extra-virgin olive oil", "Extra-Virgin Olive Oil"),
+    ("garlic, minced", "Garlic"),
+    ("minced garlic", "Garlic"),
+    ("yellow onion, diced", "Yellow Onion"),
+    ("large eggs", "Eggs"),
+    ("eggs, beaten", "Eggs"),
+    ("fresh basil", "Basil"),
+    ("fresh parsley, finely chopped", "Parsley"),
+    ("grated parmesan", "Parmesan"),
+    ("shredded mozzarella cheese", "Mozzarella Cheese"),
+    ("chicken breast", "Chicken Breast"),
+    ("ground beef", "Ground Beef"),
+    ("black beans, drained and rinsed", "Black Beans"),
+    ("diced tomatoes", "Tomatoes"),
+    ("cherry tomatoes, halved", "Cherry Tomatoes"),
+    ("baby spinach", "Baby Spinach"),
+    ("carrots, peeled and sliced", "Carrots"),
+    ("russet potatoes, peeled", "Russet Potatoes"),
+    ("soy sauce", "Soy Sauce"),
+    ("Dijon mustard", "Dijon Mustard"),
+    ("vanilla extract", "Vanilla Extract"),
+    ("baking powder", "Baking Powder"),
+    ("ground cumin", "Ground Cumin"),
+    ("kosher salt", "Kosher Salt"),
+    ("Lemon Juice", "Lemon Juice"),
+    ("chicken stock", "Chicken Stock"),
+    ("rolled oats", "Rolled Oats"),
+    ("jalapeño, seeded", "Jalapeño"),
+]
+
+# Trailing text that never changes the parse
+NOTES = ["", ", divided", " (optional)", ", or more as needed",
+         " (see note)", ", at room temperature"]
+
+BULLETS = ["", "- ", "* ", "• ", "1. ", "3) "]
+
+
+def compose(size: int = SIZE, seed: int = SEED):
+    rng = random.Random(seed)
+    combos = list(itertools.product(QUANTITIES, UNITS, NAMES))
+    entries = []
+    for (qty_text, qty), (unit_text, unit), (name_text, name) in rng.sample(
+        combos, size
+    ):
+        parts = [qty_text, unit_text, name_text]
+        line = " ".join(p for p in parts if p is not None)
+        line = rng.choice(BULLETS) + line + rng.choice(NOTES)
+        entries.append({"line": line, "expected": {
+            "name": name, "quantity": qty, "unit": unit,
+        }})
+    # "to taste" lines, with and without a comma
+    for i, (name_text, name) in enumerate(NAMES):
+        sep = ", " if i % 2 else " "
+        entries.append({"line": f"{name_text.split(',')[0]}{sep}to taste",
+                        "expected": {"name": name, "quantity": 0.0,
+                                     "unit": "to taste"}})
+    return entries
+
+
+def main() -> None:
+    entries = compose()
+    with open(COMPOSED_PATH, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    print(f"wrote {len(entries)} composed entries")
+
+
+if __name__ == "__main__":
+    main()
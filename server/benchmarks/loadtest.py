@@ -0,0 +1,555 @@
+"""
+Offline load test: main.app under a mixed traffic load, no network needed
+
+Boots main.app (lifespan included) in this process with local stand-ins:
+- Mongo: a mongomock-motor database, handed to db.py before startup
+- Firebase: an RSA key made at startup, served to token_verifier as its
+  signing certificate; every virtual user gets an ID token signed with it
+- OpenAI: FakeLLM, shaped like AsyncOpenAI, answering with a recipe after
+  --llm-latency seconds plus one second per --llm-tokens-per-second
+  completion tokens (streamed replies arrive at that rate too)
+
+--users virtual users, each with its own uid and pantry, send requests
+back to back for --duration seconds through httpx's ASGI transport. Each
+request is an operation drawn from the weighted --mix (see MIX). Results
+are reported per operation: throughput, p50/p95/p99 latency, non-2xx
+responses and Mongo round trips per request (X-DB-Round-Trips).
+
+Rate limits are off unless --rate-limits is given, so the numbers measure
+the service rather than the per-user budgets. Client and server share one
+event loop, so absolute numbers are only comparable on the same machine;
+save a baseline there and compare later runs against it.
+
+Needs mongomock-motor and httpx (pip install -r requirements-dev.txt);
+nothing connects to Atlas, Firebase or OpenAI.
+
+Usage (from the server folder):
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --users 100 --duration 30
+    python benchmarks/loadtest.py --mix list_ingredients=5,generate=1
+    python benchmarks/loadtest.py --save       # write the baseline
+    python benchmarks/loadtest.py --compare    # exit 1 on a regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+BASELINE_FILE = os.path.join(SERVER_DIR, "benchmarks", "data",
+                             "loadtest_baseline.json")
+PROJECT_ID = "homespice-loadtest"
+SIGNING_KID = "loadtest-key"
+
+# Operation -> default weight
+MIX = {
+    "list_ingredients": 30,
+    "add_ingredient": 8,
+    "update_ingredient": 4,
+    "list_recipes": 20,
+    "list_recipe_titles": 10,
+    "get_recipe": 15,
+    "create_recipe": 4,
+    "generate": 6,
+    "generate_stream": 3,
+}
+
+PANTRY_NAMES = [
+    "rice", "eggs", "onion", "garlic", "tomato", "chicken breast",
+    "spinach", "olive oil", "butter", "milk", "flour", "potato", "carrot",
+    "bell pepper", "black beans", "cheddar", "lemon", "ginger",
+    "soy sauce", "pasta",
+]
+UNITS = ["cup", "g", "tbsp", "whole", "ml", "oz"]
+
+
+# --- Stand-ins ---
+
+class FakeLLM:
+    """AsyncOpenAI-shaped client: chat.completions.create(...)."""
+
+    def __init__(self, latency: float, tokens_per_second: float):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    # A recipe built from the first pantry lines of the prompt, so the
+    # route keeps its ingredients
+    @staticmethod
+    def reply(prompt: str) -> str:
+        names = [n for n in PANTRY_NAMES if n in prompt][:6] or ["rice"]
+        return json.dumps({
+            "title": f"Skillet {names[0]}",
+            "description": "A quick one-pan dinner from the pantry.",
+            "ingredients": [
+                {"name": n, "quantity": 1, "unit": "cup"} for n in names
+            ],
+            "steps": [f"Step {i}: keep cooking." for i in range(1, 7)],
+            "prep_time": 10,
+            "cook_time": 20,
+            "servings": 2,
+            "image_url": None,
+        })
+
+    def _usage(self, prompt: str, content: str):
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+
+    async def create(self, messages, stream: bool = False, **kwargs):
+        self.calls += 1
+        prompt = messages[-1]["content"]
+        content = self.reply(prompt)
+        usage = self._usage(prompt, content)
+        if stream:
+            return self._stream(content, usage)
+        await asyncio.sleep(
+            self.latency + usage.completion_tokens / self.tokens_per_second
+        )
+        return SimpleNamespace(
+            choices=[SimpleNamespace(
+                message=SimpleNamespace(content=content)
+            )],
+            usage=usage,
+        )
+
+    # About 4 characters per token, 16 tokens per chunk; the last chunk
+    # carries usage and no choices, as with stream_options include_usage
+    async def _stream(self, content: str, usage):
+        await asyncio.sleep(self.latency)
+        step = 64
+        for start in range(0, len(content), step):
+            await asyncio.sleep(16 / self.tokens_per_second)
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(
+                    content=content[start:start + step]
+                ))],
+                usage=None,
+            )
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class LocalSigner:
+    """Signs Firebase-shaped ID tokens with a key made for this run."""
+
+    def __init__(self, project_id: str = PROJECT_ID):
+        from datetime import datetime, timedelta, timezone
+
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.x509.oid import NameOID
+
+        self.project_id = project_id
+        self._key = rsa.generate_private_key(public_exponent=65537,
+                                             key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME,
+                                             "loadtest")])
+        now = datetime.now(timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name)
+            .public_key(self._key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(days=1))
+            .not_valid_after(now + timedelta(days=1))
+            .sign(self._key, hashes.SHA256())
+        )
+        self.cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+
+    # Same shape as fetch_google_certs: ({kid: PEM}, max-age)
+    def fetch_certs(self) -> Tuple[Dict[str, str], int]:
+        return {SIGNING_KID: self.cert_pem}, 3600
+
+    # claims override the defaults (e.g. exp=... for an expired token)
+    def token(self, uid: str, kid: str = SIGNING_KID, **claims) -> str:
+        import jwt
+
+        now = int(time.time())
+        payload = {
+            "iss": "https://securetoken.google.com/" + self.project_id,
+            "aud": self.project_id, "sub": uid, "iat": now,
+            "auth_time": now, "exp": now + 3600,
+        }
+        payload.update(claims)
+        return jwt.encode(payload, self._key, algorithm="RS256",
+                          headers={"kid": kid})
+
+
+# Settings are read at import, so this runs before main is imported
+def configure_env(args) -> None:
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["OPENAPI_SCHEMA_FILE"] = ""
+    if not args.rate_limits:
+        os.environ["RATE_LIMIT_GENERATE_PER_MINUTE"] = "0"
+        os.environ["RATE_LIMIT_CRUD_PER_MINUTE"] = "0"
+
+
+def install_stand_ins(args):
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("the load test needs mongomock-motor: "
+                 "pip install -r requirements-dev.txt")
+
+    import db
+    from services import gptClient
+    from services.tokenVerifier import SigningKeyCache, token_verifier
+
+    client = AsyncMongoMockClient()
+    db.client = client  # db.connect() in the lifespan reuses it
+    db.use_database(client["homespice_loadtest"])
+
+    signer = LocalSigner()
+    token_verifier._project_id = signer.project_id
+    token_verifier.keys = SigningKeyCache(fetch=signer.fetch_certs)
+
+    llm = FakeLLM(args.llm_latency, args.llm_tokens_per_second)
+    gptClient.client = llm
+    return db.db, signer, llm
+
+
+# --- Virtual users ---
+
+def pantry_item(rng: random.Random) -> dict:
+    return {"name": rng.choice(PANTRY_NAMES),
+            "quantity": rng.randint(1, 5), "unit": rng.choice(UNITS)}
+
+
+def recipe_body(rng: random.Random, n: int) -> dict:
+    names = rng.sample(PANTRY_NAMES, 8)
+    return {
+        "title": f"Saved recipe {n}",
+        "description": "Saved from a cookbook.",
+        "ingredients": [{"name": name, "quantity": rng.randint(1, 3),
+                         "unit": rng.choice(UNITS)} for name in names],
+        "steps": [f"Step {i}." for i in range(1, 9)],
+        "prep_time": 15, "cook_time": 30, "servings": 4,
+    }
+
+
+class VirtualUser:
+    def __init__(self, uid: str, token: str, rng: random.Random):
+        self.uid = uid
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.rng = rng
+        self.ingredients: List[dict] = []   # as the API returned them
+        self.recipe_ids: List[str] = []
+        self.etag: Optional[str] = None
+
+    def pantry(self) -> List[dict]:
+        return [{k: i[k] for k in ("name", "quantity", "unit")}
+                for i in self.ingredients]
+
+    async def seed(self, client, ingredients: int, recipes: int) -> None:
+        for _ in range(ingredients):
+            r = await client.post("/ingredients/", headers=self.headers,
+                                  json=pantry_item(self.rng))
+            r.raise_for_status()
+            self.ingredients.append(r.json())
+        for n in range(recipes):
+            r = await client.post("/recipes/", headers=self.headers,
+                                  json=recipe_body(self.rng, n))
+            r.raise_for_status()
+            self.recipe_ids.append(r.json()["id"])
+
+    # Each operation returns the response it timed
+
+    async def list_ingredients(self, client):
+        headers = dict(self.headers)
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        r = await client.get("/ingredients/", headers=headers)
+        if r.status_code == 200:
+            self.ingredients = r.json()
+            self.etag = r.headers.get("etag")
+        return r
+
+    async def add_ingredient(self, client):
+        r = await client.post("/ingredients/", headers=self.headers,
+                              json=pantry_item(self.rng))
+        if r.status_code == 200:
+            self.ingredients.append(r.json())
+        return r
+
+    async def update_ingredient(self, client):
+        if not self.ingredients:
+            return await self.add_ingredient(client)
+        item = self.rng.choice(self.ingredients)
+        body = {"name": item["name"], "quantity": self.rng.randint(1, 5),
+                "unit": item["unit"]}
+        return await client.put(f"/ingredients/{item['_id']}",
+                                headers=self.headers, json=body)
+
+    async def list_recipes(self, client):
+        return await client.get("/recipes/", headers=self.headers,
+                                params={"limit": 20})
+
+    async def list_recipe_titles(self, client):
+        return await client.get(
+            "/recipes/", headers=self.headers,
+            params={"limit": 50, "fields": "title,image_url"},
+        )
+
+    async def get_recipe(self, client):
+        if not self.recipe_ids:
+            return await self.list_recipes(client)
+        recipe_id = self.rng.choice(self.recipe_ids)
+        return await client.get(f"/recipes/{recipe_id}",
+                                headers=self.headers)
+
+    async def create_recipe(self, client):
+        r = await client.post("/recipes/", headers=self.headers,
+                              json=recipe_body(self.rng, 0))
+        if r.status_code == 201:
+            self.recipe_ids.append(r.json()["id"])
+        return r
+
+    async def generate(self, client):
+        r = await client.post("/recipes/generate", headers=self.headers,
+                              json={"ingredients": self.pantry()})
+        if r.status_code == 201:
+            self.recipe_ids.append(r.json()["id"])
+        return r
+
+    # Timed until the last event has been read
+    async def generate_stream(self, client):
+        async with client.stream(
+            "POST", "/recipes/generate/stream", headers=self.headers,
+            json={"ingredients": self.pantry()},
+        ) as r:
+            async for _ in r.aiter_bytes():
+                pass
+        return r
+
+
+# --- Driver ---
+
+def parse_mix(spec: Optional[str]) -> Dict[str, int]:
+    if not spec:
+        return dict(MIX)
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in MIX:
+            raise SystemExit(f"unknown operation {name!r}; "
+                             f"choose from {', '.join(MIX)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1,
+                      round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int],
+              round_trips: List[int], elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "rps": round(count / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "errors": sum(n for s, n in statuses.items() if s >= 400),
+        "statuses": {str(s): n for s, n in sorted(statuses.items())},
+        "db_round_trips": (round(sum(round_trips) / len(round_trips), 2)
+                           if round_trips else None),
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+
+    database, signer, llm = install_stand_ins(args)
+    import main
+
+    mix = parse_mix(args.mix)
+    ops, weights = list(mix), list(mix.values())
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    round_trips: Dict[str, List[int]] = defaultdict(list)
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://loadtest",
+                                     timeout=None) as client:
+            users = [
+                VirtualUser(f"loadtest-{n}", signer.token(f"loadtest-{n}"),
+                            random.Random(args.seed + n))
+                for n in range(args.users)
+            ]
+            await asyncio.gather(*(
+                u.seed(client, args.seed_ingredients, args.seed_recipes)
+                for u in users
+            ))
+            llm_calls_before = llm.calls
+
+            deadline = time.perf_counter() + args.duration
+
+            async def drive(user: VirtualUser) -> None:
+                while time.perf_counter() < deadline:
+                    op = user.rng.choices(ops, weights)[0]
+                    start = time.perf_counter()
+                    r = await getattr(user, op)(client)
+                    latencies[op].append(time.perf_counter() - start)
+                    statuses[op][r.status_code] += 1
+                    trips = r.headers.get("x-db-round-trips")
+                    if trips is not None:
+                        round_trips[op].append(int(trips))
+                    if args.think:
+                        await asyncio.sleep(
+                            user.rng.expovariate(1 / args.think)
+                        )
+
+            started = time.perf_counter()
+            await asyncio.gather(*(drive(u) for u in users))
+            elapsed = time.perf_counter() - started
+
+    every = defaultdict(int)
+    for op_statuses in statuses.values():
+        for s, n in op_statuses.items():
+            every[s] += n
+    return {
+        "config": {
+            "users": args.users, "duration": args.duration,
+            "think": args.think, "mix": mix,
+            "llm_latency": args.llm_latency,
+            "llm_tokens_per_second": args.llm_tokens_per_second,
+            "rate_limits": args.rate_limits,
+            "seed_ingredients": args.seed_ingredients,
+            "seed_recipes": args.seed_recipes,
+        },
+        "llm_calls": llm.calls - llm_calls_before,
+        "total": summarize(
+            [x for op in ops for x in latencies[op]], every,
+            [x for op in ops for x in round_trips[op]], elapsed,
+        ),
+        "operations": {
+            op: summarize(latencies[op], statuses[op], round_trips[op],
+                          elapsed)
+            for op in ops if latencies[op]
+        },
+    }
+
+
+# --- Reporting and baselines ---
+
+def print_report(result: dict) -> None:
+    cfg = result["config"]
+    print(f"{cfg['users']} users for {cfg['duration']}s, "
+          f"LLM {cfg['llm_latency']}s + {cfg['llm_tokens_per_second']} "
+          f"tokens/s, {result['llm_calls']} LLM calls")
+    print(f"{'operation':<20} {'requests':>8} {'req/s':>8} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'db rt':>6}")
+    rows = list(result["operations"].items()) + [("total", result["total"])]
+    for op, s in rows:
+        trips = "-" if s["db_round_trips"] is None else s["db_round_trips"]
+        print(f"{op:<20} {s['requests']:>8} {s['rps']:>8} {s['p50_ms']:>8} "
+              f"{s['p95_ms']:>8} {s['p99_ms']:>8} {s['errors']:>6} "
+              f"{trips:>6}")
+    errors = {op: s["statuses"] for op, s in rows if s["errors"]}
+    if errors:
+        print("\nnon-2xx responses by operation:", json.dumps(errors))
+
+
+# Latencies that grew, or throughput that fell, by more than `tolerance`
+# (a fraction) against the baseline
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    if baseline["config"] != result["config"]:
+        print("warning: baseline was recorded with a different config")
+    regressions = []
+    print(f"\n{'operation':<20} {'metric':<7} {'baseline':>9} "
+          f"{'now':>9} {'change':>8}")
+    ops = [("total", baseline["total"], result["total"])] + [
+        (op, s, result["operations"][op])
+        for op, s in baseline["operations"].items()
+        if op in result["operations"]
+    ]
+    for op, old, new in ops:
+        for metric, higher_is_worse in (("rps", False), ("p50_ms", True),
+                                        ("p95_ms", True), ("p99_ms", True)):
+            if not old[metric]:
+                continue
+            change = (new[metric] - old[metric]) / old[metric]
+            worse = change > tolerance if higher_is_worse else (
+                change < -tolerance
+            )
+            mark = "  <-" if worse else ""
+            print(f"{op:<20} {metric:<7} {old[metric]:>9} "
+                  f"{new[metric]:>9} {change:>+8.1%}{mark}")
+            if worse:
+                regressions.append(f"{op} {metric}")
+    return regressions
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20,
+                        help="seconds of load after seeding")
+    parser.add_argument("--think", type=float, default=0,
+                        help="mean pause between a user's requests (s)")
+    parser.add_argument("--mix", help="op=weight,... (default: MIX)")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=80)
+    parser.add_argument("--seed-ingredients", type=int, default=25)
+    parser.add_argument("--seed-recipes", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="keep the per-user rate limits on")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save", action="store_true",
+                        help="write this run as the baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="compare with the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed change before --compare fails")
+    parser.add_argument("--json", action="store_true",
+                        help="print the result as JSON")
+    args = parser.parse_args()
+
+    configure_env(args)
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nbaseline written to {args.baseline}")
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            sys.exit(f"\nregressed beyond {args.tolerance:.0%}: "
+                     + ", ".join(regressions))
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main_cli()
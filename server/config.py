@@ -0,0 +1,112 @@
+"""
+Settings for the HomeSpice API, loaded once
+
+Every tunable lives on Settings and is read from the environment variable
+of the same name in upper case (MONGO_MAX_POOL_SIZE -> mongo_max_pool_size),
+after .env has been loaded. get_settings() builds the object on first call
+and returns the same one afterwards; a bad value (e.g. LLM_DEADLINE=soon)
+fails at startup with the variable's name instead of on first use.
+
+Modules read their knobs from get_settings() at import; routes that want
+them per request take `settings: Settings = Depends(get_settings)`, which
+tests can replace through app.dependency_overrides.
+"""
+import os
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+class Settings(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    # Mongo (db.py); pool sizes are per process
+    mongodb_connect_string: Optional[str] = None
+    mongo_db_name: str = "homespice"
+    mongo_max_pool_size: int = Field(50, ge=1)
+    mongo_min_pool_size: int = Field(2, ge=0)
+    mongo_max_idle_time_ms: int = Field(300000, ge=0)
+    index_diagnostics: bool = False
+
+    # Firebase service-account key, relative to the server folder
+    firebase_key_file: str = "homespice-ae7aa-44106519bcde.json"
+
+    # LLM (services/gptClient.py, services/llmClient.py)
+    openai_api_key: Optional[str] = None
+    gpt_model: str = "gpt-3.5-turbo-1106"
+    gpt_temperature: float = Field(0.7, ge=0, le=2)
+    llm_deadline: float = Field(45, gt=0)
+    llm_max_retries: int = Field(2, ge=0)
+    llm_max_repairs: int = Field(1, ge=0)
+    llm_hedge_percentile: Optional[float] = Field(None, gt=0, lt=100)
+    llm_breaker_failures: int = Field(5, ge=1)
+    llm_breaker_reset: float = Field(30, ge=0)
+    prompt_ingredient_token_budget: int = Field(400, ge=1)
+
+    # Batch generation workers and the generation result cache
+    generation_concurrency: int = Field(4, ge=1)
+    generation_max_attempts: int = Field(4, ge=1)
+    generation_job_ttl: float = Field(3600, ge=0)
+    generation_cache_ttl: float = Field(300, ge=0)
+    generation_cache_size: int = Field(512, ge=0)
+
+    # Similar-recipe reuse for /recipes/generate (services/similarRecipes.py)
+    similar_min_coverage: float = Field(0.9, gt=0, le=1)
+    similar_index_size: int = Field(50000, ge=0)
+
+    # Admission control (services/rateLimit.py): per-user token buckets
+    # for LLM calls and for everything else, and a process-wide cap on
+    # interactive generations with a bounded wait queue
+    rate_limit_generate_per_minute: float = Field(10, ge=0)
+    rate_limit_generate_burst: int = Field(5, ge=1)
+    rate_limit_crud_per_minute: float = Field(300, ge=0)
+    rate_limit_crud_burst: int = Field(100, ge=1)
+    generation_max_concurrent: int = Field(8, ge=1)
+    generation_max_queue: int = Field(16, ge=0)
+    generation_queue_timeout: float = Field(10, ge=0)
+    generation_retry_after: float = Field(5, ge=1)
+
+    # Pantry snapshot cache (services/pantryCache.py)
+    pantry_cache_ttl: float = Field(5, ge=0)
+    pantry_cache_size: int = Field(10000, ge=0)
+
+    # Readiness probe (services/health.py)
+    readiness_cache_seconds: float = Field(5, ge=0)
+    readiness_check_timeout: float = Field(2, gt=0)
+
+    # Logging (log_config.py)
+    log_level: str = "INFO"
+    log_levels: str = ""
+    log_debug_sample_rate: float = Field(0.01, ge=0, le=1)
+
+    # Prebuilt OpenAPI schema (main.py)
+    openapi_schema_file: Optional[str] = None
+
+    # An empty variable (LLM_HEDGE_PERCENTILE=) means "not set"
+    @field_validator("*", mode="before")
+    @classmethod
+    def _empty_is_unset(cls, value, info):
+        if value == "" and cls.model_fields[info.field_name].default is None:
+            return None
+        return value
+
+    @field_validator("log_level")
+    @classmethod
+    def _upper(cls, value: str) -> str:
+        return value.upper()
+
+    @classmethod
+    def from_env(cls, environ=None) -> "Settings":
+        environ = os.environ if environ is None else environ
+        return cls(**{
+            name: environ[name.upper()]
+            for name in cls.model_fields if name.upper() in environ
+        })
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    load_dotenv()
+    return Settings.from_env()
@@ -1,17 +1,264 @@
-from dotenv import load_dotenv
-import os
+import threading
+from contextvars import ContextVar
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ReturnDocument, monitoring
 import certifi
 
-load_dotenv()
+from config import get_settings
+from services.metrics import span
 
-MONGO_URI = os.getenv("MONGODB_CONNECT_STRING")
-DB_NAME = os.getenv("MONGO_DB_NAME", "homespice")
+settings = get_settings()
+MONGO_URI = settings.mongodb_connect_string
+DB_NAME = settings.mongo_db_name
 
-client: AsyncIOMotorClient = AsyncIOMotorClient(MONGO_URI, tlsCAFile=certifi.
-                                                where())
-db: AsyncIOMotorDatabase = client[DB_NAME]
+# Connection pool sizing, per process
+MONGO_MAX_POOL_SIZE = settings.mongo_max_pool_size
+MONGO_MIN_POOL_SIZE = settings.mongo_min_pool_size
+MONGO_MAX_IDLE_TIME_MS = settings.mongo_max_idle_time_ms
 
+# The one client for this process; created by connect() in the FastAPI
+# lifespan (main.py) and closed by close() on shutdown
+client: Optional[AsyncIOMotorClient] = None
+db: Optional[AsyncIOMotorDatabase] = None
+counting_db: Optional["CountingDatabase"] = None  # what get_db() hands out
 
-def get_db() -> AsyncIOMotorDatabase:
+
+# Connection pool counters fed by pymongo's pool events. Events arrive on
+# pymongo's worker threads, hence the lock.
+class PoolStats(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.open = 0
+            self.checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg = (self.wait_seconds_total / self.checkouts
+                   if self.checkouts else 0.0)
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_ms_avg": round(avg * 1000, 3),
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+            }
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(0, self.open - 1)
+
+    def connection_checked_out(self, event):
+        # duration covers the whole checkout, including waiting for a
+        # free connection when the pool is at maxPoolSize
+        wait = getattr(event, "duration", 0.0) or 0.0
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    # Remaining pool events are not needed for these stats
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+
+pool_stats = PoolStats()
+
+
+async def connect(uri: Optional[str] = None, db_name: Optional[str] = None,
+                  warm: bool = True) -> AsyncIOMotorDatabase:
+    global client, db, counting_db
+    if client is not None:
+        return db
+    client = AsyncIOMotorClient(
+        uri or MONGO_URI,
+        tlsCAFile=certifi.where(),
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        event_listeners=[pool_stats],
+        # datetimes come back as UTC-aware, like the ones we write
+        tz_aware=True,
+    )
+    db = client[db_name or DB_NAME]
+    counting_db = CountingDatabase(db)
+    if warm:
+        # Opens the first connection (and server discovery) now instead of
+        # on the first request; minPoolSize fills the rest in the background
+        await db.command("ping")
     return db
+
+
+def close() -> None:
+    global client, db, counting_db
+    if client is not None:
+        client.close()
+    client = db = counting_db = None
+    pool_stats.reset()
+
+
+# Point the app at an existing database object (e.g. a mongomock-motor
+# database in tests) instead of connecting
+def use_database(database: AsyncIOMotorDatabase) -> None:
+    global db, counting_db
+    db = database
+    counting_db = CountingDatabase(database)
+
+
+def get_db() -> AsyncIOMotorDatabase:
+    if counting_db is None:
+        raise RuntimeError("Database is not connected; call db.connect()")
+    return counting_db
+
+
+# --- Round-trip accounting ---
+# Every awaited collection call made through get_db() counts as one round
+# trip for the current request and is timed as a mongo_<method> phase (see
+# services/metrics.py). The middleware in middleware.py starts a
+# counter per request and reports it in the X-DB-Round-Trips header, so
+# tests (e.g. against mongomock-motor) can assert how many calls a route
+# makes.
+
+class RoundTripCounter:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+
+_round_trips: ContextVar[Optional[RoundTripCounter]] = ContextVar(
+    "db_round_trips", default=None
+)
+
+
+def start_round_trip_count() -> RoundTripCounter:
+    counter = RoundTripCounter()
+    _round_trips.set(counter)
+    return counter
+
+
+def _count_round_trip() -> None:
+    counter = _round_trips.get()
+    if counter is not None:
+        counter.count += 1
+
+
+# Collection methods that each cost one server round trip when awaited
+COUNTED_METHODS = frozenset({
+    "insert_one", "insert_many", "find_one", "find_one_and_update",
+    "find_one_and_replace", "find_one_and_delete", "update_one",
+    "update_many", "replace_one", "delete_one", "delete_many", "bulk_write",
+    "count_documents", "estimated_document_count", "distinct",
+    "create_index", "create_indexes", "drop_index", "index_information",
+})
+CURSOR_METHODS = frozenset({"find", "aggregate", "list_indexes"})
+
+
+class _CountingCursor:
+    def __init__(self, cursor, phase: str):
+        self._cursor = cursor
+        self._phase = phase
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in ("sort", "limit", "skip", "batch_size", "hint"):
+            def chain(*args, **kwargs):
+                attr(*args, **kwargs)
+                return self
+            return chain
+        if name in ("to_list", "explain"):
+            async def counted(*args, **kwargs):
+                _count_round_trip()
+                with span(self._phase):
+                    return await attr(*args, **kwargs)
+            return counted
+        return attr
+
+    def __aiter__(self):
+        _count_round_trip()
+        return self._cursor.__aiter__()
+
+
+class CountingCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in COUNTED_METHODS:
+            async def counted(*args, **kwargs):
+                _count_round_trip()
+                with span(f"mongo_{name}"):
+                    return await attr(*args, **kwargs)
+            return counted
+        if name in CURSOR_METHODS:
+            def cursor(*args, **kwargs):
+                return _CountingCursor(
+                    attr(*args, **kwargs), f"mongo_{name}"
+                )
+            return cursor
+        return attr
+
+
+class CountingDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return CountingCollection(self._database[name])
+
+    def __getattr__(self, name):
+        if name == "command":
+            async def counted(*args, **kwargs):
+                _count_round_trip()
+                with span("mongo_command"):
+                    return await self._database.command(*args, **kwargs)
+            return counted
+        attr = getattr(self._database, name)
+        if hasattr(attr, "insert_one"):
+            return CountingCollection(attr)
+        return attr
+
+
+# --- Write helpers that avoid a read-after-write ---
+
+# Insert and return the document as stored, without re-reading it
+async def insert_returning(collection, doc: dict) -> dict:
+    result = await collection.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    return doc
+
+
+# Apply an update and return the updated document in the same round trip;
+# None when nothing matched the filter
+async def update_returning(collection, query: dict, update: dict):
+    return await collection.find_one_and_update(
+        query, update, return_document=ReturnDocument.AFTER
+    )
+
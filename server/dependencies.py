@@ -1,20 +1,52 @@
 
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from firebase_admin import auth as admin_auth
+
+from services.metrics import span
+from services.rateLimit import (
+    CRUD, GENERATE, RateLimitedError, rate_limiter, retry_after_header
+)
+from services.tokenVerifier import (
+    token_verifier, TokenVerificationError, SigningKeyError
+)
 
 bearer_scheme = HTTPBearer()
 
 
 # dependencies for the current user
 # extracts and verifies token from Firebase ID
+# verification is local and cached (see services/tokenVerifier.py), so
+# repeat calls with the same token do not block the event loop
 # returns verification
 async def get_current_user(
     creds: HTTPAuthorizationCredentials = Depends(bearer_scheme)
 ):
     try:
-        decoded = admin_auth.verify_id_token(creds.credentials)
-        return decoded
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired"
+        with span("token_verify"):
+            return await token_verifier.verify(creds.credentials)
+    except TokenVerificationError:
+        raise HTTPException(status_code=401, detail="Invalid or expired "
                             "authentication token")
+    except SigningKeyError:
+        raise HTTPException(status_code=503, detail="Authentication is "
+                            "temporarily unavailable")
+
+
+# Per-user rate limits (see services/rateLimit.py). Used as route or router
+# dependencies; get_current_user is resolved once per request, so the
+# token is not verified twice. 429 with Retry-After when over budget.
+def _rate_limit(policy):
+    async def check(current_user: dict = Depends(get_current_user)):
+        try:
+            rate_limiter.check(policy, current_user["uid"])
+        except RateLimitedError as e:
+            raise HTTPException(
+                status_code=429, detail="Too many requests",
+                headers=retry_after_header(e.retry_after),
+            )
+        return current_user
+    return check
+
+
+limit_crud = _rate_limit(CRUD)
+limit_generation = _rate_limit(GENERATE)
@@ -1,15 +1,21 @@
 
+import json
 import os
-import firebase_admin
-from firebase_admin import credentials
+from functools import lru_cache
+
+from config import get_settings
 
 # Exact filename of your JSON key in this folder (points to)
 # note that the filename MUST be precise to the json file
-# if you are using your own dashboard with FireBase replace .json file and
-# ensure json is under Server folder
-KEY_FILENAME = "homespice-ae7aa-44106519bcde.json"
+# if you are using your own dashboard with FireBase set FIREBASE_KEY_FILE
+# (or replace the .json file) and ensure json is under Server folder
+KEY_FILENAME = get_settings().firebase_key_file
 KEY_PATH = os.path.join(os.path.dirname(__file__), KEY_FILENAME)
 
-if not firebase_admin._apps:
-    cred = credentials.Certificate(KEY_PATH)
-    firebase_admin.initialize_app(cred)
+
+# Token verification (services/tokenVerifier.py) only needs the project
+# id from the service-account key, so no Firebase Admin app is built
+@lru_cache(maxsize=None)
+def project_id() -> str:
+    with open(KEY_PATH) as f:
+        return json.load(f)["project_id"]
@@ -0,0 +1,131 @@
+"""
+Logging setup for the HomeSpice API
+
+- Records are written as one JSON object per line (what Cloud Logging
+  ingests as structured logs), with the request id of the request that
+  produced them.
+- Handlers never block the event loop: the root logger only enqueues
+  records, and a QueueListener thread formats and writes them.
+- Levels are set per module logger, e.g.
+      LOG_LEVEL=INFO
+      LOG_LEVELS=routes.recipes=DEBUG,routes.ingredients=WARNING
+- Debug payload dumps (whole requests, GPT replies, documents) go through
+  debug_payload, which only builds them for a sampled fraction of requests
+  (LOG_DEBUG_SAMPLE_RATE, default 0.01) and only when DEBUG is enabled.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from config import get_settings
+
+LOG_LEVEL = get_settings().log_level
+LOG_LEVELS = get_settings().log_levels
+LOG_DEBUG_SAMPLE_RATE = get_settings().log_debug_sample_rate
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# LogRecord attributes that are not user-supplied extra fields
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None)))
+_RESERVED |= {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() formats the message on the calling thread; keep
+    # only the cheap parts here and leave JSON encoding to the listener
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+
+def _parse_levels(spec: str) -> dict:
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(
+        records, stream, respect_handler_level=False
+    )
+
+    handler = _EnqueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # flushes queued records
+        _listener = None
+
+
+# Log a large debug payload for a sampled fraction of calls. Pass a
+# zero-argument callable as build to defer constructing the payload until
+# we know it will be logged.
+def debug_payload(logger: logging.Logger, message: str, build) -> None:
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= LOG_DEBUG_SAMPLE_RATE:
+        return
+    logger.debug(message, extra={"payload": build()})
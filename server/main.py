@@ -1,18 +1,65 @@
-import firebase_init
-from firebase_admin import auth
-from fastapi import FastAPI, Depends
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from fastapi.openapi.utils import get_openapi
 
-from db import get_db
+import db
+from config import get_settings
+from log_config import setup_logging, shutdown_logging
+from pagination import NEXT_CURSOR_HEADER
+from middleware import (
+    REQUEST_ID_HEADER, MetricsMiddleware, RequestIdMiddleware,
+    RoundTripCounterMiddleware,
+)
+from services.indexes import ensure_indexes, explain_query_shapes, print_report
+from services.health import readiness_probe
+from services import metrics
+from services.generationJobs import generation_pool
+from services.similarRecipes import similar_index
+from services.tokenVerifier import token_verifier, SigningKeyError
 
 # Routers
 from routes.ingredients import router as ingredients_router
 from routes.authUser import router as auth_router
 from routes.userList import router as users_router
-from routes.recipes import router as recipes_router
-
-app = FastAPI(title="HomeSpice API")
+from routes.recipes import router as recipes_router, REUSED_FROM_HEADER
+
+logger = logging.getLogger(__name__)
+
+# Startup/shutdown hook: start the log listener, open (and warm) the single
+# Mongo connection pool, preload Firebase signing keys, make sure route
+# queries are backed by indexes and optionally report any query shape that
+# still scans the collection, then fill the similar-recipe index in the
+# background. On shutdown stop the batch generation workers, close the pool
+# and flush queued log records
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    database = await db.connect()
+    try:
+        # Load Firebase signing keys now so the first request skips it
+        await token_verifier.keys.refresh()
+    except SigningKeyError as e:
+        logger.warning("Firebase signing keys not loaded at startup: %s", e)
+    await ensure_indexes(database)
+    if get_settings().index_diagnostics:
+        print_report(await explain_query_shapes(database))
+    similar_index.start_loading(database)
+    try:
+        yield
+    finally:
+        await similar_index.stop()
+        await generation_pool.stop()
+        db.close()
+        shutdown_logging()
+
+
+app = FastAPI(title="HomeSpice API", lifespan=lifespan)
 
 # CORS config
 app.add_middleware(
@@ -22,7 +69,12 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, REQUEST_ID_HEADER, "ETag",
+                    REUSED_FROM_HEADER],
 )
+app.add_middleware(RoundTripCounterMiddleware)
+app.add_middleware(RequestIdMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 # Root endpoint
@@ -31,11 +83,33 @@ async def read_root():
     return {"message": "FastAPI + Motor server is running!"}
 
 
-# Health endpoint
+# Health endpoint (liveness plus connection pool stats)
 @app.get("/health", tags=["health"])
-async def health(db=Depends(get_db)):
+async def health():
+    return {"status": "ok", "mongo_pool": db.pool_stats.snapshot()}
+
+
+# Liveness: the process is up; touches no dependencies
+@app.get("/health/live", tags=["health"])
+async def health_live():
     return {"status": "ok"}
 
+
+# Readiness: Mongo, Firebase keys and the LLM client are usable.
+# Results are cached briefly (see services/health.py); 503 when not ready
+@app.get("/health/ready", tags=["health"])
+async def health_ready():
+    result = await readiness_probe.check()
+    status_code = 200 if result["status"] == "ready" else 503
+    return JSONResponse(result, status_code=status_code)
+
+# Prometheus scrape endpoint: request latency per route, per-phase
+# latency (auth, LLM, parsing, validation, Mongo) and LLM token usage
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+async def metrics_endpoint():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # Mount routers
 app.include_router(
     ingredients_router,
@@ -62,6 +136,11 @@ app.include_router(
 )
 
 
+# Schema written at image build time (see Dockerfile and the __main__ block
+# below); when set, the first docs hit loads it instead of building it
+OPENAPI_SCHEMA_FILE = get_settings().openapi_schema_file
+
+
 # Custon OPENAPI function created to bypass FastAPI schema generation
 # FastAPI has issues with Firebase authentication backend Token verification
 # This function authenticates the JWT-bearer authentication
@@ -72,6 +151,10 @@ app.include_router(
 def custom_openapi():
     if app.openapi_schema:
         return app.openapi_schema
+    if OPENAPI_SCHEMA_FILE and os.path.exists(OPENAPI_SCHEMA_FILE):
+        with open(OPENAPI_SCHEMA_FILE) as f:
+            app.openapi_schema = json.load(f)
+        return app.openapi_schema
     # Generate base schema
     schema = get_openapi(
         title=app.title,
@@ -94,3 +177,18 @@ def custom_openapi():
 
 # Tell FastAPI to use our custom schema function called custon_openapi
 app.openapi = custom_openapi
+
+
+# Build-time schema export:
+#     python main.py --write-openapi openapi.json
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="HomeSpice API tools")
+    parser.add_argument("--write-openapi", metavar="PATH", required=True,
+                        help="write the OpenAPI schema to PATH")
+    args = parser.parse_args()
+    # Always build from the routes, never from an older exported file
+    OPENAPI_SCHEMA_FILE = None
+    with open(args.write_openapi, "w") as f:
+        json.dump(custom_openapi(), f, separators=(",", ":"))
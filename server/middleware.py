@@ -0,0 +1,119 @@
+"""
+ASGI middleware for the HomeSpice API
+
+Written as plain ASGI callables rather than BaseHTTPMiddleware so they add
+no extra task or response buffering per request.
+"""
+import re
+import time
+import uuid
+
+from db import start_round_trip_count
+from log_config import request_id
+from services.metrics import http_request_duration
+
+ROUND_TRIPS_HEADER = b"x-db-round-trips"
+REQUEST_ID_HEADER = "X-Request-ID"
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+# Counts the Mongo round trips each request makes (see db.py) and reports
+# them in the X-DB-Round-Trips response header
+class RoundTripCounterMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = start_round_trip_count()
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (ROUND_TRIPS_HEADER, str(counter.count).encode())
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_count)
+
+
+# Tags every log record written while handling a request with its request
+# id: the caller's X-Request-ID when it looks sane, else a new one. The id is
+# echoed back in the X-Request-ID response header.
+class RequestIdMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                rid = value.decode("latin-1")
+                break
+        if not rid or not _REQUEST_ID_RE.match(rid):
+            rid = uuid.uuid4().hex
+        token = request_id.set(rid)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", rid.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
+
+
+# Records each request in the request-duration histogram, labelled by the
+# matched route's path template. Unmatched paths (404s, scanners) share a
+# single label so they cannot grow the series count.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._templates = None  # endpoint -> path template, built lazily
+
+    def _route_template(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._templates is None:
+            self._templates = {
+                getattr(route, "endpoint", None): route.path
+                for route in scope["app"].routes
+            }
+        return self._templates.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router fills in scope["endpoint"] once a route matches
+            http_request_duration.observe(
+                time.perf_counter() - start, scope["method"],
+                self._route_template(scope), str(status),
+            )
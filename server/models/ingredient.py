@@ -1,21 +1,8 @@
-from fastapi import APIRouter, HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel, Field, model_validator, ConfigDict
-from bson import ObjectId
-from typing import List
-import os
-from typing import Optional
-from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional
 
-load_dotenv()
-# Load environment variables from .env file
-MONGO_URI = os.getenv("MONGODB_CONNECT_STRING")
-DB_NAME = os.getenv("MONGO_DB_NAME")
-
-client = AsyncIOMotorClient(MONGO_URI)
-db = client[DB_NAME]
-
-router = APIRouter()
+# Most items (JSON items plus shopping-list lines) one bulk request may carry
+MAX_BULK_ITEMS = 500
 
 
 # Pydantic model
@@ -37,6 +24,10 @@ class Ingredient(BaseModel):
 class IngredientInDB(Ingredient):
     id: Optional[str] = Field(alias="_id")
     user_id: str = Field(..., description="Owner (Firebase) UID")
+    # Precomputed on write by services/units.with_canonical
+    name_key: Optional[str] = None
+    base_qty: Optional[float] = None
+    base_unit: Optional[str] = None
 
     # pydantic config
     model_config = ConfigDict(
@@ -45,57 +36,33 @@ class IngredientInDB(Ingredient):
     )
 
 
-# Helper to format MongoDB documents
-def format_ingredient(doc: dict) -> IngredientInDB:
-    doc["_id"] = str(doc["_id"])
-    return IngredientInDB(**doc).model_dump(by_alias=True)
-
-
-# ROUTES
-@router.post("/", response_model=IngredientInDB)
-async def create_ingredient(ingredient: Ingredient):
-    result = await db.ingredients.insert_one(ingredient.model_dump())
-    created = await db.ingredients.find_one({"_id": result.inserted_id})
-    return format_ingredient(created)
+# Bulk import body: structured items and/or a newline-separated shopping
+# list ("2 cups rice\n3 eggs"). Items are validated one by one so a bad
+# item is reported in the results instead of failing the whole request.
+class IngredientBulkIn(BaseModel):
+    ingredients: List[Dict[str, Any]] = Field(
+        default_factory=list, max_length=MAX_BULK_ITEMS
+    )
+    text: Optional[str] = None
 
 
-# Get all ingredients
-@router.get("/", response_model=List[IngredientInDB])
-async def get_all_ingredients():
-    docs = await db.ingredients.find().to_list(100)
-    return [format_ingredient(doc) for doc in docs]
+# One entry of a bulk PATCH; omitted fields keep their stored value
+class IngredientPatch(BaseModel):
+    id: str
+    name: Optional[str] = None
+    quantity: Optional[float] = Field(None, ge=0)
+    unit: Optional[str] = Field(None, min_length=1)
 
 
-# Get ingredient by ID
-@router.get("/{ingredient_id}", response_model=IngredientInDB)
-async def get_ingredient(ingredient_id: str):
-    ingredient = await db.ingredients.find_one(
-        {"_id": ObjectId(ingredient_id)}
-    )
-    if not ingredient:
-        raise HTTPException(404, detail="Ingredient not found")
-    return format_ingredient(ingredient)
+class IngredientBulkUpdate(BaseModel):
+    updates: List[IngredientPatch] = Field(..., max_length=MAX_BULK_ITEMS)
 
 
-# Update ingredient
-@router.put("/{ingredient_id}", response_model=IngredientInDB)
-async def update_ingredient(ingredient_id: str, updated: Ingredient):
-    result = await db.ingredients.replace_one(
-        {"_id": ObjectId(ingredient_id)},
-        updated.model_dump()
-    )
-    if result.modified_count == 0:
-        raise HTTPException(404, detail="Ingredient not found or not changed")
-    updated_doc = await db.ingredients.find_one(
-        {"_id": ObjectId(ingredient_id)}
-    )
-    return format_ingredient(updated_doc)
+class IngredientBulkDelete(BaseModel):
+    ids: List[str] = Field(..., max_length=MAX_BULK_ITEMS)
 
 
-# Delete ingredient
-@router.delete("/{ingredient_id}", status_code=204)
-async def delete_ingredient(ingredient_id: str):
-    result = await db.ingredients.delete_one({"_id": ObjectId(ingredient_id)})
-    if result.deleted_count == 0:
-        raise HTTPException(404, detail="Ingredient not found")
-    return None
+# Helper to format MongoDB documents
+def format_ingredient(doc: dict) -> IngredientInDB:
+    doc["_id"] = str(doc["_id"])
+    return IngredientInDB(**doc).model_dump(by_alias=True)
@@ -59,3 +59,99 @@ class RecipeOut(RecipeInDB):
         populate_by_name=True,
         from_attributes=True,
     )
+
+
+# Trusted read path for documents this API wrote (validated on the way in):
+# the RecipeOut JSON layout as a plain dict, without building a model.
+# Documents missing required fields (written before they existed) fall
+# back to RecipeOut.from_mongo so defaults still apply.
+RECIPE_OUT_FIELDS = tuple(RecipeOut.model_fields)
+_TRUSTED_REQUIRED = frozenset({
+    "_id", "title", "ingredients", "steps", "user_id", "created_at",
+    "updated_at",
+})
+
+
+def recipe_out_dict(doc: dict) -> dict:
+    if not _TRUSTED_REQUIRED.issubset(doc):
+        return RecipeOut.from_mongo(_normalize_out(dict(doc))).model_dump(
+            mode="json"
+        )
+    out = {name: doc.get(name) for name in RECIPE_OUT_FIELDS}
+    out["id"] = str(doc["_id"])
+    out["ingredients"] = [
+        {"name": i["name"], "quantity": float(i["quantity"]),
+         "unit": i["unit"]}
+        for i in doc["ingredients"]
+    ]
+    return _normalize_out(out)
+
+
+# Field cleanup shared by recipe_out_dict and recipe_summary_dict; only
+# touches the keys present in out
+def _normalize_out(out: dict) -> dict:
+    # addresses error in Cloud Run when image_url was saved as a string
+    if out.get("image_url") in ("None", "null"):
+        out["image_url"] = None
+    # older documents stored timestamps as ISO strings
+    for key in ("created_at", "updated_at"):
+        if isinstance(out.get(key), str):
+            try:
+                out[key] = datetime.fromisoformat(out[key])
+            except ValueError:
+                pass  # left as stored
+        if isinstance(out.get(key), datetime):
+            out[key] = _as_stored(out[key])
+    return out
+
+
+# A timestamp as Mongo returns it: UTC, millisecond precision. A document
+# just written is answered from memory (db.insert_returning), so without
+# this the create response and a later GET would disagree.
+def _as_stored(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # stored as UTC
+    else:
+        value = value.astimezone(timezone.utc)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+# Lightweight list-view model: only the fields a recipe card needs.
+# Any subset may be requested through GET /recipes?fields=...
+class RecipeSummary(BaseModel):
+    id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    prep_time: Optional[int] = None
+    cook_time: Optional[int] = None
+    servings: Optional[int] = None
+    image_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+SUMMARY_FIELDS = frozenset(RecipeSummary.model_fields) - {"id"}
+
+
+# GET /recipes?fields=... item: the requested keys of a projected
+# document, normalized the same way as the full view
+def recipe_summary_dict(doc: dict, fields) -> dict:
+    out = {"id": str(doc["_id"])}
+    out.update((k, v) for k, v in doc.items() if k in fields)
+    return _normalize_out(out)
+
+
+# GET /recipes/search item: a summary plus how much of the recipe the
+# user's pantry covers. score is the text relevance, only set with ?q=
+class RecipeSearchResult(RecipeSummary):
+    coverage: float
+    missing: List[str] = []
+    score: Optional[float] = None
+
+
+# GET /recipes/search item from the pipeline's projected document,
+# normalized the same way as the list views
+def recipe_search_dict(doc: dict) -> dict:
+    out = {"id": str(doc["_id"])}
+    out.update((k, v) for k, v in doc.items() if k != "_id")
+    return _normalize_out(out)
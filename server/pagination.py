@@ -0,0 +1,81 @@
+"""
+Keyset (cursor) pagination helpers shared by the list endpoints
+
+A cursor is an opaque, URL-safe encoding of the sort key of the last item
+on the previous page. The next page is fetched with a range filter on that
+key instead of skip(), so every page costs the same regardless of depth.
+Pages are ordered by a unique key (ending in _id) so ordering is stable.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, Response
+
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Sort orders used by the list endpoints
+RECIPE_SORT: List[Tuple[str, int]] = [("created_at", -1), ("_id", -1)]
+INGREDIENT_SORT: List[Tuple[str, int]] = [("_id", 1)]
+
+
+def encode_cursor(doc: dict, sort: List[Tuple[str, int]]) -> str:
+    values = []
+    for field, _ in sort:
+        value = doc.get(field)
+        if isinstance(value, ObjectId):
+            values.append({"o": str(value)})
+        elif isinstance(value, datetime):
+            values.append({"d": value.isoformat()})
+        else:
+            values.append({"v": value})
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: List[Tuple[str, int]]) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded))
+        values = []
+        for item in raw:
+            if "o" in item:
+                values.append(ObjectId(item["o"]))
+            elif "d" in item:
+                values.append(datetime.fromisoformat(item["d"]))
+            else:
+                values.append(item["v"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+# Mongo filter for "strictly after the cursor" in the given sort order
+def after_cursor(cursor: Optional[str], sort: List[Tuple[str, int]]) -> dict:
+    if not cursor:
+        return {}
+    values = decode_cursor(cursor, sort)
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        clause[field] = {"$lt" if direction < 0 else "$gt": values[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+# Trim a limit+1 fetch to one page and set the next-page header
+def finish_page(
+    docs: list,
+    limit: Optional[int],
+    sort: List[Tuple[str, int]],
+    response: Response,
+) -> list:
+    if limit is not None and len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], sort)
+    return docs
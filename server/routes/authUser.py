@@ -7,16 +7,15 @@ Credit Source: https://fastapi.tiangolo.com/reference/security/#fastapi.security
 
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
-from db import get_db
-
-# Firebase Admin SDK import
-import firebase_admin.auth as admin_auth
+from db import get_db, insert_returning
+from dependencies import get_current_user
+from services.indexes import indexed_collections
 
 router = APIRouter(tags=["user"])
 
@@ -57,10 +56,16 @@ async def create_account(
     user: UserCreate,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    if await db.users.find_one({"email": user.email}):
+    # uniqueness is enforced by the email_unique index (services/indexes.py);
+    # if it could not be created, fall back to checking first
+    if "users" not in indexed_collections:
+        if await db.users.find_one({"email": user.email}):
+            raise HTTPException(status_code=400,
+                                detail="Email already registered")
+    try:
+        doc = await insert_returning(db.users, user.model_dump())
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Email already registered")
-    result = await db.users.insert_one(user.model_dump())
-    doc = await db.users.find_one({"_id": result.inserted_id})
     return format_user(doc)
 
 
@@ -89,36 +94,52 @@ async def list_users(db: AsyncIOMotorDatabase = Depends(get_db)):
     return [{"_id": str(d["_id"]), "email": d["email"]} for d in docs]
 
 # New: Save Firebase profile
-bearer = HTTPBearer()
-
-
 @router.post(
     "/profile",
     status_code=status.HTTP_201_CREATED,
     summary="Upsert Firebase user into MongoDB"
 )
 async def save_profile(
-    creds: HTTPAuthorizationCredentials = Depends(bearer),
+    decoded: dict = Depends(get_current_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """
     Expects Authorization: Bearer <Firebase ID token>.
     Verifies the token, extracts uid+email, then upserts into db.users.
     """
-    # 1. Verify token
-    try:
-        decoded = admin_auth.verify_id_token(creds.credentials)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid auth token")
-
+    # 1. Token is verified by the get_current_user dependency
     uid = decoded["uid"]
     email = decoded.get("email")
 
     # 2. Upsert by uid
-    await db.users.update_one(
-        {"uid": uid},
-        {"$set": {"uid": uid, "email": email}},
-        upsert=True
-    )
+    try:
+        await db.users.update_one(
+            {"uid": uid},
+            {"$set": {"uid": uid, "email": email}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        await _merge_profile(db, uid, email)
 
     return {"status": "profile saved"}
+
+
+# The email is already stored: either a /create-account user signing in
+# through Firebase for the first time (attach the uid to that document), or
+# a concurrent request for the same uid that inserted first
+async def _merge_profile(db: AsyncIOMotorDatabase, uid: str, email: str):
+    try:
+        result = await db.users.update_one(
+            {"email": email, "uid": {"$exists": False}},
+            {"$set": {"uid": uid}},
+        )
+    except DuplicateKeyError:
+        result = None  # this uid already has its own document
+    if result is not None and result.matched_count:
+        return
+    if await db.users.find_one({"uid": uid, "email": email}):
+        return
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Email already registered to another account"
+    )
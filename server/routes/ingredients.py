@@ -1,14 +1,34 @@
-from fastapi import APIRouter, HTTPException, Depends
+import logging
+from collections import Counter
+from fastapi import (
+    APIRouter, HTTPException, Depends, Header, Query, Response
+)
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from bson import ObjectId
+from bson.errors import InvalidId
+from pydantic import ValidationError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
 
-from models.ingredient import Ingredient, IngredientInDB, format_ingredient
-from db import get_db
+from models.ingredient import (
+    Ingredient, IngredientInDB, IngredientBulkIn, IngredientBulkUpdate,
+    IngredientBulkDelete, MAX_BULK_ITEMS, format_ingredient
+)
+from db import get_db, insert_returning, update_returning
+from pagination import (
+    MAX_PAGE_SIZE, INGREDIENT_SORT, after_cursor, finish_page
+)
+from services.ingredientParser import parse_ingredient_lines
+from services.metrics import pantry_cache_events
+from services.pantryCache import pantry_cache
+from services.units import merge_amounts, with_canonical
 # ensures ingredients operations scoped to users
-from dependencies import get_current_user
+from dependencies import get_current_user, limit_crud
 
-router = APIRouter(tags=["ingredients"])
+# Every ingredient route counts against the user's CRUD rate limit
+router = APIRouter(tags=["ingredients"], dependencies=[Depends(limit_crud)])
+logger = logging.getLogger(__name__)
 
 
 @router.post("/", response_model=dict)
@@ -18,29 +38,279 @@ async def create_ingredient(
     current_user: dict = Depends(get_current_user)
 ):
     # Create new ingredient owned by authenticated user
-    print(f"POST /ingredients - Creating: {ingredient}")
-    new_doc = ingredient.model_dump()
+    logger.debug("Creating ingredient %s", ingredient.name)
+    new_doc = with_canonical(ingredient.model_dump())
     new_doc["user_id"] = current_user["uid"]
-    result = await db.ingredients.insert_one(new_doc)
-    created = await db.ingredients.find_one({"_id": result.inserted_id})
-    print(f"Created ingredient with ID: {result.inserted_id}")
-    created["id"] = str(created["_id"])
+    created = await insert_returning(db.ingredients, new_doc)
+    pantry_cache.invalidate(current_user["uid"])
     return format_ingredient(created)
 
 
 @router.get("/", response_model=List[dict])
 async def get_all_ingredients(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    # List ingredients owned by authenticated user
-    print("GET /ingredients - Fetching all ingredients")
-    docs = await db.ingredients.find(
-        {"user_id": current_user["uid"]}
-    ).to_list(100)
+    # List ingredients owned by authenticated user, oldest first.
+    # With ?limit=N a page of N is returned and X-Next-Cursor holds the
+    # cursor for the next page.
+    # The full list comes from the pantry cache (services/pantryCache.py)
+    # with an ETag; a matching If-None-Match gets an empty 304.
+    if limit is None and cursor is None:
+        snapshot = await pantry_cache.get_pantry(db, current_user["uid"])
+        headers = {"ETag": snapshot.etag, "Cache-Control": "private, no-cache"}
+        if snapshot.matches(if_none_match):
+            pantry_cache_events.inc("not_modified")
+            return Response(status_code=304, headers=headers)
+        return Response(snapshot.body, media_type="application/json",
+                        headers=headers)
+
+    query = {"user_id": current_user["uid"]}
+    query.update(after_cursor(cursor, INGREDIENT_SORT))
+    find = db.ingredients.find(query).sort(INGREDIENT_SORT)
+    if limit is not None:
+        find = find.limit(limit + 1)
+    docs = finish_page(
+        await find.to_list(length=None), limit, INGREDIENT_SORT, response
+    )
     return [format_ingredient(doc) for doc in docs]
 
 
+# --- Bulk endpoints ---
+# Each takes a list of items and answers with one result per item, in input
+# order ({"index", "status", ...}) plus a count per status. Writes go out as
+# a single unordered bulk_write, so one failing item does not block the
+# rest.
+
+def _object_id(value: str) -> Optional[ObjectId]:
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(err["msg"] for err in e.errors())
+
+
+# Run ops unordered; returns op index -> error message for failed ops
+async def _bulk_write(collection, ops: list) -> Dict[int, str]:
+    if not ops:
+        return {}
+    try:
+        await collection.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        return {
+            err["index"]: err.get("errmsg", "Write failed")
+            for err in e.details.get("writeErrors", [])
+        }
+    return {}
+
+
+def _bulk_response(results: List[dict]) -> dict:
+    return {
+        "results": results,
+        "summary": dict(Counter(r["status"] for r in results)),
+    }
+
+
+@router.post("/bulk", response_model=dict)
+async def bulk_create_ingredients(
+    body: IngredientBulkIn,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    # Add many ingredients at once (e.g. after a grocery trip). Items with
+    # the same name and canonical unit are merged with each other and with
+    # the matching pantry item already stored ("merged"); the rest are
+    # inserted ("created"). Two round trips regardless of item count.
+    uid = current_user["uid"]
+    lines = [line for line in (body.text or "").splitlines() if line.strip()]
+    if len(body.ingredients) + len(lines) > MAX_BULK_ITEMS:
+        raise HTTPException(
+            400, detail=f"At most {MAX_BULK_ITEMS} items per request"
+        )
+    logger.debug("Bulk import of %d items and %d lines",
+                 len(body.ingredients), len(lines))
+
+    results: List[dict] = []
+    valid: List[Tuple[int, dict]] = []
+
+    def accept(index: int, raw: dict) -> None:
+        try:
+            ingredient = Ingredient(**raw)
+        except ValidationError as e:
+            results[index].update(status="error",
+                                  error=_validation_message(e))
+            return
+        valid.append((index, with_canonical(ingredient.model_dump())))
+
+    for raw in body.ingredients:
+        results.append({"index": len(results)})
+        accept(len(results) - 1, raw)
+    for line, parsed in zip(lines, parse_ingredient_lines(lines)):
+        results.append({"index": len(results), "input": line})
+        if parsed is None:
+            results[-1].update(status="error",
+                               error="Could not parse ingredient")
+        elif not parsed["name"]:
+            # e.g. "3 g" on its own line
+            results[-1].update(status="error",
+                               error="No ingredient name")
+        else:
+            accept(len(results) - 1, parsed)
+
+    # Merge duplicates within the request: (name_key, base_unit) -> group
+    groups: Dict[Tuple[str, str], dict] = {}
+    for index, doc in valid:
+        key = (doc["name_key"], doc["base_unit"])
+        group = groups.get(key)
+        if group is None:
+            groups[key] = {"doc": doc, "indexes": [index]}
+        else:
+            group["doc"] = merge_amounts(group["doc"], doc)
+            group["indexes"].append(index)
+
+    # Pantry items these fold into
+    stored: Dict[Tuple[str, str], dict] = {}
+    if groups:
+        docs = await db.ingredients.find({
+            "user_id": uid,
+            "name_key": {"$in": sorted({name for name, _ in groups})},
+        }).to_list(length=None)
+        for doc in docs:
+            stored.setdefault((doc["name_key"], doc["base_unit"]), doc)
+
+    ops, op_results = [], []
+    for key, group in groups.items():
+        existing = stored.get(key)
+        if existing is None:
+            doc = {**group["doc"], "_id": ObjectId(), "user_id": uid}
+            ops.append(InsertOne(doc))
+            status = "created"
+        else:
+            doc = merge_amounts(existing, group["doc"])
+            ops.append(UpdateOne(
+                {"_id": existing["_id"], "user_id": uid},
+                {"$set": {"quantity": doc["quantity"],
+                          "base_qty": doc["base_qty"]}},
+            ))
+            status = "merged"
+        op_results.append((group["indexes"], doc, status))
+
+    errors = await _bulk_write(db.ingredients, ops)
+    if ops:
+        pantry_cache.invalidate(uid)
+    for op_index, (indexes, doc, status) in enumerate(op_results):
+        if op_index in errors:
+            outcome = {"status": "error", "error": errors[op_index]}
+        else:
+            outcome = {"status": status,
+                       "ingredient": format_ingredient(dict(doc))}
+        for index in indexes:
+            results[index].update(outcome)
+            # Later duplicates in the request were folded into the first
+            if index != indexes[0] and outcome["status"] == "created":
+                results[index]["status"] = "merged"
+    return _bulk_response(results)
+
+
+@router.patch("/bulk", response_model=dict)
+async def bulk_update_ingredients(
+    body: IngredientBulkUpdate,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    # Partially update many owned ingredients: one read of the targets, one
+    # bulk_write. Per item: "updated", "not_found" or "error".
+    uid = current_user["uid"]
+    results = [{"index": i, "id": patch.id}
+               for i, patch in enumerate(body.updates)]
+    ids: Dict[int, ObjectId] = {}
+    for i, patch in enumerate(body.updates):
+        oid = _object_id(patch.id)
+        if oid is None:
+            results[i].update(status="error", error="Invalid ID format")
+        else:
+            ids[i] = oid
+
+    stored: Dict[ObjectId, dict] = {}
+    if ids:
+        docs = await db.ingredients.find({
+            "_id": {"$in": list(set(ids.values()))}, "user_id": uid
+        }).to_list(length=None)
+        stored = {doc["_id"]: doc for doc in docs}
+
+    ops, op_results = [], []
+    for i, oid in ids.items():
+        doc = stored.get(oid)
+        if doc is None:
+            results[i]["status"] = "not_found"
+            continue
+        changes = body.updates[i].model_dump(exclude={"id"},
+                                             exclude_none=True)
+        current = {k: doc[k] for k in ("name", "quantity", "unit")}
+        try:
+            ingredient = Ingredient(**{**current, **changes})
+        except ValidationError as e:
+            results[i].update(status="error", error=_validation_message(e))
+            continue
+        fields = with_canonical(ingredient.model_dump())
+        doc.update(fields)  # a later patch of the same id builds on this
+        ops.append(UpdateOne({"_id": oid, "user_id": uid}, {"$set": fields}))
+        op_results.append((i, dict(doc)))
+
+    errors = await _bulk_write(db.ingredients, ops)
+    if ops:
+        pantry_cache.invalidate(uid)
+    for op_index, (i, doc) in enumerate(op_results):
+        if op_index in errors:
+            results[i].update(status="error", error=errors[op_index])
+        else:
+            results[i].update(status="updated",
+                              ingredient=format_ingredient(doc))
+    return _bulk_response(results)
+
+
+@router.delete("/bulk", response_model=dict)
+async def bulk_delete_ingredients(
+    body: IngredientBulkDelete,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    # Delete many owned ingredients. Per item: "deleted", "not_found" or
+    # "error" (bad id).
+    uid = current_user["uid"]
+    results = [{"index": i, "id": value} for i, value in enumerate(body.ids)]
+    ids: Dict[int, ObjectId] = {}
+    for i, value in enumerate(body.ids):
+        oid = _object_id(value)
+        if oid is None:
+            results[i].update(status="error", error="Invalid ID format")
+        else:
+            ids[i] = oid
+
+    owned = set()
+    if ids:
+        docs = await db.ingredients.find(
+            {"_id": {"$in": list(set(ids.values()))}, "user_id": uid},
+            {"_id": 1},
+        ).to_list(length=None)
+        owned = {doc["_id"] for doc in docs}
+    if owned:
+        await db.ingredients.delete_many(
+            {"_id": {"$in": list(owned)}, "user_id": uid}
+        )
+        pantry_cache.invalidate(uid)
+    for i, oid in ids.items():
+        results[i]["status"] = "deleted" if oid in owned else "not_found"
+    return _bulk_response(results)
+
+
 @router.get("/{ingredient_id}", response_model=dict)
 async def get_ingredient(
     ingredient_id: str,
@@ -48,7 +318,6 @@ async def get_ingredient(
     current_user: dict = Depends(get_current_user),
 ):
     # Fetch a single ingredient by ID, ensuring ownership
-    print(f"GET /ingredients/{ingredient_id}")
     try:
         ingredient = await db.ingredients.find_one({
             "_id": ObjectId(ingredient_id),
@@ -69,25 +338,20 @@ async def update_ingredient(
     current_user: dict = Depends(get_current_user),
 ):
     # Edit an ingredient document if owned by current user
-    print(f"PUT /ingredients/{ingredient_id} - New data: {updated}")
+    logger.debug("Updating ingredient %s", ingredient_id)
     try:
-        result = await db.ingredients.update_one(
-            {
-                "_id": ObjectId(ingredient_id),
-                "user_id": current_user["uid"]
-            },
-            {"$set": updated.model_dump()}
-        )
+        query = {
+            "_id": ObjectId(ingredient_id),
+            "user_id": current_user["uid"]
+        }
     except Exception:
         raise HTTPException(400, detail="Invalid ID format")
-    if result.modified_count == 0:
-        raise HTTPException(404, detail="Ingredient not found or not changed")
-    updated_doc = await db.ingredients.find_one(
-         {
-           "_id": ObjectId(ingredient_id),
-           "user_id": current_user["uid"]
-         }
+    updated_doc = await update_returning(
+        db.ingredients, query, {"$set": with_canonical(updated.model_dump())}
     )
+    if not updated_doc:
+        raise HTTPException(404, detail="Ingredient not found")
+    pantry_cache.invalidate(current_user["uid"])
     return format_ingredient(updated_doc)
 
 
@@ -98,7 +362,6 @@ async def delete_ingredient(
     current_user: dict = Depends(get_current_user),
 ):
     # Delete an ingredient if own by current user
-    print(f"DELETE /ingredients/{ingredient_id}")
     try:
         result = await db.ingredients.delete_one({
             "_id": ObjectId(ingredient_id),
@@ -108,5 +371,6 @@ async def delete_ingredient(
         raise HTTPException(400, detail="Invalid ID format")
     if result.deleted_count == 0:
         raise HTTPException(404, detail="Ingredient not found")
-    print(f"Deleted ingredient {ingredient_id}")
+    pantry_cache.invalidate(current_user["uid"])
+    logger.debug("Deleted ingredient %s", ingredient_id)
     return None
@@ -1,15 +1,46 @@
 import json
-from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from typing import List, Optional, Union
 from bson import ObjectId
 from datetime import datetime, timezone 
-from pydantic import BaseModel, ValidationError
-from db import get_db
-from dependencies import get_current_user
-from models.recipe import RecipeCreate, RecipeOut, RecipeBase
+from pydantic import BaseModel, Field, ValidationError
+from config import Settings, get_settings
+from db import get_db, insert_returning, update_returning
+from log_config import debug_payload
+from dependencies import get_current_user, limit_crud, limit_generation
+from models.recipe import (
+    RecipeCreate, RecipeOut, RecipeBase, RecipeSearchResult, RecipeSummary,
+    SUMMARY_FIELDS, recipe_out_dict, recipe_search_dict, recipe_summary_dict
+)
 from models.ingredient import Ingredient
-from services.gptClient import generate_recipe_from_ingredients
+from pagination import MAX_PAGE_SIZE, RECIPE_SORT, after_cursor, finish_page
+from serialization import encode, json_response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from services.gptClient import (
+    generate_recipe_from_ingredients, stream_recipe_from_ingredients,
+    parse_recipe_reply
+)
+from services.generationCache import generation_cache, generation_key
+from services.generationJobs import (
+    generation_pool, MAX_CANDIDATES, MAX_ACTIVE_JOBS_PER_USER,
+    TooManyJobsError
+)
+from services.llmClient import (
+    LLMTimeoutError, LLMUnavailableError, rate_limit_errors,
+    upstream_retry_after,
+)
+from services.promptBuilder import select_ingredients
+from services.rateLimit import (
+    GENERATE, OverloadedError, RateLimitedError, generation_gate,
+    rate_limiter, retry_after_header
+)
+from services.recipeSearch import pantry_keys, search_pipeline
+from services.recipeStream import IncrementalRecipeParser
+from services.similarRecipes import GENERATED, pantry_amounts, similar_index
+from services.units import canonicalize_ingredients
 from models.recipe import RecipeCreate, RecipeOut, RecipeBase
 from fastapi.encoders import jsonable_encoder
 
@@ -21,53 +52,124 @@ ERR_MISSING_FIELDS = "GPT response is missing one or more required fields."
 ERR_VALIDATION_FAILED = "GPT response failed schema validation."
 ERR_INVALID_JSON = "GPT response was not valid JSON."
 ERR_INTERNAL_ERROR = "Internal error: {}"
+ERR_LLM_UNAVAILABLE = "Recipe generator is temporarily unavailable."
+ERR_LLM_TIMEOUT = "Recipe generator did not answer in time."
+ERR_OVERLOADED = "Too many recipes are being generated; try again shortly."
+ERR_LLM_RATE_LIMITED = "Recipe generator is busy; try again shortly."
+# Set on /generate responses that reused an earlier generation
+REUSED_FROM_HEADER = "X-Reused-From"
+REUSED = "reused"
+# A generated or reused recipe the user has since changed; no longer
+# offered to other users as a generation for its pantry
+EDITED = "edited"
 
 router = APIRouter(tags=["recipes"])
+logger = logging.getLogger(__name__)
 
 # --- Recipe CRUD Endpoints ---
-@router.post("/", response_model=RecipeOut, status_code=201)
+# Responses are built with recipe_out_dict and encoded by orjson (see
+# serialization.py); response_model documents the shape
+@router.post("/", response_model=RecipeOut, status_code=201,
+             dependencies=[Depends(limit_crud)])
 async def create_recipe(
     recipe: RecipeCreate,
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    doc = recipe.model_dump()
+    doc = recipe.model_dump(mode="json")
+    doc["ingredients"] = canonicalize_ingredients(doc["ingredients"])
     doc["created_at"] = datetime.now(timezone.utc)
     doc["updated_at"] = datetime.now(timezone.utc)
     doc["user_id"] = current_user["uid"]
 
-    result = await db.recipes.insert_one(doc)
-    new_doc = await db.recipes.find_one({"_id": result.inserted_id})
-    new_doc["_id"] = str(new_doc["_id"])
-
-    return RecipeOut.from_mongo(saved_recipe).model_dump(by_alias=True, mode="json")
+    new_doc = await insert_returning(db.recipes, doc)
+    return json_response(recipe_out_dict(new_doc), status_code=201)
 
 
-@router.get("/", response_model=List[RecipeOut])
+# Returns every recipe by default (newest first). With ?limit=N a page of
+# N is returned and X-Next-Cursor holds the cursor for the next page.
+# With ?fields=title,image_url,... only those fields are fetched from Mongo
+# and each item is a RecipeSummary.
+@router.get(
+    "/",
+    response_model=List[Union[RecipeOut, RecipeSummary]],
+    response_model_exclude_unset=True,
+    dependencies=[Depends(limit_crud)],
+)
 async def list_recipes(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated RecipeSummary fields"
+    ),
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    try:
-        docs = await db.recipes.find({"user_id": current_user["uid"]}).to_list(length=None)
+    projection = None
+    if fields:
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = requested - SUMMARY_FIELDS
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+        # created_at is always fetched because the cursor is built from it
+        projection = dict.fromkeys(requested | {"created_at"}, 1)
 
-        for doc in docs:
-            doc["_id"] = str(doc["_id"])
-            
-            # addresses error in Cloud Run when user has empty recipe list
-            if doc.get("image_url") in [None, "None", "null"]:
-                doc["image_url"] = None
+    query = {"user_id": current_user["uid"]}
+    query.update(after_cursor(cursor, RECIPE_SORT))
 
-            for ing in doc.get("ingredients", []):
-                ing["quantity"] = float(ing["quantity"])
+    try:
+        find = db.recipes.find(query, projection).sort(RECIPE_SORT)
+        if limit is not None:
+            find = find.limit(limit + 1)
+        docs = finish_page(
+            await find.to_list(length=None), limit, RECIPE_SORT, response
+        )
+
+        if projection is not None:
+            return json_response([
+                recipe_summary_dict(doc, requested) for doc in docs
+            ], response)
 
-        return [RecipeOut.from_mongo(doc).model_dump(by_alias=True, mode="json") for doc in docs]
+        return json_response([recipe_out_dict(doc) for doc in docs],
+                             response)
 
     except Exception as e:
-        print("Error in list_recipes:", e)
+        logger.exception("Error in list_recipes")
         raise HTTPException(status_code=500, detail="Failed to fetch recipes")
 
-@router.get("/{recipe_id}", response_model=RecipeOut)
+# Search and "cookable now" ranking, done in Mongo (see
+# services/recipeSearch.py). ?q= matches title, description and ingredient
+# names; results are ordered by how much of each recipe the user's pantry
+# covers, then by text relevance. ?min_coverage=1 lists only recipes that
+# can be cooked with what is in the pantry.
+@router.get(
+    "/search",
+    response_model=List[RecipeSearchResult],
+    response_model_exclude_unset=True,
+    dependencies=[Depends(limit_crud)],
+)
+async def search_recipes(
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    min_coverage: float = Query(0.0, ge=0.0, le=1.0),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    uid = current_user["uid"]
+    pantry = await pantry_keys(db, uid)
+    docs = await db.recipes.aggregate(
+        search_pipeline(uid, pantry, q=q, min_coverage=min_coverage,
+                        limit=limit)
+    ).to_list(length=None)
+    return json_response([recipe_search_dict(doc) for doc in docs])
+
+
+@router.get("/{recipe_id}", response_model=RecipeOut,
+            dependencies=[Depends(limit_crud)])
 async def get_recipe(
     recipe_id: str,
     db: AsyncIOMotorDatabase = Depends(get_db),
@@ -80,41 +182,40 @@ async def get_recipe(
     if not doc:
         raise HTTPException(status_code=404, detail="Recipe not found")
 
-    doc["_id"] = str(doc["_id"])
-    return RecipeOut.from_mongo(doc).model_dump(by_alias=True, mode="json")
+    return json_response(recipe_out_dict(doc))
 
 
-@router.put("/{recipe_id}", response_model=RecipeOut)
+@router.put("/{recipe_id}", response_model=RecipeOut,
+            dependencies=[Depends(limit_crud)])
 async def update_recipe(
     recipe_id: str,
     recipe: RecipeCreate,
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    update_data = recipe.model_dump()
+    update_data = recipe.model_dump(mode="json")
+    update_data["ingredients"] = canonicalize_ingredients(
+        update_data["ingredients"]
+    )
     update_data["updated_at"] = datetime.now(timezone.utc)
-    result = await db.recipes.update_one(
+    update_data["source"] = EDITED
+    updated_doc = await update_returning(
+        db.recipes,
         {
             "_id": ObjectId(recipe_id),
             "user_id": current_user["uid"]
         },
         {"$set": update_data}
     )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Recipe not found")
-
-    updated_doc = await db.recipes.find_one({
-        "_id": ObjectId(recipe_id),
-        "user_id": current_user["uid"]
-    })
     if not updated_doc:
         raise HTTPException(status_code=404, detail="Recipe not found")
+    similar_index.remove(recipe_id)
 
-    updated_doc["_id"] = str(updated_doc["_id"])
-    return RecipeOut.from_mongo(updated_doc).model_dump(by_alias=True, mode="json")
+    return json_response(recipe_out_dict(updated_doc))
 
 
-@router.delete("/{recipe_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{recipe_id}", status_code=status.HTTP_204_NO_CONTENT,
+               dependencies=[Depends(limit_crud)])
 async def delete_recipe(
     recipe_id: str,
     db: AsyncIOMotorDatabase = Depends(get_db),
@@ -126,6 +227,7 @@ async def delete_recipe(
     })
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Recipe not found")
+    similar_index.remove(recipe_id)
     return None
 
 
@@ -139,73 +241,279 @@ class IngredientIn(BaseModel):
 
 class RecipeGenIn(BaseModel):
     ingredients: List[IngredientIn]
+    # ingredient names to build the recipe around; ranked first when the
+    # pantry has to be cut to fit the prompt
+    preferences: List[str] = []
+    # /generate only: answer with a copy of another user's generated recipe
+    # this pantry can cook, when there is one, instead of calling the LLM
+    reuse_similar: bool = False
+
+# The pantry as prompt lines: deduped, ranked and cut to the prompt token
+# budget (see services/promptBuilder.py)
+def prompt_lines(req: RecipeGenIn) -> List[str]:
+    return select_ingredients(req.ingredients, req.preferences).lines
+
+# Best match from the similar-recipe index (services/similarRecipes.py),
+# saved as a copy for this user; None when nothing is close enough. One
+# read for the candidates, skipping any deleted since they were indexed.
+async def reuse_similar_recipe(
+    db: AsyncIOMotorDatabase, req: RecipeGenIn, uid: str
+) -> Optional[dict]:
+    matches = similar_index.match(pantry_amounts(req.ingredients),
+                                  exclude_user=uid, required=req.preferences)
+    if not matches:
+        return None
+    ids = [ObjectId(m.recipe_id) for m in matches]
+    found = {
+        doc["_id"]: doc for doc in await db.recipes.find(
+            {"_id": {"$in": ids}, "source": GENERATED}
+        ).to_list(length=None)
+    }
+    for oid in ids:
+        source = found.get(oid)
+        if source is None:
+            similar_index.remove(str(oid))
+            continue
+        doc = {k: source[k] for k in RecipeCreate.model_fields if k in source}
+        doc["user_id"] = uid
+        doc["created_at"] = datetime.now(timezone.utc)
+        doc["updated_at"] = datetime.now(timezone.utc)
+        doc["source"] = REUSED
+        doc["reused_from"] = oid
+        return await insert_returning(db.recipes, doc)
+    return None
+
+class RecipeBatchGenIn(RecipeGenIn):
+    count: int = Field(3, ge=1, le=MAX_CANDIDATES)
 
-# NEW CHANGES to how we generate the recipe:
-# changes include now making sure each step of recipe generation is good
-# if there are errors, we are able to catch where the error happens through our print statements
-@router.post("/generate", response_model=RecipeOut, status_code=201)
+# Each stage logs at DEBUG; full payload dumps are sampled (see
+# log_config.debug_payload) so they cost nothing on most requests.
+# Rate limited per user, and the LLM call waits for a generation_gate slot
+# (503 with Retry-After when the queue is full; see services/rateLimit.py)
+@router.post("/generate", response_model=RecipeOut, status_code=201,
+             dependencies=[Depends(limit_generation)])
 async def generate_recipe(
     req: RecipeGenIn,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: dict = Depends(get_current_user),
+    settings: Settings = Depends(get_settings),
 ):
     try:
-        
-        print("🔹 Received request payload:", req.json())
+        debug_payload(logger, "generate request", lambda: req.model_dump())
+
+        if req.reuse_similar:
+            reused = await reuse_similar_recipe(db, req, current_user["uid"])
+            if reused is not None:
+                response.headers[REUSED_FROM_HEADER] = str(
+                    reused["reused_from"]
+                )
+                return json_response(recipe_out_dict(reused), response,
+                                     status_code=201)
 
         # Build the string
-        ingredient_strings = [
-            f"{i.quantity} {i.unit} {i.name}" for i in req.ingredients
-        ]
-        print(" Built ingredient_strings:", ingredient_strings)
+        ingredient_strings = prompt_lines(req)
+        # one source for the call and its cache key
+        model, temperature = settings.gpt_model, settings.gpt_temperature
+
+        async def generate():
+            async with generation_gate:
+                return await generate_recipe_from_ingredients(
+                    ingredient_strings, model=model, temperature=temperature
+                )
 
         # See if we are able to have a GPT output
-        recipe_data = await generate_recipe_from_ingredients(ingredient_strings)
-        print("Raw GPT output:", recipe_data)
+        # identical pantries share one upstream call (see generationCache)
+        recipe_data = await generation_cache.get_or_generate(
+            generation_key(req.ingredients, model, temperature)
+            + (tuple(sorted(p.lower() for p in req.preferences)),),
+            generate,
+        )
+        debug_payload(logger, "GPT output", lambda: recipe_data)
 
         # See if GPT generates
         try:
             validated: RecipeCreate = RecipeCreate(**recipe_data)
         except ValidationError as ve:
-            print("ValidationError:", ve.errors())
+            logger.warning("GPT recipe failed validation",
+                           extra={"errors": ve.errors()})
             raise HTTPException(
                 status_code=422,
                 detail=f"{ERR_VALIDATION_FAILED}: {ve.errors()}"
             )
 
-        # see if it dumps 
         recipe_doc = validated.model_dump(mode="json")
-        print("🔹 After model_dump, before casting:", recipe_doc)
-        print("   types:", {k: type(v) for k, v in recipe_doc.items()})
-
         #  check for the image_url
-        if "image_url" in recipe_doc:
-            print("🔹 image_url before cast:", recipe_doc["image_url"], type(recipe_doc["image_url"]))
+        if recipe_doc.get("image_url") is not None:
             recipe_doc["image_url"] = str(recipe_doc["image_url"])
-            print("🔹 image_url after cast:", recipe_doc["image_url"], type(recipe_doc["image_url"]))
 
+        recipe_doc["ingredients"] = canonicalize_ingredients(
+            recipe_doc["ingredients"]
+        )
         recipe_doc["user_id"]    = current_user["uid"]
         recipe_doc["created_at"] = datetime.now(timezone.utc)
         recipe_doc["updated_at"] = datetime.now(timezone.utc)
-        print("Final recipe_doc to insert:", recipe_doc)
-        print("   types:", {k: type(v) for k, v in recipe_doc.items()})
+        recipe_doc["source"]     = GENERATED
 
         # See if it gets inserted into our Database
-        result = await db.recipes.insert_one(recipe_doc)
-        print(f"Inserted with _id: {result.inserted_id}")
-        
-        saved = await db.recipes.find_one({"_id": result.inserted_id})
-        print(" Raw saved:", saved)
-        saved["_id"] = str(saved["_id"])
-        print(" Saved after _id str:", saved)
-
-        # Pring debug statements for checking json responses
-        response_model = RecipeOut.from_mongo(saved)
-        print("Returning model instance:", response_model)
-        print(" json():", response_model.model_dump(by_alias=True, mode="json"))
-
-        return response_model
-
+        saved = await insert_returning(db.recipes, recipe_doc)
+        similar_index.add(saved)
+        logger.debug("Inserted generated recipe %s", saved["_id"])
+        debug_payload(logger, "saved recipe", lambda: saved)
+
+        return json_response(recipe_out_dict(saved), status_code=201)
+
+    except HTTPException:
+        raise
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=ERR_OVERLOADED,
+                            headers=retry_after_header(e.retry_after))
+    except LLMUnavailableError:
+        raise HTTPException(status_code=503, detail=ERR_LLM_UNAVAILABLE)
+    except LLMTimeoutError:
+        raise HTTPException(status_code=504, detail=ERR_LLM_TIMEOUT)
+    except rate_limit_errors() as e:
+        # The provider's 429 is our capacity problem, not the client's
+        wait = upstream_retry_after(e) or settings.generation_retry_after
+        raise HTTPException(status_code=503, detail=ERR_LLM_RATE_LIMITED,
+                            headers=retry_after_header(wait))
+    except ValidationError as ve:
+        # Still invalid after the repair attempt (see llmClient)
+        raise HTTPException(
+            status_code=502, detail=f"{ERR_VALIDATION_FAILED}: {ve.errors()}"
+        )
+    except ValueError:
+        raise HTTPException(status_code=502, detail=ERR_INVALID_JSON)
     except Exception as e:
-        print("Unhandled exception:", repr(e))
-        raise HTTPException(status_code=500, detail=ERR_INTERNAL_ERROR.format(str(e)))
\ No newline at end of file
+        logger.exception("Unhandled exception in generate_recipe")
+        raise HTTPException(status_code=500, detail=ERR_INTERNAL_ERROR.format(str(e)))
+
+
+# --- Streaming GPT Recipe Generation Endpoint ---
+# Same input as /generate, but the response is NDJSON (one event per line):
+#   {"type": "title", "title": ...}
+#   {"type": "ingredient", "ingredient": {name, quantity, unit}}
+#   {"type": "step", "index": n, "step": ...}
+#   {"type": "recipe", "recipe": <RecipeOut>}   once saved, always last
+#   {"type": "error", "detail": ...}            instead of "recipe" on failure
+# The generation_gate slot is taken before streaming starts (503 when
+# full) and held until the stream ends or the client goes away.
+@router.post("/generate/stream", dependencies=[Depends(limit_generation)])
+async def generate_recipe_stream(
+    req: RecipeGenIn,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+    settings: Settings = Depends(get_settings),
+):
+    ingredient_strings = prompt_lines(req)
+    try:
+        slot = await generation_gate.hold()
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=ERR_OVERLOADED,
+                            headers=retry_after_header(e.retry_after))
+
+    async def events():
+        parser = IncrementalRecipeParser()
+        chunks = []
+        try:
+            async for delta in stream_recipe_from_ingredients(
+                ingredient_strings, model=settings.gpt_model,
+                temperature=settings.gpt_temperature,
+            ):
+                chunks.append(delta)
+                for event in parser.feed(delta):
+                    yield json.dumps(event) + "\n"
+
+            try:
+                recipe_data = parse_recipe_reply("".join(chunks))
+            except ValidationError as ve:
+                yield json.dumps({
+                    "type": "error",
+                    "detail": f"{ERR_VALIDATION_FAILED}: {ve.errors()}",
+                }, default=str) + "\n"
+                return
+            except ValueError:
+                yield json.dumps(
+                    {"type": "error", "detail": ERR_INVALID_JSON}
+                ) + "\n"
+                return
+
+            recipe_doc = RecipeCreate(**recipe_data).model_dump(mode="json")
+            recipe_doc["ingredients"] = canonicalize_ingredients(
+                recipe_doc["ingredients"]
+            )
+            recipe_doc["user_id"] = current_user["uid"]
+            recipe_doc["created_at"] = datetime.now(timezone.utc)
+            recipe_doc["updated_at"] = datetime.now(timezone.utc)
+            recipe_doc["source"] = GENERATED
+            saved = await insert_returning(db.recipes, recipe_doc)
+            similar_index.add(saved)
+            yield encode({
+                "type": "recipe", "recipe": recipe_out_dict(saved)
+            }) + b"\n"
+        except LLMUnavailableError:
+            yield json.dumps(
+                {"type": "error", "detail": ERR_LLM_UNAVAILABLE}
+            ) + "\n"
+        except LLMTimeoutError:
+            yield json.dumps(
+                {"type": "error", "detail": ERR_LLM_TIMEOUT}
+            ) + "\n"
+        except rate_limit_errors():
+            yield json.dumps(
+                {"type": "error", "detail": ERR_LLM_RATE_LIMITED}
+            ) + "\n"
+        except Exception as e:
+            logger.exception("Unhandled exception in generate_recipe_stream")
+            yield json.dumps({
+                "type": "error",
+                "detail": ERR_INTERNAL_ERROR.format(str(e)),
+            }) + "\n"
+        finally:
+            slot.release()
+
+    # The background task covers a stream that never started
+    return StreamingResponse(events(), media_type="application/x-ndjson",
+                             background=BackgroundTask(slot.release))
+
+
+# --- Batch GPT Recipe Generation (background jobs) ---
+# Submits `count` candidate recipes for one pantry and returns a job id at
+# once (202); poll GET /generate/batch/{job_id} for status and candidates.
+# See services/generationJobs.py for scheduling. Candidates are not saved.
+# Each candidate costs one token of the user's generation rate limit.
+@router.post("/generate/batch", status_code=status.HTTP_202_ACCEPTED)
+async def generate_recipe_batch(
+    req: RecipeBatchGenIn,
+    current_user: dict = Depends(get_current_user),
+    settings: Settings = Depends(get_settings),
+):
+    try:
+        rate_limiter.check(GENERATE, current_user["uid"], cost=req.count)
+    except RateLimitedError as e:
+        raise HTTPException(status_code=429, detail="Too many requests",
+                            headers=retry_after_header(e.retry_after))
+    ingredient_strings = prompt_lines(req)
+    try:
+        job = await generation_pool.submit(
+            current_user["uid"], ingredient_strings, req.count,
+            model=settings.gpt_model, temperature=settings.gpt_temperature,
+        )
+    except TooManyJobsError:
+        raise HTTPException(
+            status_code=429,
+            detail=f"At most {MAX_ACTIVE_JOBS_PER_USER} generation jobs "
+                   "may run at once"
+        )
+    return jsonable_encoder(job.to_dict())
+
+
+@router.get("/generate/batch/{job_id}", dependencies=[Depends(limit_crud)])
+async def get_generation_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+):
+    job = generation_pool.store.get(job_id)
+    if job is None or job.user_id != current_user["uid"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jsonable_encoder(job.to_dict())
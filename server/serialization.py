@@ -0,0 +1,42 @@
+"""
+Fast JSON responses for documents we wrote ourselves
+
+Routes that return Pydantic models pay for validation up to three times per
+item: building the model, dumping it, and FastAPI re-validating the result
+against response_model. Recipe documents are validated when they are
+written, so reads can skip all of that: models/recipe.recipe_out_dict
+shapes a document into the RecipeOut JSON layout and FastJSONResponse
+encodes it with orjson. Returning a Response from a route also makes
+FastAPI skip its response_model pass; response_model stays on the route
+for the OpenAPI schema.
+"""
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+
+# OPT_UTC_Z writes UTC datetimes as ...Z, matching Pydantic's output
+def encode(content: Any) -> bytes:
+    return orjson.dumps(
+        content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    )
+
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return encode(content)
+
+
+# Returning a Response bypasses the headers and status a route set on its
+# injected `response` parameter, so carry them over
+def json_response(
+    content: Any, response: Optional[Response] = None,
+    status_code: int = 200,
+) -> FastJSONResponse:
+    headers = dict(response.headers) if response is not None else None
+    if response is not None and response.status_code:
+        status_code = response.status_code
+    return FastJSONResponse(content, status_code=status_code,
+                            headers=headers)
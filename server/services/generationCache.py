@@ -0,0 +1,108 @@
+"""
+Result cache and single-flight deduplication for recipe generation
+
+Identical pantry submissions (a double-click, or several users with the same
+ingredients) should cost one upstream LLM call. Requests are keyed on a
+canonical form of the ingredient set (quantities converted to base units by
+services/units.py) plus the model settings; concurrent callers with the
+same key await one shared task, and completed results are kept for a short
+TTL in a size-bounded LRU.
+"""
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple
+
+from config import get_settings
+from services.units import normalize_name, to_base
+
+GENERATION_CACHE_TTL = get_settings().generation_cache_ttl
+GENERATION_CACHE_SIZE = get_settings().generation_cache_size
+
+
+# "1 cup" and "16 tbsp" of rice share a cache entry; three significant
+# figures absorb the rounding in the conversion factors
+def _base(quantity: float, unit: str) -> Tuple[str, float]:
+    base_qty, base_unit = to_base(quantity, unit)
+    return base_unit, float(f"{base_qty:.3g}")
+
+
+# Order-independent key for a list of objects with name/quantity/unit
+def generation_key(
+    ingredients: Iterable[Any], model: str, temperature: float
+) -> Tuple[Hashable, ...]:
+    items = sorted(
+        (normalize_name(i.name),) + _base(i.quantity, i.unit)
+        for i in ingredients
+    )
+    return (model, round(float(temperature), 3), tuple(items))
+
+
+class GenerationCache:
+    def __init__(
+        self,
+        ttl: float = GENERATION_CACHE_TTL,
+        max_size: int = GENERATION_CACHE_SIZE,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = (
+            OrderedDict()
+        )
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _get(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        # Reading the exception also keeps asyncio from logging it as
+        # "never retrieved" when every waiter has gone away
+        if task.exception() is None:
+            self._store(key, task.result())
+
+    async def get_or_generate(
+        self, key: Hashable, generate: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        value = self._get(key)
+        if value is not None:
+            return copy.deepcopy(value)
+
+        task = self._inflight.get(key)
+        if task is None:
+            # The upstream call runs as its own task so one caller
+            # disconnecting does not cancel it for everyone else
+            task = asyncio.ensure_future(generate())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+
+        value = await asyncio.shield(task)
+        return copy.deepcopy(value)
+
+
+generation_cache = GenerationCache()
@@ -0,0 +1,252 @@
+"""
+Background batch generation: N candidate recipes for one pantry
+
+POST /recipes/generate/batch submits a job and returns at once; the
+candidates are produced by a small pool of asyncio workers and collected
+with GET /recipes/generate/batch/{job_id}.
+
+- At most GENERATION_CONCURRENCY upstream calls run at a time, process-wide.
+- Each user has their own queue and the workers take from the queues in
+  turn, so one user's batch of 5 does not delay everyone behind it.
+- A rate-limit reply (HTTP 429) pauses all dispatching until the
+  provider's retry-after (or an exponential backoff with jitter) has passed,
+  and the candidate is retried up to GENERATION_MAX_ATTEMPTS times.
+
+Jobs live in an in-memory store (per process) for JOB_TTL seconds after
+they finish. Candidates are not saved to the user's recipes; the client
+saves the one it picks with POST /recipes.
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from config import get_settings
+from services.llmClient import upstream_retry_after
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+GENERATION_CONCURRENCY = settings.generation_concurrency
+GENERATION_MAX_ATTEMPTS = settings.generation_max_attempts
+MAX_CANDIDATES = 5
+MAX_ACTIVE_JOBS_PER_USER = 3
+JOB_TTL = settings.generation_job_ttl
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+Generate = Callable[..., Awaitable[dict]]
+
+
+class TooManyJobsError(Exception):
+    pass
+
+
+class GenerationJob:
+    def __init__(self, user_id: str, ingredients: List[str], count: int,
+                 options: Optional[dict] = None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.ingredients = ingredients
+        self.count = count
+        # keyword arguments for each generate call (model, temperature)
+        self.options = options or {}
+        self.status = QUEUED
+        self.results: List[Optional[dict]] = [None] * count
+        self.errors: List[Optional[str]] = [None] * count
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        self._pending = count
+        self._finished_mono: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def _complete_one(self) -> None:
+        self._pending -= 1
+        if self._pending == 0:
+            ok = any(r is not None for r in self.results)
+            self.status = DONE if ok else FAILED
+            self.finished_at = datetime.now(timezone.utc)
+            self._finished_mono = time.monotonic()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "count": self.count,
+            "completed": self.count - self._pending,
+            "recipes": [r for r in self.results if r is not None],
+            "errors": [e for e in self.errors if e is not None],
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# Jobs by id, dropped JOB_TTL seconds after they finish. Anything with the
+# same get/put/active_for_user methods can stand in (e.g. a shared store
+# when running several instances).
+class InMemoryJobStore:
+    def __init__(self, ttl: float = JOB_TTL):
+        self.ttl = ttl
+        self._jobs: Dict[str, GenerationJob] = {}
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job._finished_mono is not None and job._finished_mono < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def put(self, job: GenerationJob) -> None:
+        self._prune()
+        self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def active_for_user(self, user_id: str) -> int:
+        return sum(
+            1 for job in self._jobs.values()
+            if job.user_id == user_id and not job.finished
+        )
+
+    def clear(self) -> None:
+        self._jobs.clear()
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: uniform in [0, base * 2^attempt], capped
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+async def _default_generate(ingredients: List[str], **options) -> dict:
+    # Looked up per call so tests can swap gptClient.client for a fake
+    from services.gptClient import generate_recipe_from_ingredients
+    return await generate_recipe_from_ingredients(ingredients, **options)
+
+
+class GenerationWorkerPool:
+    def __init__(
+        self,
+        generate: Generate = _default_generate,
+        store: Optional[InMemoryJobStore] = None,
+        concurrency: int = GENERATION_CONCURRENCY,
+        max_attempts: int = GENERATION_MAX_ATTEMPTS,
+    ):
+        self.generate = generate
+        self.store = store if store is not None else InMemoryJobStore()
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        # user id -> queued (job, candidate index, attempt); users with
+        # work wait their turn in _ready
+        self._queues: Dict[str, Deque[Tuple[GenerationJob, int, int]]] = {}
+        self._ready: Deque[str] = deque()
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._paused_until = 0.0
+
+    def _start(self) -> None:
+        if self._workers:
+            return
+        self._wakeup = asyncio.Condition()
+        self._workers = [
+            asyncio.ensure_future(self._work())
+            for _ in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues.clear()
+        self._ready.clear()
+
+    async def _enqueue(
+        self, job: GenerationJob, index: int, attempt: int, front=False
+    ) -> None:
+        queue = self._queues.setdefault(job.user_id, deque())
+        if front:
+            queue.appendleft((job, index, attempt))
+        else:
+            queue.append((job, index, attempt))
+        if job.user_id not in self._ready:
+            self._ready.append(job.user_id)
+        async with self._wakeup:
+            self._wakeup.notify()
+
+    async def submit(
+        self, user_id: str, ingredients: List[str], count: int, **options
+    ) -> GenerationJob:
+        if self.store.active_for_user(user_id) >= MAX_ACTIVE_JOBS_PER_USER:
+            raise TooManyJobsError(user_id)
+        self._start()
+        job = GenerationJob(user_id, ingredients, count, options)
+        self.store.put(job)
+        for index in range(count):
+            await self._enqueue(job, index, 0)
+        return job
+
+    # Round robin over users: take one item from the next user in line,
+    # then send that user to the back if they have more queued
+    def _next(self) -> Optional[Tuple[GenerationJob, int, int]]:
+        if not self._ready:
+            return None
+        user_id = self._ready.popleft()
+        queue = self._queues[user_id]
+        item = queue.popleft()
+        if queue:
+            self._ready.append(user_id)
+        else:
+            del self._queues[user_id]
+        return item
+
+    async def _work(self) -> None:
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: bool(self._ready))
+                job, index, attempt = self._next()
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self._run(job, index, attempt)
+
+    async def _run(self, job: GenerationJob, index: int, attempt: int):
+        import openai  # deferred to the first job; see llmClient
+        job.status = RUNNING
+        try:
+            job.results[index] = await self.generate(job.ingredients,
+                                                     **job.options)
+        except openai.RateLimitError as e:
+            if attempt + 1 < self.max_attempts:
+                delay = upstream_retry_after(e) or _backoff(attempt)
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + delay
+                )
+                logger.warning("Rate limited; pausing generation for %.1fs",
+                               delay)
+                await self._enqueue(job, index, attempt + 1, front=True)
+                return
+            job.errors[index] = "Rate limited by the recipe generator"
+        except Exception as e:
+            logger.exception("Batch candidate %d of job %s failed",
+                             index, job.id)
+            job.errors[index] = str(e) or type(e).__name__
+        job._complete_one()
+
+
+generation_pool = GenerationWorkerPool()
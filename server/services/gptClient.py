@@ -1,72 +1,208 @@
 import rapidjson
 import re
-from openai import AsyncOpenAI
-from dotenv import load_dotenv
+from config import get_settings
 from models.recipe import RecipeCreate
 from models.ingredient import Ingredient  # Make sure this is used
-from fractions import Fraction
+from services.metrics import (
+    llm_events, prompt_tokens, record_llm_usage, span
+)
+from services.promptBuilder import estimate_tokens
+from services.llmClient import resilient_llm, LLM_DEADLINE
+# parse_ingredient_string stays importable from here for existing callers
+from services.ingredientParser import (
+    parse_ingredient_string, parse_ingredient_lines
+)
+from pydantic import BaseModel, ValidationError
+from typing import TYPE_CHECKING, AsyncIterator, Optional, Type
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+settings = get_settings()
+
+# Built by get_client() on first use: importing openai takes longer than
+# the rest of startup combined. Tests may assign a fake here.
+client: Optional["AsyncOpenAI"] = None
+
+
+def get_client() -> "AsyncOpenAI":
+    global client
+    if client is None:
+        from openai import AsyncOpenAI
+        # Retries and deadlines are handled by services/llmClient.py, so
+        # the SDK's own retry loop is turned off
+        client = AsyncOpenAI(api_key=settings.openai_api_key,
+                             timeout=LLM_DEADLINE, max_retries=0)
+    return client
+
+GPT_MODEL = settings.gpt_model
+GPT_TEMPERATURE = settings.gpt_temperature
 
-load_dotenv()
-client = AsyncOpenAI()
+# Models that accept response_format={"type": "json_schema"}; the rest
+# (e.g. gpt-3.5-turbo-1106) get JSON mode, which guarantees a JSON object
+# but not its shape
+STRUCTURED_OUTPUT_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3",
+                              "o4")
 
 GPT_RECIPE_PROMPT_TEMPLATE = (
     "You are a world-class chef.\n"
     "Create a recipe in JSON format with the following fields:\n"
     "- title (str)\n"
     "- description (str)\n"
-    "- ingredients (list of strings)\n"
+    "- ingredients (list of objects with name (str), quantity (number) "
+    "and unit (str))\n"
     "- steps (list of strings)\n"
     "- prep_time (int)\n"
     "- cook_time (int)\n"
     "- servings (int)\n"
     "- image_url (str or null)\n\n"
-    "You will be provided a list of available ingredients. Choose a recipe"
-    "that uses a reasonable subset of them. Be mindful of portions - do not"
-    "use all of each ingredient unless appropriate for a recipe that serves"
-    "2-6 people. Make sure to include the number of servings in the JSON"
-    "response using the 'servings' field..\n"
+    "You will be provided a list of available ingredients. Choose a recipe "
+    "that uses a reasonable subset of them. Be mindful of portions - do not "
+    "use all of each ingredient unless appropriate for a recipe that serves "
+    "2-6 people. Make sure to include the number of servings in the JSON "
+    "response using the 'servings' field.\n"
     "Available Ingredients: {}"
 )
 
-# Helper to process GPT ingredient strings into
-# structured Ingredient-like dicts
-def parse_ingredient_string(s: str) -> dict:
-    if "to taste" in s.lower():
-        name = s.lower().replace("to taste", "").strip() or "Seasoning"
-        return {"name": name.title(), "quantity": 0.0, "unit": "to taste"}
-
-    parts = s.replace(",", "").split()
-    quantity = float(Fraction(parts[0]))
-    unit = parts[1].lower()
-    name = " ".join(parts[2:])
-
-    known_units = {
-        "tsp", "tbsp", "cups", "cup", "cloves", "pieces", "grams",
-        "ml", "oz", "pint", "liters", "lb", "kg"
-    }
-    if unit not in known_units:
-        name = " ".join([unit] + parts[2:])
-        unit = "units"
-    else:
-        modifiers = {"chopped", "minced", "diced", "grated", "sliced"}
-        tokens = name.split()
-        if tokens and tokens[-1] in modifiers:
-            tokens.pop()
-        name = " ".join(tokens).title()
-
-    return {"name": name, "quantity": quantity, "unit": unit}
 
-
-# Main GPT-to-recipe generator
-async def generate_recipe_from_ingredients(ingredients: list[str]) -> dict:
+# JSON schema for structured outputs derived from a Pydantic model. Strict
+# mode wants every property required (optional ones become nullable), no
+# extra properties, inlined definitions and none of the keywords it does
+# not support; the model's own validation still enforces those limits.
+_UNSUPPORTED_KEYWORDS = ("title", "default", "format", "minLength",
+                         "maxLength", "minimum", "maximum")
+
+
+def strict_json_schema(model: Type[BaseModel]) -> dict:
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def convert(node):
+        if isinstance(node, list):
+            return [convert(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        if "$ref" in node:
+            return convert(defs[node["$ref"].rsplit("/", 1)[-1]])
+        converted = {}
+        for key, value in node.items():
+            if key == "properties":
+                # Field names, not keywords: a field called "title" stays
+                converted[key] = {
+                    name: convert(prop) for name, prop in value.items()
+                }
+            elif key not in _UNSUPPORTED_KEYWORDS:
+                converted[key] = convert(value)
+        node = converted
+        if node.get("type") == "object" and "properties" in node:
+            node["required"] = list(node["properties"])
+            node["additionalProperties"] = False
+        return node
+
+    return convert(schema)
+
+
+RECIPE_JSON_SCHEMA = strict_json_schema(RecipeCreate)
+
+
+def response_format(model: str = GPT_MODEL) -> dict:
+    if model.startswith(STRUCTURED_OUTPUT_PREFIXES):
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "recipe",
+                "strict": True,
+                "schema": RECIPE_JSON_SCHEMA,
+            },
+        }
+    return {"type": "json_object"}
+
+
+# ingredients are prompt lines, already deduped, ranked and cut to the
+# token budget by services/promptBuilder.select_ingredients
+def build_prompt(ingredients: list[str]) -> str:
     prompt = GPT_RECIPE_PROMPT_TEMPLATE.format(", ".join(ingredients))
+    prompt_tokens.observe(estimate_tokens(prompt))
+    return prompt
 
-    response = await client.chat.completions.create(
-        model="gpt-3.5-turbo-1106",
+
+# Main GPT-to-recipe generator
+# llm may be any object shaped like AsyncOpenAI (e.g. a fake in tests).
+# Callers that key a cache on the model and temperature pass the same
+# values here, so the key always describes the call that was made.
+async def generate_recipe_from_ingredients(
+    ingredients: list[str], llm: Optional["AsyncOpenAI"] = None,
+    model: str = GPT_MODEL, temperature: float = GPT_TEMPERATURE,
+) -> dict:
+    prompt = build_prompt(ingredients)
+
+    # Deadline, retries, repair of unparseable replies, hedging and the
+    # circuit breaker come from resilient_llm
+    return await resilient_llm.complete_json(
+        llm or get_client(),
+        parse_recipe_reply,
+        on_response=lambda response: record_llm_usage(
+            model, getattr(response, "usage", None)
+        ),
+        model=model,
         messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
+        temperature=temperature,
+        response_format=response_format(model),
     )
-    content = response.choices[0].message.content.strip()
+
+
+# Streamed variant: yields the raw text deltas as GPT produces them.
+# The caller joins them and passes the result to parse_recipe_reply.
+async def stream_recipe_from_ingredients(
+    ingredients: list[str], llm: Optional["AsyncOpenAI"] = None,
+    model: str = GPT_MODEL, temperature: float = GPT_TEMPERATURE,
+) -> AsyncIterator[str]:
+    prompt = build_prompt(ingredients)
+
+    # llm_stream_open is the wait for the first byte; the whole stream is
+    # recorded as llm_stream. The final chunk carries usage and no choices.
+    with span("llm_stream"):
+        with span("llm_stream_open"):
+            stream = await resilient_llm.open_stream(
+                llm or get_client(),
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                response_format=response_format(model),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+        usage = None
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    record_llm_usage(model, usage)
+
+
+# Turn a complete GPT reply into a validated RecipeCreate dict. Replies
+# from JSON/structured output mode validate in one pass; anything else
+# (code fences, trailing commas, ingredient strings) takes the repair path
+# in parse_recipe_content, which is counted as a parse_fallback event.
+def parse_recipe_reply(content: str) -> dict:
+    try:
+        with span("recipe_validate_json"):
+            validated = RecipeCreate.model_validate_json(content)
+    except ValidationError:
+        llm_events.inc("parse_fallback")
+        return parse_recipe_content(content)
+    recipe_data = validated.model_dump(mode="python")
+    if recipe_data["description"] is None:
+        recipe_data["description"] = ""
+    return recipe_data
+
+
+# Repair path: clean up a loosely formatted reply, then validate
+def parse_recipe_content(content: str) -> dict:
+    content = content.strip()
 
     # Strip wrapping code blocks
     if content.startswith("```"):
@@ -79,7 +215,8 @@ async def generate_recipe_from_ingredients(ingredients: list[str]) -> dict:
     if content.startswith('"') and content.endswith('"'):
         content = content[1:-1]
 
-    recipe_data = rapidjson.loads(content)
+    with span("json_parse"):
+        recipe_data = rapidjson.loads(content)
 
     # Normalize GPT outputs
     recipe_data.setdefault("description", "")
@@ -87,18 +224,26 @@ async def generate_recipe_from_ingredients(ingredients: list[str]) -> dict:
     if recipe_data.get("image_url") == "null":
         recipe_data["image_url"] = None
 
-    # Parse ingredients into structured objects
+    # Parse ingredient strings into structured objects, in one batch;
+    # items already sent as {name, quantity, unit} objects are kept
+    items = recipe_data.get("ingredients", [])
+    parsed_lines = iter(parse_ingredient_lines(
+        [item for item in items if isinstance(item, str)]
+    ))
     parsed_ingredients = []
-    for s in recipe_data.get("ingredients", []):
+    for item in items:
+        parsed = next(parsed_lines) if isinstance(item, str) else item
+        if not isinstance(parsed, dict) or not parsed.get("name"):
+            continue
         try:
-            parsed = parse_ingredient_string(s)
-            Ingredient(**parsed)  # Validate early
-            parsed_ingredients.append(parsed)
+            # Validate early
+            parsed_ingredients.append(Ingredient(**parsed).model_dump())
         except Exception:
             continue
 
     recipe_data["ingredients"] = parsed_ingredients
 
     # Final Pydantic validation using RecipeCreate
-    validated = RecipeCreate.model_validate(recipe_data)
+    with span("recipe_validate"):
+        validated = RecipeCreate.model_validate(recipe_data)
     return validated.model_dump(mode="python")  # use "python" for MongoDB
@@ -0,0 +1,92 @@
+"""
+Readiness checks for the /health/ready probe
+
+Readiness means this instance can serve real traffic: Mongo answers a ping,
+the Firebase signing keys are loaded (fetching them if needed, which also
+warms token verification), and the LLM client has credentials. Checks run
+concurrently with a timeout each, and the combined result is cached for a
+few seconds so frequent probes stay cheap.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+import db
+from config import get_settings
+from services.tokenVerifier import token_verifier
+
+READINESS_CACHE_SECONDS = get_settings().readiness_cache_seconds
+CHECK_TIMEOUT_SECONDS = get_settings().readiness_check_timeout
+
+
+async def check_mongo() -> None:
+    await db.get_db().command("ping")
+
+
+async def check_firebase() -> None:
+    if not token_verifier.keys.loaded:
+        await token_verifier.keys.refresh()
+
+
+async def check_llm() -> None:
+    # Configuration only: a real completion would cost money per probe, and
+    # building the client would import openai on the first probe
+    if not get_settings().openai_api_key:
+        raise RuntimeError("OpenAI API key is not configured")
+
+
+CHECKS: Dict[str, Callable[[], Awaitable[None]]] = {
+    "mongo": check_mongo,
+    "firebase": check_firebase,
+    "llm": check_llm,
+}
+
+
+async def _timed(check: Callable[[], Awaitable[None]]) -> dict:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(check(), CHECK_TIMEOUT_SECONDS)
+        result = {"ok": True}
+    except asyncio.TimeoutError:
+        result = {"ok": False, "error": "timed out"}
+    except Exception as e:
+        result = {"ok": False, "error": str(e) or type(e).__name__}
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+
+class ReadinessProbe:
+    def __init__(self, ttl: float = READINESS_CACHE_SECONDS):
+        self.ttl = ttl
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return (self._result is not None
+                and time.monotonic() - self._checked_at < self.ttl)
+
+    async def check(self) -> dict:
+        if self._fresh():
+            return self._result
+        async with self._lock:
+            # Concurrent probes share the check that was already running
+            if self._fresh():
+                return self._result
+            names = list(CHECKS)
+            results = await asyncio.gather(
+                *(_timed(CHECKS[name]) for name in names)
+            )
+            checks = dict(zip(names, results))
+            self._result = {
+                "status": ("ready" if all(c["ok"] for c in results)
+                           else "not_ready"),
+                "checks": checks,
+                "checked_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self._checked_at = time.monotonic()
+            return self._result
+
+
+readiness_probe = ReadinessProbe()
@@ -0,0 +1,141 @@
+"""
+Index bootstrap and query-plan checks
+
+ensure_indexes creates the indexes our route queries rely on; it runs in the
+FastAPI lifespan on startup and is idempotent (Mongo skips indexes that
+already exist). explain_query_shapes runs explain() on the query shape of
+each list/lookup route and flags any that still plan a COLLSCAN.
+
+Run the diagnostics by hand from the server folder:
+    python -m services.indexes
+or on startup by setting INDEX_DIAGNOSTICS=1.
+"""
+import asyncio
+import logging
+from typing import List, Set
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "recipes": [
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING),
+             ("_id", DESCENDING)],
+            name="user_created",
+        ),
+        # GET /recipes/search?q=...; the user_id prefix keeps each search
+        # to one user's recipes. Title matches weigh most.
+        IndexModel(
+            [("user_id", ASCENDING), ("title", TEXT), ("description", TEXT),
+             ("ingredients.name", TEXT)],
+            weights={"title": 10, "ingredients.name": 5, "description": 1},
+            name="user_recipe_text",
+        ),
+        # Startup load of the similar-recipe index, newest first
+        IndexModel([("source", ASCENDING), ("_id", DESCENDING)],
+                   name="source_id"),
+    ],
+    "ingredients": [
+        IndexModel([("user_id", ASCENDING), ("name", ASCENDING)],
+                   name="user_name"),
+    ],
+    "users": [
+        # Partial so legacy documents without the field do not collide
+        IndexModel(
+            [("uid", ASCENDING)], name="uid_unique", unique=True,
+            partialFilterExpression={"uid": {"$type": "string"}},
+        ),
+        IndexModel(
+            [("email", ASCENDING)], name="email_unique", unique=True,
+            partialFilterExpression={"email": {"$type": "string"}},
+        ),
+    ],
+}
+
+# Collections whose indexes ensure_indexes has confirmed in this process.
+# Routes that lean on a unique index check by hand until theirs is here.
+indexed_collections: Set[str] = set()
+
+# (route, collection, filter, sort) for every query a route issues
+SAMPLE_UID = "index-diagnostics"
+QUERY_SHAPES = [
+    ("GET /recipes", "recipes", {"user_id": SAMPLE_UID},
+     [("created_at", -1), ("_id", -1)]),
+    ("GET /recipes/search", "recipes",
+     {"user_id": SAMPLE_UID, "$text": {"$search": "diagnostics"}}, None),
+    ("similar-recipe index load", "recipes", {"source": "generated"},
+     [("_id", -1)]),
+    ("GET /ingredients", "ingredients", {"user_id": SAMPLE_UID},
+     [("_id", 1)]),
+    ("POST /user/login", "users", {"email": "diagnostics@example.com"},
+     None),
+    ("POST /user/profile", "users", {"uid": SAMPLE_UID}, None),
+]
+
+
+async def ensure_indexes(db) -> None:
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            # e.g. duplicate emails already stored; serve without the index
+            # rather than failing startup
+            indexed_collections.discard(collection)
+            logger.warning("Could not create indexes on %s: %s",
+                           collection, e)
+        else:
+            indexed_collections.add(collection)
+
+
+def _stages(plan) -> List[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_stages(value))
+    return stages
+
+
+async def explain_query_shapes(db) -> List[dict]:
+    report = []
+    for route, collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = await cursor.explain()
+        stages = _stages(plan.get("queryPlanner", {}).get("winningPlan"))
+        report.append({
+            "route": route,
+            "collection": collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return report
+
+
+def print_report(report: List[dict]) -> None:
+    for entry in report:
+        flag = "COLLSCAN" if entry["collscan"] else "ok"
+        print(f"[{flag:>8}] {entry['route']:<20} {entry['collection']:<12} "
+              f"{' > '.join(entry['stages'])}")
+
+
+async def _main() -> None:
+    import db
+    database = await db.connect()
+    try:
+        await ensure_indexes(database)
+        print_report(await explain_query_shapes(database))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
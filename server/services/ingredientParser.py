@@ -0,0 +1,185 @@
+"""
+Table-driven parser for free-text ingredient lines
+
+Turns lines such as "1 1/2 cups flour", "2-3 cloves garlic, minced",
+"½ tsp salt" or "a pinch of nutmeg" into {name, quantity, unit} dicts that
+validate as models.ingredient.Ingredient. All lookup tables and regexes are
+built once at import; parsing a line is one regex match plus a few dict
+lookups.
+
+Conventions:
+- ranges ("2-3", "2 to 3") use the upper bound
+- lines with no quantity, and "to taste" lines, become quantity 0 with
+  unit "to taste"
+- an unrecognised unit word stays part of the name and the unit is "units"
+- "T" is a tablespoon and "t" a teaspoon, so case is kept until the unit
+  has been read
+- a quantity and unit with nothing after them ("3 g") parse with an empty
+  name; callers decide whether that is usable
+"""
+import re
+from typing import Iterable, List, Optional
+
+from services.units import UNIT_ALIASES
+
+# Unit spellings come from the shared registry so parsed ingredients use
+# the same canonical units as stored ones
+# Two-word units ("fl oz") are matched before single words
+MULTIWORD_UNIT_RE = re.compile(
+    "(" + "|".join(
+        re.escape(a)
+        for a in sorted(UNIT_ALIASES, key=len, reverse=True) if " " in a
+    ) + r")(?: |$)",
+    re.IGNORECASE,
+)
+# Abbreviations whose case matters, checked before UNIT_ALIASES
+CASE_SENSITIVE_UNITS = {"T": "tbsp", "t": "tsp"}
+
+UNICODE_FRACTIONS = {
+    "½": 1 / 2, "⅓": 1 / 3, "⅔": 2 / 3, "¼": 1 / 4, "¾": 3 / 4,
+    "⅕": 1 / 5, "⅖": 2 / 5, "⅗": 3 / 5, "⅘": 4 / 5, "⅙": 1 / 6,
+    "⅚": 5 / 6, "⅛": 1 / 8, "⅜": 3 / 8, "⅝": 5 / 8, "⅞": 7 / 8,
+}
+
+WORD_QUANTITIES = {
+    "a": 1.0, "an": 1.0, "one": 1.0, "two": 2.0, "three": 3.0,
+    "four": 4.0, "five": 5.0, "six": 6.0, "seven": 7.0, "eight": 8.0,
+    "nine": 9.0, "ten": 10.0, "eleven": 11.0, "twelve": 12.0,
+    "dozen": 12.0, "half": 0.5, "half a": 0.5, "a couple": 2.0,
+    "a couple of": 2.0, "a few": 3.0, "few": 3.0, "several": 3.0,
+}
+
+MODIFIERS = frozenset({
+    "chopped", "minced", "diced", "grated", "sliced", "shredded", "crushed",
+    "cubed", "peeled", "halved", "quartered", "julienned", "mashed",
+    "melted", "softened", "beaten", "sifted", "packed", "divided",
+    "fresh", "freshly", "finely", "roughly", "coarsely", "thinly",
+    "large", "medium", "small", "optional",
+})
+# Stripped only from the front of a name ("fresh basil" is basil)
+LEADING_ONLY = frozenset({"fresh"})
+
+_FRACTION_CHARS = "".join(UNICODE_FRACTIONS)
+_NUMBER = (
+    rf"(?:\d+\s*[{_FRACTION_CHARS}]"   # 1½
+    r"|\d+\s+\d+/\d+"                  # 1 1/2
+    r"|\d+/\d+"                        # 1/2
+    r"|\d*\.\d+"                       # .5, 0.25
+    r"|\d+"                            # 2
+    rf"|[{_FRACTION_CHARS}])"          # ½
+)
+QUANTITY_RE = re.compile(
+    rf"({_NUMBER})(?:\s*(?:-|–|—|to|or)\s*({_NUMBER}))?\s*", re.IGNORECASE
+)
+WORD_QUANTITY_RE = re.compile(
+    r"(" + "|".join(
+        re.escape(w) for w in sorted(WORD_QUANTITIES, key=len, reverse=True)
+    ) + r")\b\s*",
+    re.IGNORECASE,
+)
+BULLET_RE = re.compile(r"(?:[-*•·]|\d+[.)]) ")
+PARENS_RE = re.compile(r"\([^)]*\)")
+TO_TASTE_RE = re.compile(r",?\s*\bto taste\b", re.IGNORECASE)
+
+
+def _number(token: str) -> float:
+    token = token.strip()
+    frac = UNICODE_FRACTIONS.get(token[-1])
+    if frac is not None:
+        whole = token[:-1].strip()
+        return float(whole) + frac if whole else frac
+    if "/" in token:
+        whole, _, frac = token.rpartition(" ")
+        num, den = frac.split("/")
+        value = float(num) / float(den)
+        return value + float(whole) if whole else value
+    return float(token)
+
+
+def _clean_name(text: str) -> str:
+    # Notes after a comma ("garlic, minced") and parentheticals are dropped
+    if "(" in text:
+        text = PARENS_RE.sub(" ", text)
+    words = text.lower().split(",", 1)[0].replace(";", " ").split()
+    while words and words[0] in MODIFIERS:
+        words.pop(0)
+    while words and words[-1] in MODIFIERS and words[-1] not in LEADING_ONLY:
+        words.pop()
+    if len(words) > 1 and words[-1] in ("and", "or"):
+        words.pop()
+    return " ".join(words).title()
+
+
+def parse_ingredient_string(s: str) -> dict:
+    text = " ".join(s.split())
+    match = BULLET_RE.match(text)
+    if match:
+        text = text[match.end():]
+    if not text:
+        raise ValueError("Empty ingredient line")
+
+    if "to taste" in text.lower():
+        name = _clean_name(TO_TASTE_RE.sub("", text)) or "Seasoning"
+        return {"name": name, "quantity": 0.0, "unit": "to taste"}
+
+    quantity: Optional[float] = None
+    match = QUANTITY_RE.match(text)
+    if match:
+        low = _number(match.group(1))
+        quantity = low
+        if match.group(2):
+            high = _number(match.group(2))
+            # "1-1/2" is a mixed number written with a dash, not a range
+            quantity = low + high if high < 1 <= low and high < low else high
+        text = text[match.end():]
+    else:
+        match = WORD_QUANTITY_RE.match(text)
+        if match:
+            quantity = WORD_QUANTITIES[match.group(1).lower()]
+            text = text[match.end():]
+
+    # "1 (14 oz) can tomatoes": the size note belongs to the unit
+    if "(" in text:
+        text = PARENS_RE.sub(" ", text).strip()
+
+    unit = None
+    match = MULTIWORD_UNIT_RE.match(text)
+    if match:
+        unit = UNIT_ALIASES[match.group(1).lower()]
+        text = text[match.end():]
+    else:
+        head, _, rest = text.partition(" ")
+        head = head.rstrip(".,")
+        canonical = (CASE_SENSITIVE_UNITS.get(head)
+                     or UNIT_ALIASES.get(head.lower()))
+        # A bare single-letter alias ("c", "t", "l", "g") only counts as a
+        # unit right after a number
+        if canonical and (len(head) > 1 or quantity is not None):
+            unit = canonical
+            text = rest
+    if text[:3].lower() == "of ":
+        text = text[3:]
+
+    name = _clean_name(text)
+    if not name and unit is None:
+        raise ValueError(f"No ingredient name in {s!r}")
+    if quantity is None:
+        if unit is None:
+            return {"name": name, "quantity": 0.0, "unit": "to taste"}
+        quantity = 1.0
+    if quantity <= 0:
+        raise ValueError(f"Non-positive quantity in {s!r}")
+    return {"name": name, "quantity": quantity, "unit": unit or "units"}
+
+
+# Parse many lines at once; failed lines come back as None so results stay
+# aligned with the input
+def parse_ingredient_lines(lines: Iterable[str]) -> List[Optional[dict]]:
+    results: List[Optional[dict]] = []
+    append = results.append
+    for line in lines:
+        try:
+            append(parse_ingredient_string(line))
+        except (ValueError, ZeroDivisionError, IndexError):
+            append(None)
+    return results
@@ -0,0 +1,298 @@
+"""
+Call policy for the LLM: deadline, retries, hedging and a circuit breaker
+
+ResilientLLM wraps chat.completions.create on any AsyncOpenAI-shaped client
+(the real one, a fake, or AsyncOpenAI(base_url=...) pointed at a local fake
+server):
+
+- Deadline: a call, including its retries, gives up after LLM_DEADLINE
+  seconds with LLMTimeoutError.
+- Retries: timeouts, connection errors and 5xx replies are retried up to
+  LLM_MAX_RETRIES times with full-jitter backoff, then LLMUnavailableError
+  is raised. 429s are not retried here; they are raised as-is so callers
+  (e.g. the batch pool) can back off, using upstream_retry_after() for
+  the wait the provider asked for.
+- Repair: complete_json() parses the reply and, when that fails, asks the
+  model once more with the parse error and its previous reply.
+- Hedging: with LLM_HEDGE_PERCENTILE set (e.g. 95), an attempt still
+  running after that percentile of recent latencies gets a second, racing
+  request; the first reply wins and the other is cancelled.
+- Circuit breaker: after LLM_BREAKER_FAILURES consecutive upstream
+  failures calls fail fast with LLMUnavailableError for
+  LLM_BREAKER_RESET seconds, then one trial call is let through.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Optional
+
+from config import get_settings
+from services.metrics import llm_events, span
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+LLM_DEADLINE = settings.llm_deadline
+LLM_MAX_RETRIES = settings.llm_max_retries
+LLM_MAX_REPAIRS = settings.llm_max_repairs
+LLM_HEDGE_PERCENTILE = settings.llm_hedge_percentile  # None: no hedging
+LLM_BREAKER_FAILURES = settings.llm_breaker_failures
+LLM_BREAKER_RESET = settings.llm_breaker_reset
+RETRY_BASE = 0.5
+RETRY_MAX = 8.0
+HEDGE_MIN_SAMPLES = 20
+
+REPAIR_PROMPT = (
+    "Your previous reply could not be used: {}\n"
+    "Reply again with only the corrected JSON object, no other text."
+)
+
+# Upstream trouble worth retrying and counting against the breaker.
+# Resolved on first use: importing openai is most of a cold start, and
+# nothing needs it until the first LLM call.
+@lru_cache(maxsize=None)
+def transient_errors() -> tuple:
+    import openai
+    return (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+        asyncio.TimeoutError,
+    )
+
+
+# The provider's 429; caught by callers, never retried here
+@lru_cache(maxsize=None)
+def rate_limit_errors() -> tuple:
+    import openai
+    return (openai.RateLimitError,)
+
+
+# Seconds the provider asked us to wait, if it said
+def upstream_retry_after(e: Exception) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class LLMUnavailableError(Exception):
+    pass
+
+
+class LLMTimeoutError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES,
+                 reset_after: float = LLM_BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_after:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> None:
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open":
+            # Let this call probe the upstream; re-arming the timer keeps
+            # everyone else failing fast until it reports back
+            self._opened_at = time.monotonic()
+            return
+        llm_events.inc("circuit_rejected")
+        raise LLMUnavailableError("Recipe generator is temporarily "
+                                  "unavailable")
+
+    def record_success(self) -> None:
+        self._consecutive = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self._consecutive += 1
+        if self._opened_at is not None:
+            self._opened_at = time.monotonic()  # the probe failed
+        elif self._consecutive >= self.failures:
+            logger.warning("LLM circuit opened after %d failures",
+                           self._consecutive)
+            llm_events.inc("circuit_opened")
+            self._opened_at = time.monotonic()
+
+
+# Recent successful attempt latencies, for the hedging threshold
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return ordered[index]
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** attempt))
+
+
+class ResilientLLM:
+    def __init__(
+        self,
+        deadline: float = LLM_DEADLINE,
+        max_retries: int = LLM_MAX_RETRIES,
+        max_repairs: int = LLM_MAX_REPAIRS,
+        hedge_percentile: Optional[float] = LLM_HEDGE_PERCENTILE,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.max_repairs = max_repairs
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyWindow()
+
+    def _remaining(self, started: float) -> float:
+        remaining = self.deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            raise LLMTimeoutError("Recipe generator did not answer in time")
+        return remaining
+
+    async def _attempt(self, client, kwargs: dict):
+        start = time.monotonic()
+        with span("llm_completion"):
+            response = await client.chat.completions.create(**kwargs)
+        self.latency.add(time.monotonic() - start)
+        return response
+
+    # One attempt, raced against a hedge once it runs past the threshold
+    async def _hedged(self, client, kwargs: dict):
+        threshold = (self.latency.percentile(self.hedge_percentile)
+                     if self.hedge_percentile else None)
+        tasks = [asyncio.ensure_future(self._attempt(client, kwargs))]
+        try:
+            if threshold is not None:
+                done, _ = await asyncio.wait(tasks, timeout=threshold)
+                if not done:
+                    llm_events.inc("hedged")
+                    tasks.append(
+                        asyncio.ensure_future(self._attempt(client, kwargs))
+                    )
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # Every attempt failed: surface the first one's error
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                task.cancel()  # the loser, or all of them on cancellation
+
+    # chat.completions.create with the deadline, retries, hedging and
+    # breaker applied; returns the provider's response object
+    async def complete(self, client, started: Optional[float] = None,
+                       **kwargs):
+        started = started or time.monotonic()
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            try:
+                response = await asyncio.wait_for(
+                    self._hedged(client, kwargs), self._remaining(started)
+                )
+            except transient_errors() as e:
+                self.breaker.record_failure()
+                if time.monotonic() - started >= self.deadline:
+                    raise LLMTimeoutError(
+                        "Recipe generator did not answer in time"
+                    ) from e
+                if attempt >= self.max_retries:
+                    raise LLMUnavailableError(
+                        "Recipe generator is temporarily unavailable"
+                    ) from e
+                attempt += 1
+                llm_events.inc("retried")
+                logger.warning("LLM call failed (%s); retry %d",
+                               type(e).__name__, attempt)
+                await asyncio.sleep(
+                    min(_backoff(attempt), self._remaining(started))
+                )
+                continue
+            self.breaker.record_success()
+            return response
+
+    # complete() and parse the reply; when parse raises ValueError (which
+    # includes pydantic's ValidationError) ask the model to repair it
+    async def complete_json(self, client, parse: Callable[[str], dict],
+                            on_response=None, **kwargs) -> dict:
+        started = time.monotonic()
+        messages = list(kwargs.pop("messages"))
+        repairs = 0
+        while True:
+            response = await self.complete(
+                client, started=started, messages=messages, **kwargs
+            )
+            if on_response is not None:
+                on_response(response)
+            content = response.choices[0].message.content or ""
+            try:
+                return parse(content)
+            except ValueError as e:
+                if repairs >= self.max_repairs:
+                    raise
+                repairs += 1
+                llm_events.inc("repaired")
+                logger.warning("LLM reply did not parse; asking for a "
+                               "repair")
+                messages = messages + [
+                    {"role": "assistant", "content": content},
+                    {"role": "user",
+                     "content": REPAIR_PROMPT.format(str(e)[:500])},
+                ]
+
+    # Open a streamed completion under the breaker and deadline (retrying
+    # is left to the caller once deltas have been sent)
+    async def open_stream(self, client, **kwargs):
+        self.breaker.allow()
+        try:
+            stream = await asyncio.wait_for(
+                client.chat.completions.create(**kwargs), self.deadline
+            )
+        except transient_errors() as e:
+            self.breaker.record_failure()
+            if isinstance(e, asyncio.TimeoutError):
+                raise LLMTimeoutError(
+                    "Recipe generator did not answer in time"
+                ) from e
+            raise LLMUnavailableError(
+                "Recipe generator is temporarily unavailable"
+            ) from e
+        self.breaker.record_success()
+        return stream
+
+
+resilient_llm = ResilientLLM()
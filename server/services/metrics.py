@@ -0,0 +1,210 @@
+"""
+In-process metrics in the Prometheus text exposition format
+
+- MetricsMiddleware (middleware.py) records every request in
+  homespice_http_request_duration_seconds, labelled by route template
+  (e.g. /recipes/{recipe_id}) rather than raw path so ids do not explode
+  the label set.
+- span("phase") times one phase of a request into
+  homespice_phase_duration_seconds: token verification, the LLM call, JSON
+  parsing, Pydantic validation and each Mongo call.
+- LLM token usage is counted per model in homespice_llm_tokens_total.
+
+GET /metrics renders everything with render(). Metrics are per process;
+all updates happen on the event loop thread.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Seconds; the upper buckets are for LLM calls
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0, 30.0, 60.0,
+)
+
+# Starlette appends "; charset=utf-8"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return (value.replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra=()) -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in sorted(self._values.items()):
+            yield (f"{self.name}{_labels(self.label_names, labels)} "
+                   f"{_number(value)}")
+
+    def clear(self) -> None:
+        self._values.clear()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: (count per bucket, non-cumulative, plus +Inf; [sum])
+        self._series: Dict[Tuple[str, ...], tuple] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = (
+                [0] * (len(self.buckets) + 1), [0.0]
+            )
+        counts, total = series
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _labels(self.label_names, labels,
+                             [f'le="{_number(bound)}"'])
+                yield f"{self.name}_bucket{le} {cumulative}"
+            plain = _labels(self.label_names, labels)
+            yield f"{self.name}_sum{plain} {_number(total[0])}"
+            yield f"{self.name}_count{plain} {cumulative}"
+
+    def clear(self) -> None:
+        self._series.clear()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        for metric in self._metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "homespice_http_request_duration_seconds",
+    "Time to serve a request, by route template",
+    labels=("method", "route", "status"),
+))
+phase_duration = registry.register(Histogram(
+    "homespice_phase_duration_seconds",
+    "Time spent in one phase of handling a request",
+    labels=("phase",),
+))
+llm_tokens = registry.register(Counter(
+    "homespice_llm_tokens_total",
+    "Tokens billed by the LLM provider",
+    labels=("model", "kind"),
+))
+llm_requests = registry.register(Counter(
+    "homespice_llm_requests_total",
+    "Completion requests sent to the LLM provider",
+    labels=("model",),
+))
+llm_events = registry.register(Counter(
+    "homespice_llm_events_total",
+    "LLM call policy events: retried, repaired, parse_fallback, hedged, "
+    "circuit_opened, circuit_rejected",
+    labels=("event",),
+))
+prompt_tokens = registry.register(Histogram(
+    "homespice_prompt_tokens",
+    "Estimated tokens per generation prompt (see services/promptBuilder)",
+    buckets=(50, 100, 200, 400, 800, 1600, 3200, 6400),
+))
+prompt_ingredients_dropped = registry.register(Counter(
+    "homespice_prompt_ingredients_dropped_total",
+    "Pantry items left out of prompts by the token budget",
+))
+admission_events = registry.register(Counter(
+    "homespice_admission_events_total",
+    "Requests turned away: rate_limited (429) or shed (503), by scope",
+    labels=("scope", "result"),
+))
+similar_recipe_lookups = registry.register(Counter(
+    "homespice_similar_recipe_lookups_total",
+    "Similar-recipe index lookups for generation, by result (hit, miss)",
+    labels=("result",),
+))
+pantry_cache_events = registry.register(Counter(
+    "homespice_pantry_cache_total",
+    "Pantry snapshot cache events: hit, miss, not_modified, invalidated",
+    labels=("event",),
+))
+
+
+# Time the enclosed block as one phase; recorded even if it raises
+@contextmanager
+def span(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_duration.observe(time.perf_counter() - start, phase)
+
+
+# Count the usage block of a completion (absent on some fakes/providers)
+def record_llm_usage(model: str, usage) -> None:
+    llm_requests.inc(model)
+    if usage is None:
+        return
+    llm_tokens.inc(model, "prompt", amount=usage.prompt_tokens or 0)
+    llm_tokens.inc(model, "completion", amount=usage.completion_tokens or 0)
+
+
+def render() -> str:
+    return registry.render()
@@ -0,0 +1,146 @@
+"""
+Per-user pantry snapshot cache
+
+A user's ingredient list is small and read far more often than it changes
+(every pantry screen load, every recipe search), so the full list is kept
+in process as a snapshot: the documents, their JSON body and an ETag.
+
+- Reads: get_pantry returns the snapshot, loading it from Mongo on a miss.
+  GET /ingredients answers If-None-Match with 304 when the ETag matches.
+- Writes: every handler that changes a user's ingredients calls
+  pantry_cache.invalidate(uid) once its write is done. Invalidation bumps
+  the user's version; a load that started before the bump is not stored,
+  so a slow read cannot put back the list from before a write.
+- Bounds: at most PANTRY_CACHE_SIZE users are kept (least recently used
+  are evicted) and a snapshot expires after PANTRY_CACHE_TTL seconds.
+- Several instances: invalidation is per process, so a write served by one
+  instance is not seen by the others until their snapshot expires. The TTL
+  is that staleness bound, which is why it defaults to a few seconds (5):
+  long enough to absorb the bursts of reads a screen load makes, short
+  enough that another instance catches up with a write almost at once.
+  Raise it only when a single process serves the API. PANTRY_CACHE_TTL=0
+  turns caching off.
+
+The ETag is a hash of the body, not the version, so it stays valid across
+restarts and processes. The store is pluggable: anything with the
+InMemoryPantryStore methods can be passed to PantryCache.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from config import get_settings
+from models.ingredient import format_ingredient
+from pagination import INGREDIENT_SORT
+from serialization import encode
+from services.metrics import pantry_cache_events
+
+PANTRY_CACHE_TTL = get_settings().pantry_cache_ttl
+PANTRY_CACHE_SIZE = get_settings().pantry_cache_size
+
+
+class PantrySnapshot:
+    __slots__ = ("docs", "body", "etag", "expires_at")
+
+    def __init__(self, docs: List[dict], body: bytes, ttl: float):
+        self.docs = docs  # raw documents, in INGREDIENT_SORT order
+        self.body = body  # JSON of the formatted list, as GET returns it
+        digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.etag = f'"{digest}"'
+        self.expires_at = time.monotonic() + ttl
+
+    # If-None-Match may list several tags, weak ones, or "*"
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        if "*" in tags:
+            return True
+        return self.etag in {
+            tag[2:] if tag.startswith("W/") else tag for tag in tags
+        }
+
+
+class InMemoryPantryStore:
+    def __init__(self, max_size: int = PANTRY_CACHE_SIZE):
+        self.max_size = max_size
+        self._snapshots: "OrderedDict[str, PantrySnapshot]" = OrderedDict()
+        # Kept apart from the snapshots so an evicted user still rejects a
+        # load that raced an invalidation
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._clock = 0
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def version(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
+    def get(self, user_id: str) -> Optional[PantrySnapshot]:
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is None:
+            return None
+        if time.monotonic() >= snapshot.expires_at:
+            del self._snapshots[user_id]
+            return None
+        self._snapshots.move_to_end(user_id)
+        return snapshot
+
+    # Store only if nothing invalidated the user since `version` was read
+    def put(self, user_id: str, version: int,
+            snapshot: PantrySnapshot) -> bool:
+        if self.max_size <= 0 or self.version(user_id) != version:
+            return False
+        self._snapshots[user_id] = snapshot
+        self._snapshots.move_to_end(user_id)
+        while len(self._snapshots) > self.max_size:
+            self._snapshots.popitem(last=False)
+        return True
+
+    def invalidate(self, user_id: str) -> None:
+        self._snapshots.pop(user_id, None)
+        # A global clock, so a user's version never goes back to a value
+        # an in-flight load may hold
+        self._clock += 1
+        self._versions[user_id] = self._clock
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > 4 * max(self.max_size, 1):
+            self._versions.popitem(last=False)
+
+    def clear(self) -> None:
+        self._snapshots.clear()
+        self._versions.clear()
+
+
+class PantryCache:
+    def __init__(self, store=None, ttl: float = PANTRY_CACHE_TTL):
+        self.store = store if store is not None else InMemoryPantryStore()
+        self.ttl = ttl
+
+    async def _load(self, db, user_id: str) -> PantrySnapshot:
+        docs = await db.ingredients.find(
+            {"user_id": user_id}
+        ).sort(INGREDIENT_SORT).to_list(length=None)
+        body = encode([format_ingredient(dict(doc)) for doc in docs])
+        return PantrySnapshot(docs, body, self.ttl)
+
+    async def get_pantry(self, db, user_id: str) -> PantrySnapshot:
+        if self.ttl > 0:
+            snapshot = self.store.get(user_id)
+            if snapshot is not None:
+                pantry_cache_events.inc("hit")
+                return snapshot
+        pantry_cache_events.inc("miss")
+        version = self.store.version(user_id)
+        snapshot = await self._load(db, user_id)
+        if self.ttl > 0:
+            self.store.put(user_id, version, snapshot)
+        return snapshot
+
+    def invalidate(self, user_id: str) -> None:
+        pantry_cache_events.inc("invalidated")
+        self.store.invalidate(user_id)
+
+
+pantry_cache = PantryCache()
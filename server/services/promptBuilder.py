@@ -0,0 +1,152 @@
+"""
+Pantry selection for generation prompts
+
+Clients send their whole pantry, which for a well-stocked kitchen is a
+couple of hundred items and as many prompt tokens. select_ingredients turns
+that list into the lines that go into the prompt:
+
+1. Dedupe: items with the same normalized name and base unit are merged
+   (services/units.py), so "Milk 1 cup" + "milk 250 ml" is one line.
+2. Rank: preferred items first, then by perishability (use it before it
+   spoils), then by how much of it there is relative to similar items.
+3. Budget: lines are added in rank order until the estimated token count
+   reaches PROMPT_INGREDIENT_TOKEN_BUDGET.
+
+Token counts are estimated locally: with tiktoken installed its encoding is
+used, otherwise a word/punctuation heuristic that runs close to the real
+count for short ingredient lines.
+"""
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import get_settings
+from services.metrics import prompt_ingredients_dropped
+from services.units import (
+    TO_TASTE, merge_amounts, normalize_name, with_canonical
+)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed, or no cached encoding offline
+    _encoding = None
+
+PROMPT_INGREDIENT_TOKEN_BUDGET = get_settings().prompt_ingredient_token_budget
+
+# Keyword -> perishability (higher spoils sooner). Matched on whole words
+# of the normalized name; the highest match wins.
+PERISHABILITY = {
+    3: ("fish", "salmon", "tuna", "shrimp", "prawn", "seafood", "scallop",
+        "chicken", "beef", "pork", "lamb", "turkey", "sausage", "bacon",
+        "milk", "cream", "yogurt", "yoghurt", "berries", "strawberries",
+        "raspberries", "blueberries", "spinach", "lettuce",
+        "arugula", "basil", "cilantro", "parsley", "mint", "mushrooms",
+        "mushroom", "avocado", "tofu"),
+    2: ("egg", "eggs", "cheese", "butter", "tomato", "tomatoes", "pepper",
+        "peppers", "zucchini", "broccoli", "cauliflower", "cucumber",
+        "banana", "bananas", "apple", "apples", "lemon", "lime", "carrot",
+        "carrots", "celery", "cabbage", "kale", "bread", "ham"),
+    0: ("salt", "sugar", "flour", "rice", "pasta", "noodles", "oil",
+        "vinegar", "honey", "oats", "beans", "lentils", "canned", "dried",
+        "powder", "spice", "cumin", "paprika", "oregano", "cinnamon",
+        "sauce", "stock", "broth"),
+}
+DEFAULT_PERISHABILITY = 1
+_PERISHABILITY_WORDS = {
+    word: score
+    for score, words in sorted(PERISHABILITY.items())
+    for word in words
+}
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Words of more than 6 letters tend to split in two
+    return sum(
+        1 + (len(piece) > 6) for piece in _TOKEN_RE.findall(text)
+    )
+
+
+def perishability(name_key: str) -> int:
+    scores = [
+        _PERISHABILITY_WORDS[word]
+        for word in name_key.split() if word in _PERISHABILITY_WORDS
+    ]
+    return max(scores) if scores else DEFAULT_PERISHABILITY
+
+
+def format_line(item: dict) -> str:
+    if item["unit"] == TO_TASTE:
+        return item["name"]
+    return f"{item['quantity']:g} {item['unit']} {item['name']}"
+
+
+def _dedupe(items: Iterable[Any]) -> List[dict]:
+    merged: Dict[Tuple[str, str], dict] = {}
+    for item in items:
+        doc = with_canonical({
+            "name": " ".join(item.name.split()),
+            "quantity": float(item.quantity),
+            "unit": item.unit,
+        })
+        key = (doc["name_key"], doc["base_unit"])
+        merged[key] = (merge_amounts(merged[key], doc) if key in merged
+                       else doc)
+    return list(merged.values())
+
+
+def _rank(items: List[dict], preferences: Iterable[str]) -> List[dict]:
+    preferred = {normalize_name(p) for p in preferences if p.strip()}
+    # Largest amount per base unit, to compare quantities within a unit
+    largest: Dict[str, float] = {}
+    for item in items:
+        largest[item["base_unit"]] = max(
+            largest.get(item["base_unit"], 0.0), item["base_qty"]
+        )
+
+    def score(item: dict) -> tuple:
+        top = largest[item["base_unit"]]
+        amount = (math.log1p(item["base_qty"]) / math.log1p(top)
+                  if top > 0 else 0.0)
+        return (
+            item["name_key"] in preferred,
+            perishability(item["name_key"]),
+            amount,
+        )
+
+    # sorted() is stable, so ties keep the client's order
+    return sorted(items, key=score, reverse=True)
+
+
+class PromptIngredients:
+    __slots__ = ("lines", "tokens", "total", "dropped")
+
+    def __init__(self, lines: List[str], tokens: int, total: int):
+        self.lines = lines
+        self.tokens = tokens  # estimated tokens of ", ".join(lines)
+        self.total = total  # distinct items before the budget cut
+        self.dropped = total - len(lines)
+
+
+def select_ingredients(
+    items: Iterable[Any],
+    preferences: Iterable[str] = (),
+    budget: Optional[int] = None,
+) -> PromptIngredients:
+    budget = PROMPT_INGREDIENT_TOKEN_BUDGET if budget is None else budget
+    ranked = _rank(_dedupe(items), preferences)
+    lines: List[str] = []
+    tokens = 0
+    for item in ranked:
+        line = format_line(item)
+        cost = estimate_tokens(line) + (1 if lines else 0)  # ", "
+        if lines and tokens + cost > budget:
+            continue  # a shorter line further down may still fit
+        lines.append(line)
+        tokens += cost
+    prompt_ingredients_dropped.inc(amount=len(ranked) - len(lines))
+    return PromptIngredients(lines, tokens, len(ranked))
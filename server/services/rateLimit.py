@@ -0,0 +1,187 @@
+"""
+Per-user rate limits and admission control for generation
+
+Two layers keep one user, or a burst of everyone, from exhausting the LLM
+rate limit and piling up open requests:
+
+- Rate limits: a token bucket per (uid, scope). "generate" covers the
+  endpoints that call the LLM, "crud" everything else a signed-in user
+  does. A request over its bucket gets 429 with Retry-After set to when
+  the next token arrives. Budgets are RATE_LIMIT_<SCOPE>_PER_MINUTE with
+  bursts of RATE_LIMIT_<SCOPE>_BURST; a rate of 0 turns the scope off.
+- Admission: generation_gate lets at most GENERATION_MAX_CONCURRENT
+  interactive generations call the LLM at once, process-wide. Up to
+  GENERATION_MAX_QUEUE more wait, each for at most
+  GENERATION_QUEUE_TIMEOUT seconds; past that, requests are shed with 503
+  and Retry-After instead of queueing without bound. Cache hits never
+  take a slot.
+
+Buckets live in an in-memory store (per process); anything with the
+InMemoryRateLimitStore.take signature can be passed to RateLimiter to
+share them between instances.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from config import get_settings
+from services.metrics import admission_events
+
+settings = get_settings()
+RATE_LIMIT_STORE_SIZE = 100_000
+
+
+class RateLimitPolicy:
+    __slots__ = ("scope", "rate", "burst")
+
+    def __init__(self, scope: str, per_minute: float, burst: int):
+        self.scope = scope
+        self.rate = per_minute / 60.0  # tokens per second
+        self.burst = max(1, burst)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+
+GENERATE = RateLimitPolicy(
+    "generate", settings.rate_limit_generate_per_minute,
+    settings.rate_limit_generate_burst,
+)
+CRUD = RateLimitPolicy(
+    "crud", settings.rate_limit_crud_per_minute,
+    settings.rate_limit_crud_burst,
+)
+
+
+class RateLimitedError(Exception):
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {scope}")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class OverloadedError(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Too many generations in progress")
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+class InMemoryRateLimitStore:
+    def __init__(self, max_size: int = RATE_LIMIT_STORE_SIZE):
+        self.max_size = max_size
+        # key -> (tokens, last refill); least recently used first
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = (
+            OrderedDict()
+        )
+
+    # Take `cost` tokens; returns 0 if they were taken, else the seconds
+    # until they would be available
+    def take(self, key: str, rate: float, burst: int,
+             cost: float = 1) -> float:
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - last) * rate)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        # An evicted bucket was idle the longest, so it was (nearly) full
+        while len(self._buckets) > self.max_size:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+class RateLimiter:
+    def __init__(self, store=None):
+        self.store = store if store is not None else InMemoryRateLimitStore()
+
+    def check(self, policy: RateLimitPolicy, user_id: str,
+              cost: float = 1) -> None:
+        if not policy.enabled:
+            return
+        # A cost above the burst could never be paid; charge a full bucket
+        wait = self.store.take(f"{policy.scope}:{user_id}", policy.rate,
+                               policy.burst, min(cost, policy.burst))
+        if wait > 0:
+            admission_events.inc(policy.scope, "rate_limited")
+            raise RateLimitedError(policy.scope, wait)
+
+
+class AdmissionGate:
+    def __init__(
+        self,
+        max_concurrent: int = settings.generation_max_concurrent,
+        max_queue: int = settings.generation_max_queue,
+        queue_timeout: float = settings.generation_queue_timeout,
+        retry_after: float = settings.generation_retry_after,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.waiting = 0
+
+    def _shed(self) -> OverloadedError:
+        admission_events.inc("generate", "shed")
+        return OverloadedError(self.retry_after)
+
+    async def acquire(self) -> None:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()  # a slot is free: no wait
+            return
+        if self.waiting >= self.max_queue:
+            raise self._shed()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(),
+                                   self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._shed() from None
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    # A slot held past the handler (a streamed response); release() may be
+    # called from more than one cleanup path
+    async def hold(self) -> "AdmissionSlot":
+        await self.acquire()
+        return AdmissionSlot(self)
+
+
+class AdmissionSlot:
+    __slots__ = ("_gate",)
+
+    def __init__(self, gate: AdmissionGate):
+        self._gate = gate
+
+    def release(self) -> None:
+        if self._gate is not None:
+            self._gate.release()
+            self._gate = None
+
+
+rate_limiter = RateLimiter()
+generation_gate = AdmissionGate()
@@ -0,0 +1,89 @@
+"""
+Recipe search and "cookable now" ranking
+
+GET /recipes/search runs one aggregation over the user's recipes instead of
+sending every recipe to the client to filter:
+
+1. Optional text match on title, description and ingredient names through
+   the user_recipe_text index (services/indexes.py).
+2. Coverage: the share of a recipe's distinct ingredient names found in
+   the user's pantry (the ingredients collection), compared on name_key
+   (services/units.normalize_name) so "Eggs " matches "eggs".
+3. Rank by coverage, then text relevance, then newest first, and return
+   only the top `limit` summaries.
+
+The pantry's name keys come from the pantry snapshot cache
+(services/pantryCache.py) and are passed into the pipeline, so the join
+happens inside Mongo.
+"""
+from typing import List, Optional
+
+from models.recipe import SUMMARY_FIELDS
+from services.pantryCache import pantry_cache
+from services.units import normalize_name
+
+
+async def pantry_keys(db, user_id: str) -> List[str]:
+    docs = (await pantry_cache.get_pantry(db, user_id)).docs
+    # Documents written before name_key existed fall back to the name
+    return sorted({
+        doc.get("name_key") or normalize_name(doc.get("name", ""))
+        for doc in docs
+    } - {""})
+
+
+def search_pipeline(
+    user_id: str,
+    pantry: List[str],
+    q: Optional[str] = None,
+    min_coverage: float = 0.0,
+    limit: int = 20,
+) -> List[dict]:
+    match = {"user_id": user_id}
+    if q:
+        match["$text"] = {"$search": q}
+
+    # Recipes saved before name_key existed only have the display name
+    keys = {"$setUnion": [{"$map": {
+        "input": {"$ifNull": ["$ingredients", []]},
+        "as": "ing",
+        "in": {"$ifNull": ["$$ing.name_key", {"$toLower": "$$ing.name"}]},
+    }}]}
+    missing = {"$filter": {
+        "input": "$_keys",
+        "as": "key",
+        "cond": {"$not": {"$in": ["$$key", pantry]}},
+    }}
+    coverage = {"$cond": [
+        {"$gt": [{"$size": "$_keys"}, 0]},
+        {"$subtract": [1, {"$divide": [{"$size": "$missing"},
+                                       {"$size": "$_keys"}]}]},
+        0,
+    ]}
+
+    sort = {"coverage": -1}
+    if q:
+        sort["score"] = -1
+    sort.update({"created_at": -1, "_id": -1})
+
+    projection = dict.fromkeys(SUMMARY_FIELDS, 1)
+    projection.update(coverage=1, missing=1)
+    if q:
+        projection["score"] = 1
+
+    pipeline = [
+        {"$match": match},
+        {"$addFields": {"_keys": keys}},
+        {"$addFields": {"missing": missing}},
+        {"$addFields": {"coverage": coverage}},
+    ]
+    if q:
+        pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+    if min_coverage > 0:
+        pipeline.append({"$match": {"coverage": {"$gte": min_coverage}}})
+    pipeline += [
+        {"$sort": sort},
+        {"$limit": limit},
+        {"$project": projection},
+    ]
+    return pipeline
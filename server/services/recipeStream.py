@@ -0,0 +1,146 @@
+"""
+Incremental parser for streamed GPT recipe replies
+
+GPT streams the recipe JSON a few characters at a time. Rather than waiting
+for the whole body, IncrementalRecipeParser scans each delta as it arrives
+and reports the title, every ingredient and every step as soon as that value
+is complete, so the client can render them while generation continues.
+The finished text is still parsed and validated in one pass by
+gptClient.parse_recipe_reply before anything is saved.
+"""
+import json
+from typing import List, Optional
+
+from models.ingredient import Ingredient
+from services.gptClient import parse_ingredient_string
+
+LIST_FIELDS = {"ingredients", "steps"}
+
+
+class IncrementalRecipeParser:
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0            # next character of _buf to scan
+        self._started = False    # seen the opening "{" of the recipe
+        self._stack: List[str] = []  # "o" / "a" per open container
+        self._in_string = False
+        self._escape = False
+        self._value_start: Optional[int] = None
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._step_index = 0
+
+    # Feed the next text delta; returns any events that became complete
+    def feed(self, delta: str) -> List[dict]:
+        self._buf += delta
+        events: List[dict] = []
+        buf = self._buf
+        i = self._pos
+        n = len(buf)
+
+        while i < n:
+            ch = buf[i]
+
+            if not self._started:
+                # Skip code fences or prose before the JSON body
+                if ch == "{":
+                    self._started = True
+                    self._stack.append("o")
+                    self._expect_key = True
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(buf, i, events)
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._string_is_tracked():
+                    self._value_start = i
+            elif ch in "{[":
+                if self._element_depth() and ch == "{":
+                    self._value_start = i
+                self._stack.append("o" if ch == "{" else "a")
+                self._expect_key = ch == "{"
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if ch == "}" and self._element_depth():
+                    try:
+                        value = json.loads(buf[self._value_start:i + 1])
+                    except ValueError:
+                        value = None  # left to the final parse to report
+                    self._emit_element(value, events)
+                    self._value_start = None
+                self._expect_key = False
+            elif ch == ":":
+                self._expect_key = False
+            elif ch == ",":
+                self._expect_key = bool(self._stack) and self._stack[-1] == "o"
+            i += 1
+
+        self._pos = i
+        return events
+
+    # True while directly inside the top-level ingredients/steps array
+    def _element_depth(self) -> bool:
+        return self._stack == ["o", "a"] and self._key in LIST_FIELDS
+
+    def _string_is_tracked(self) -> bool:
+        if self._stack == ["o"]:
+            return True  # a top-level key, or the title value
+        return self._element_depth()
+
+    def _end_string(self, buf: str, end: int, events: List[dict]) -> None:
+        # Strings nested inside an ingredient object are part of that
+        # object and are emitted when it closes
+        if self._value_start is None or not (
+            self._stack == ["o"] or self._element_depth()
+        ):
+            return
+        text = json.loads(buf[self._value_start:end + 1])
+        self._value_start = None
+
+        if self._stack == ["o"]:
+            if self._expect_key:
+                self._key = text
+            elif self._key == "title":
+                events.append({"type": "title", "title": text})
+        else:
+            self._emit_element(text, events)
+
+    def _emit_element(self, value, events: List[dict]) -> None:
+        if isinstance(value, str) and self._key == "ingredients":
+            try:
+                parsed = parse_ingredient_string(value)
+                ingredient = Ingredient(**parsed)
+            except Exception:
+                return  # dropped here too by parse_recipe_content
+            if not ingredient.name:
+                return
+            events.append({
+                "type": "ingredient",
+                "ingredient": ingredient.model_dump(),
+            })
+        elif isinstance(value, dict) and self._key == "ingredients":
+            try:
+                ingredient = Ingredient.model_validate(value)
+            except Exception:
+                return
+            events.append({
+                "type": "ingredient",
+                "ingredient": ingredient.model_dump(),
+            })
+        elif isinstance(value, str):
+            events.append({
+                "type": "step", "index": self._step_index, "step": value
+            })
+            self._step_index += 1
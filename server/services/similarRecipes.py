@@ -0,0 +1,199 @@
+"""
+Similar-recipe index: reuse an earlier generation for a near-identical pantry
+
+Users with nearly the same pantry would each pay for an LLM call. The index
+keeps, for every generated recipe (source "generated", any user), its
+canonical ingredient set: name_key -> (base_unit, base_qty), from
+services/units.py. Given a pantry it finds, in memory and without touching
+the network, recipes the pantry can cook:
+
+- candidates come from an inverted index name_key -> recipe ids, counting
+  how many of each recipe's ingredients the pantry has
+- an ingredient counts as covered when the pantry has it in at least the
+  recipe's amount (amounts in different base units, or "to taste", only
+  need the name)
+- coverage = covered / recipe ingredients; matches need
+  SIMILAR_MIN_COVERAGE (default 0.9) and at least MIN_RECIPE_INGREDIENTS
+  ingredients, so "salt and water" does not match every pantry
+- matches are ranked by coverage, then by how much of the pantry they use
+
+The index only holds ids and ingredient keys; callers load the recipe from
+Mongo and skip ids that no longer exist (deleted in another process). It is
+filled in the background at startup, then kept current by the routes that
+insert and delete recipes; an edit marks the recipe "edited" and takes it
+out, since it is no longer what the LLM generated for its pantry.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import get_settings
+from services.metrics import similar_recipe_lookups
+from services.units import TO_TASTE, canonical_fields, normalize_name
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_MIN_COVERAGE = get_settings().similar_min_coverage
+SIMILAR_INDEX_SIZE = get_settings().similar_index_size
+MIN_RECIPE_INGREDIENTS = 3
+GENERATED = "generated"
+
+# name_key -> (base_unit, base_qty)
+Amounts = Dict[str, Tuple[str, float]]
+
+
+def recipe_amounts(ingredients: Iterable[dict]) -> Amounts:
+    amounts: Amounts = {}
+    for ing in ingredients:
+        if "name_key" in ing:
+            key = ing["name_key"]
+            unit, qty = ing["base_unit"], ing["base_qty"]
+        else:
+            fields = canonical_fields(ing["name"], ing["quantity"],
+                                      ing["unit"])
+            key = fields["name_key"]
+            unit, qty = fields["base_unit"], fields["base_qty"]
+        if key in amounts and amounts[key][0] == unit:
+            qty += amounts[key][1]
+        amounts[key] = (unit, qty)
+    return amounts
+
+
+# Pantry items (objects with name/quantity/unit) -> name_key ->
+# base_unit -> total base quantity
+def pantry_amounts(items: Iterable[Any]) -> Dict[str, Dict[str, float]]:
+    pantry: Dict[str, Dict[str, float]] = {}
+    for item in items:
+        fields = canonical_fields(item.name, item.quantity, item.unit)
+        units = pantry.setdefault(fields["name_key"], {})
+        units[fields["base_unit"]] = (
+            units.get(fields["base_unit"], 0.0) + fields["base_qty"]
+        )
+    return pantry
+
+
+class SimilarMatch:
+    __slots__ = ("recipe_id", "coverage", "covered")
+
+    def __init__(self, recipe_id: str, coverage: float, covered: int):
+        self.recipe_id = recipe_id
+        self.coverage = coverage
+        self.covered = covered
+
+
+class SimilarRecipeIndex:
+    def __init__(self, max_size: int = SIMILAR_INDEX_SIZE,
+                 min_coverage: float = SIMILAR_MIN_COVERAGE):
+        self.max_size = max_size
+        self.min_coverage = min_coverage
+        # recipe id -> (owner uid, amounts); oldest first
+        self._recipes: "OrderedDict[str, Tuple[str, Amounts]]" = (
+            OrderedDict()
+        )
+        self._postings: Dict[str, set] = {}
+        self._load_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._recipes)
+
+    def add(self, doc: dict) -> None:
+        recipe_id = str(doc["_id"])
+        self.remove(recipe_id)
+        if doc.get("source") != GENERATED:
+            return
+        amounts = recipe_amounts(doc.get("ingredients") or [])
+        if len(amounts) < MIN_RECIPE_INGREDIENTS:
+            return
+        self._recipes[recipe_id] = (doc.get("user_id"), amounts)
+        for key in amounts:
+            self._postings.setdefault(key, set()).add(recipe_id)
+        while len(self._recipes) > self.max_size:
+            self.remove(next(iter(self._recipes)))
+
+    def remove(self, recipe_id: str) -> None:
+        entry = self._recipes.pop(str(recipe_id), None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            ids = self._postings.get(key)
+            if ids is not None:
+                ids.discard(str(recipe_id))
+                if not ids:
+                    del self._postings[key]
+
+    def clear(self) -> None:
+        self._recipes.clear()
+        self._postings.clear()
+
+    # Best matches first. exclude_user skips that user's own recipes;
+    # every key in `required` (e.g. preferences) must be in the recipe.
+    def match(
+        self,
+        pantry: Dict[str, Dict[str, float]],
+        exclude_user: Optional[str] = None,
+        required: Iterable[str] = (),
+        limit: int = 5,
+    ) -> List[SimilarMatch]:
+        required = {normalize_name(r) for r in required if r.strip()}
+        hits: Dict[str, int] = {}
+        for key in pantry:
+            for recipe_id in self._postings.get(key, ()):
+                hits[recipe_id] = hits.get(recipe_id, 0) + 1
+
+        matches = []
+        for recipe_id, named in hits.items():
+            owner, amounts = self._recipes[recipe_id]
+            # Upper bound before checking amounts
+            if named / len(amounts) < self.min_coverage:
+                continue
+            if owner == exclude_user or not required.issubset(amounts):
+                continue
+            covered = sum(
+                1 for key, (unit, qty) in amounts.items()
+                if key in pantry and (
+                    unit == TO_TASTE or unit not in pantry[key]
+                    or pantry[key][unit] >= qty
+                )
+            )
+            coverage = covered / len(amounts)
+            if coverage >= self.min_coverage:
+                matches.append(SimilarMatch(recipe_id, coverage, covered))
+
+        matches.sort(key=lambda m: (m.coverage, m.covered), reverse=True)
+        similar_recipe_lookups.inc("hit" if matches else "miss")
+        return matches[:limit]
+
+    # Most recent generated recipes, newest last so they survive the cap
+    async def load(self, db) -> None:
+        docs = await db.recipes.find(
+            {"source": GENERATED},
+            {"user_id": 1, "source": 1, "ingredients.name": 1,
+             "ingredients.quantity": 1, "ingredients.unit": 1,
+             "ingredients.name_key": 1, "ingredients.base_unit": 1,
+             "ingredients.base_qty": 1},
+        ).sort("_id", -1).limit(self.max_size).to_list(length=None)
+        for doc in reversed(docs):
+            self.add(doc)
+        logger.info("Similar-recipe index loaded %d recipes", len(self))
+
+    # Fill the index without holding up startup
+    def start_loading(self, db) -> None:
+        async def run():
+            try:
+                await self.load(db)
+            except Exception:
+                logger.exception("Could not load the similar-recipe index")
+
+        self._load_task = asyncio.ensure_future(run())
+
+    async def stop(self) -> None:
+        if self._load_task is not None and not self._load_task.done():
+            self._load_task.cancel()
+            try:
+                await self._load_task
+            except asyncio.CancelledError:
+                pass
+
+
+similar_index = SimilarRecipeIndex()
@@ -0,0 +1,218 @@
+"""
+Local, cached verification of Firebase ID tokens
+
+firebase_admin.auth.verify_id_token is synchronous and fetches Google's
+public certificates over HTTP whenever its cache runs out, so calling it from
+an async handler blocks the event loop. TokenVerifier keeps the parsed signing
+keys in memory (refreshing them in the background shortly before they
+expire), remembers tokens it has already verified until their exp, and only
+runs RSA verification in a worker thread on a cache miss.
+
+Token checks follow the Firebase third-party JWT library guide
+Credit Source: https://firebase.google.com/docs/auth/admin/verify-id-tokens#verify_id_tokens_using_a_third-party_jwt_library
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+import urllib.request
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
+
+GOOGLE_CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/"
+    "securetoken@system.gserviceaccount.com"
+)
+ISSUER_PREFIX = "https://securetoken.google.com/"
+
+DEFAULT_CERT_MAX_AGE = 3600     # used when Cache-Control has no max-age
+REFRESH_AHEAD_SECONDS = 300     # start a background refresh this early
+MIN_FORCED_REFRESH_INTERVAL = 60  # unknown kid refetch at most this often
+TOKEN_CACHE_SIZE = 10_000
+
+CertFetcher = Callable[[], Tuple[Dict[str, str], int]]
+
+
+class TokenVerificationError(Exception):
+    """The token is malformed, expired or not signed for this project."""
+
+
+class SigningKeyError(Exception):
+    """Google's signing certificates could not be fetched or parsed."""
+
+
+# Blocking fetch of {kid: PEM certificate} plus its Cache-Control max-age.
+# Always run through asyncio.to_thread by SigningKeyCache.
+def fetch_google_certs(
+    url: str = GOOGLE_CERTS_URL, timeout: float = 5.0
+) -> Tuple[Dict[str, str], int]:
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        certs = json.loads(resp.read())
+        cache_control = resp.headers.get("Cache-Control", "")
+    match = re.search(r"max-age=(\d+)", cache_control)
+    max_age = int(match.group(1)) if match else DEFAULT_CERT_MAX_AGE
+    return certs, max_age
+
+
+class SigningKeyCache:
+    """Parsed public keys by kid, refreshed ahead of their expiry."""
+
+    def __init__(
+        self,
+        fetch: CertFetcher = fetch_google_certs,
+        refresh_ahead: float = REFRESH_AHEAD_SECONDS,
+    ):
+        self._fetch = fetch
+        self._refresh_ahead = refresh_ahead
+        self._keys: Dict[str, object] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._background: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._keys) and time.time() < self._expires_at
+
+    @property
+    def expires_at(self) -> float:
+        return self._expires_at
+
+    async def refresh(self, force: bool = False) -> None:
+        async with self._lock:
+            # Another caller may have refreshed while we waited on the lock
+            if not force and self.loaded and (
+                time.time() < self._expires_at - self._refresh_ahead
+            ):
+                return
+            try:
+                certs, max_age = await asyncio.to_thread(self._fetch)
+                keys = {
+                    kid: load_pem_x509_certificate(pem.encode()).public_key()
+                    for kid, pem in certs.items()
+                }
+            except Exception as e:
+                raise SigningKeyError(
+                    f"Could not load Firebase signing keys: {e}"
+                ) from e
+            now = time.time()
+            self._keys = keys
+            self._fetched_at = now
+            self._expires_at = now + max_age
+
+    def _refresh_in_background(self) -> None:
+        if self._background is None or self._background.done():
+            self._background = asyncio.create_task(self._quiet_refresh())
+
+    async def _quiet_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except SigningKeyError:
+            # Current keys stay valid until expires_at; the next caller
+            # after that will retry in the foreground.
+            pass
+
+    async def get_key(self, kid: str):
+        now = time.time()
+        if not self.loaded:
+            await self.refresh()
+        elif now >= self._expires_at - self._refresh_ahead:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and (
+            time.time() - self._fetched_at >= MIN_FORCED_REFRESH_INTERVAL
+        ):
+            # Google may have rotated keys before our copy expired
+            await self.refresh(force=True)
+            key = self._keys.get(kid)
+        if key is None:
+            raise TokenVerificationError("Token signed with an unknown key")
+        return key
+
+
+class TokenVerifier:
+    """Verifies Firebase ID tokens, caching results until each token's exp."""
+
+    def __init__(
+        self,
+        project_id: Optional[str] = None,
+        keys: Optional[SigningKeyCache] = None,
+        cache_size: int = TOKEN_CACHE_SIZE,
+        leeway: float = 0,
+    ):
+        self._project_id = project_id
+        self.keys = keys or SigningKeyCache()
+        self._cache_size = cache_size
+        self._leeway = leeway
+        self._cache: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+
+    @property
+    def project_id(self) -> str:
+        if self._project_id is None:
+            # Read from the service-account key on first use; building
+            # the Firebase Admin app is not needed to verify tokens
+            import firebase_init
+            self._project_id = firebase_init.project_id()
+        return self._project_id
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    async def verify(self, token: str) -> dict:
+        digest = hashlib.sha256(token.encode()).digest()
+        cached = self._cache.get(digest)
+        if cached is not None:
+            claims, exp = cached
+            if time.time() < exp + self._leeway:
+                self._cache.move_to_end(digest)
+                return claims
+            del self._cache[digest]
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError as e:
+            raise TokenVerificationError(str(e)) from e
+        if header.get("alg") != "RS256" or not header.get("kid"):
+            raise TokenVerificationError("Unexpected token header")
+
+        key = await self.keys.get_key(header["kid"])
+        claims = await asyncio.to_thread(self._decode, token, key)
+
+        self._cache[digest] = (claims, float(claims["exp"]))
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return claims
+
+    # CPU-bound RSA check; runs in a worker thread
+    def _decode(self, token: str, key) -> dict:
+        project_id = self.project_id
+        try:
+            claims = jwt.decode(
+                token,
+                key=key,
+                algorithms=["RS256"],
+                audience=project_id,
+                issuer=ISSUER_PREFIX + project_id,
+                leeway=self._leeway,
+                options={"require": ["exp", "iat", "sub"]},
+            )
+        except jwt.PyJWTError as e:
+            raise TokenVerificationError(str(e)) from e
+
+        sub = claims.get("sub")
+        if not isinstance(sub, str) or not sub or len(sub) > 128:
+            raise TokenVerificationError("Token has an invalid subject")
+        if claims.get("auth_time", 0) > time.time() + self._leeway:
+            raise TokenVerificationError("Token auth_time is in the future")
+
+        # Match the shape returned by firebase_admin.auth.verify_id_token
+        claims["uid"] = sub
+        return claims
+
+
+token_verifier = TokenVerifier()
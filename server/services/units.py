@@ -0,0 +1,147 @@
+"""
+Unit registry and quantity canonicalization for ingredients
+
+Every unit spelling maps to one canonical unit, and every canonical unit has
+a dimension (mass, volume or count), a base unit and a factor to that base.
+Ingredient documents are written with a precomputed base_qty/base_unit (and
+a normalized name_key), so pantry-vs-recipe checks and aggregation are plain
+numeric comparisons, in Python or as Mongo queries on those fields.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MASS = "mass"
+VOLUME = "volume"
+COUNT = "count"
+TO_TASTE = "to taste"
+
+# canonical unit -> accepted spellings (singular, plural, abbreviations)
+UNIT_SPELLINGS = {
+    "tsp": ("tsp", "tsps", "t", "teaspoon", "teaspoons"),
+    "tbsp": ("tbsp", "tbsps", "tbs", "tbl", "tablespoon", "tablespoons"),
+    "cup": ("cup", "cups", "c"),
+    "fl oz": ("fl oz", "fl. oz", "fluid ounce", "fluid ounces"),
+    "ml": ("ml", "mls", "milliliter", "milliliters", "millilitre",
+           "millilitres"),
+    "l": ("l", "liter", "liters", "litre", "litres"),
+    "pint": ("pint", "pints", "pt"),
+    "quart": ("quart", "quarts", "qt"),
+    "gallon": ("gallon", "gallons", "gal"),
+    "g": ("g", "gram", "grams", "gr"),
+    "kg": ("kg", "kgs", "kilogram", "kilograms"),
+    "mg": ("mg", "milligram", "milligrams"),
+    "oz": ("oz", "ounce", "ounces"),
+    "lb": ("lb", "lbs", "pound", "pounds"),
+    "pinch": ("pinch", "pinches"),
+    "dash": ("dash", "dashes"),
+    "clove": ("clove", "cloves"),
+    "piece": ("piece", "pieces", "pc", "pcs"),
+    "slice": ("slice", "slices"),
+    "can": ("can", "cans", "tin", "tins"),
+    "jar": ("jar", "jars"),
+    "package": ("package", "packages", "pkg", "packet", "packets"),
+    "bunch": ("bunch", "bunches"),
+    "handful": ("handful", "handfuls"),
+    "sprig": ("sprig", "sprigs"),
+    "stalk": ("stalk", "stalks"),
+    "stick": ("stick", "sticks"),
+    "head": ("head", "heads"),
+    "units": ("unit", "units", "each", "whole"),
+}
+
+UNIT_ALIASES = {
+    alias: canonical
+    for canonical, spellings in UNIT_SPELLINGS.items()
+    for alias in spellings
+}
+
+# canonical unit -> (dimension, base unit, factor to base unit)
+UNITS: Dict[str, Tuple[str, str, float]] = {
+    "ml": (VOLUME, "ml", 1.0),
+    "l": (VOLUME, "ml", 1000.0),
+    "tsp": (VOLUME, "ml", 4.92892),
+    "tbsp": (VOLUME, "ml", 14.7868),
+    "fl oz": (VOLUME, "ml", 29.5735),
+    "cup": (VOLUME, "ml", 236.588),
+    "pint": (VOLUME, "ml", 473.176),
+    "quart": (VOLUME, "ml", 946.353),
+    "gallon": (VOLUME, "ml", 3785.41),
+    "pinch": (VOLUME, "ml", 0.31),
+    "dash": (VOLUME, "ml", 0.62),
+    "mg": (MASS, "g", 0.001),
+    "g": (MASS, "g", 1.0),
+    "kg": (MASS, "g", 1000.0),
+    "oz": (MASS, "g", 28.3495),
+    "lb": (MASS, "g", 453.592),
+    # Loose items are all counted as "each"; containers and bunches are
+    # only comparable with themselves
+    "units": (COUNT, "each", 1.0),
+    "piece": (COUNT, "each", 1.0),
+}
+for _unit in ("clove", "slice", "can", "jar", "package", "bunch", "handful",
+              "sprig", "stalk", "stick", "head"):
+    UNITS[_unit] = (COUNT, _unit, 1.0)
+
+
+def normalize_unit(unit: str) -> str:
+    unit = " ".join(unit.lower().split()).rstrip(".")
+    return UNIT_ALIASES.get(unit, unit)
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def dimension_of(unit: str) -> Optional[str]:
+    entry = UNITS.get(normalize_unit(unit))
+    return entry[0] if entry else None
+
+
+# (base_qty, base_unit) for a quantity; unknown units count as themselves
+def to_base(quantity: float, unit: str) -> Tuple[float, str]:
+    canonical = normalize_unit(unit)
+    if canonical == TO_TASTE:
+        return 0.0, TO_TASTE
+    entry = UNITS.get(canonical)
+    if entry is None:
+        return float(quantity), canonical
+    _, base_unit, factor = entry
+    return round(float(quantity) * factor, 6), base_unit
+
+
+# Inverse of to_base: express a base quantity in the given unit, rounded to
+# 3 decimals so conversion factors do not leave 1.500002 cups behind
+def from_base(base_qty: float, unit: str) -> float:
+    entry = UNITS.get(normalize_unit(unit))
+    if entry is None:
+        return float(base_qty)
+    return round(float(base_qty) / entry[2], 3)
+
+
+def canonical_fields(name: str, quantity: float, unit: str) -> dict:
+    base_qty, base_unit = to_base(quantity, unit)
+    return {
+        "name_key": normalize_name(name),
+        "base_qty": base_qty,
+        "base_unit": base_unit,
+    }
+
+
+# Add canonical fields to an ingredient dict (name/quantity/unit) in place
+def with_canonical(doc: dict) -> dict:
+    doc.update(canonical_fields(doc["name"], doc["quantity"], doc["unit"]))
+    return doc
+
+
+def canonicalize_ingredients(docs: Iterable[dict]) -> List[dict]:
+    return [with_canonical(doc) for doc in docs]
+
+
+# Fold ingredient b into a (same name_key and base_unit), keeping a's unit.
+# Returns a new dict; neither argument is modified.
+def merge_amounts(a: dict, b: dict) -> dict:
+    merged = dict(a)
+    if a["base_unit"] == TO_TASTE:
+        return merged
+    merged["base_qty"] = round(a["base_qty"] + b["base_qty"], 6)
+    merged["quantity"] = from_base(merged["base_qty"], a["unit"])
+    return merged
@@ -0,0 +1,93 @@
+"""
+Shared fixtures for the server tests
+
+Nothing connects to Atlas, Firebase or OpenAI. Tests use the stand-ins from
+benchmarks/loadtest.py: LocalSigner signs ID tokens that token_verifier
+accepts, and FakeLLM answers in place of AsyncOpenAI. Mongo is a
+mongomock-motor database handed to db.py.
+
+Usage (from the server folder):
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+import os
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.join(SERVER_DIR, "benchmarks"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import db  # noqa: E402
+from loadtest import FakeLLM, LocalSigner  # noqa: E402
+from services import gptClient  # noqa: E402
+from services.tokenVerifier import (  # noqa: E402
+    SigningKeyCache, TokenVerifier, token_verifier
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+# One RSA key for the whole run; making one takes a noticeable moment
+@pytest.fixture(scope="session")
+def signer():
+    return LocalSigner()
+
+
+@pytest.fixture
+def verifier(signer):
+    return TokenVerifier(project_id=signer.project_id,
+                         keys=SigningKeyCache(fetch=signer.fetch_certs))
+
+
+# Point the app's token_verifier at the local signer; returns a function
+# giving the Authorization header for a uid
+@pytest.fixture
+def auth(signer, monkeypatch):
+    monkeypatch.setattr(token_verifier, "_project_id", signer.project_id)
+    monkeypatch.setattr(token_verifier, "keys",
+                        SigningKeyCache(fetch=signer.fetch_certs))
+    token_verifier.clear()
+    yield lambda uid: {"Authorization": f"Bearer {signer.token(uid)}"}
+    token_verifier.clear()
+
+
+@pytest.fixture
+def database():
+    database = AsyncMongoMockClient(tz_aware=True)["homespice_test"]
+    db.use_database(database)
+    yield database
+    db.close()
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM(latency=0, tokens_per_second=1e6)
+    monkeypatch.setattr(gptClient, "client", fake)
+    return fake
+
+
+# main.app over the ASGI transport (no lifespan), with the per-process
+# caches and rate-limit buckets emptied so tests do not share state
+@pytest.fixture
+async def client(database, auth):
+    import main
+    from services.generationCache import generation_cache
+    from services.pantryCache import pantry_cache
+    from services.rateLimit import rate_limiter
+    from services.similarRecipes import similar_index
+
+    for cache in (generation_cache, pantry_cache.store,
+                  rate_limiter.store, similar_index):
+        cache.clear()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport,
+                                 base_url="http://test") as client:
+        yield client
@@ -0,0 +1,75 @@
+import pytest
+from pymongo import ASCENDING, IndexModel
+
+from services import indexes
+
+pytestmark = pytest.mark.anyio
+
+ACCOUNT = {"email": "cook@example.com", "password": "hunter2"}
+
+
+# mongomock has no partial indexes, so these stand in for INDEXES["users"]
+@pytest.fixture
+async def user_indexes(database, monkeypatch):
+    await database.users.create_indexes([
+        IndexModel([("uid", ASCENDING)], unique=True, sparse=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ])
+    monkeypatch.setattr(indexes, "indexed_collections", {"users"})
+    monkeypatch.setattr("routes.authUser.indexed_collections", {"users"})
+
+
+def profile_headers(signer, uid, email):
+    return {"Authorization": f"Bearer {signer.token(uid, email=email)}"}
+
+
+async def test_duplicate_email_is_rejected_without_the_index(client):
+    r = await client.post("/user/create-account", json=ACCOUNT)
+    assert r.status_code == 201
+    r = await client.post("/user/create-account", json=ACCOUNT)
+    assert r.status_code == 400
+
+
+async def test_duplicate_email_is_rejected_by_the_index(client,
+                                                        user_indexes):
+    r = await client.post("/user/create-account", json=ACCOUNT)
+    assert r.status_code == 201
+    r = await client.post("/user/create-account", json=ACCOUNT)
+    assert r.status_code == 400
+
+
+async def test_profile_attaches_uid_to_a_legacy_account(
+        client, database, signer, user_indexes):
+    await client.post("/user/create-account", json=ACCOUNT)
+    r = await client.post("/user/profile", headers=profile_headers(
+        signer, "firebase-1", ACCOUNT["email"]))
+    assert r.status_code == 201
+    docs = await database.users.find().to_list(None)
+    assert len(docs) == 1
+    assert docs[0]["uid"] == "firebase-1"
+    assert docs[0]["password"] == ACCOUNT["password"]
+
+    r = await client.post("/user/profile", headers=profile_headers(
+        signer, "firebase-1", ACCOUNT["email"]))
+    assert r.status_code == 201
+
+
+async def test_profile_email_owned_by_another_uid_is_a_conflict(
+        client, database, signer, user_indexes):
+    r = await client.post("/user/profile", headers=profile_headers(
+        signer, "firebase-1", ACCOUNT["email"]))
+    assert r.status_code == 201
+    r = await client.post("/user/profile", headers=profile_headers(
+        signer, "firebase-2", ACCOUNT["email"]))
+    assert r.status_code == 409
+    assert await database.users.count_documents({}) == 1
+
+
+async def test_ensure_indexes_records_which_collections_are_indexed(
+        database, monkeypatch):
+    monkeypatch.setattr(indexes, "indexed_collections", set())
+    monkeypatch.setattr(indexes, "INDEXES", {
+        "ingredients": indexes.INDEXES["ingredients"],
+    })
+    await indexes.ensure_indexes(database)
+    assert indexes.indexed_collections == {"ingredients"}
@@ -0,0 +1,164 @@
+import pytest
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+
+from models.ingredient import MAX_BULK_ITEMS
+
+pytestmark = pytest.mark.anyio
+
+
+async def pantry(client, headers):
+    r = await client.get("/ingredients/", headers=headers)
+    assert r.status_code == 200
+    return {i["name"]: i for i in r.json()}
+
+
+async def add(client, headers, name, quantity, unit):
+    r = await client.post("/ingredients/", headers=headers, json={
+        "name": name, "quantity": quantity, "unit": unit,
+    })
+    return r.json()["_id"]
+
+
+async def test_bulk_create_merges_duplicates_and_stored_items(client, auth):
+    headers = auth("user-1")
+    await add(client, headers, "rice", 1, "cup")
+    r = await client.post("/ingredients/bulk", headers=headers, json={
+        "ingredients": [
+            {"name": "rice", "quantity": 2, "unit": "cup"},
+            {"name": "Rice", "quantity": 500, "unit": "ml"},
+            {"name": "eggs", "quantity": 2, "unit": "whole"},
+            {"name": "flour", "quantity": 0, "unit": "cup"},
+        ],
+        "text": "3 eggs\n3 g\n\n0 cups sugar\n1 lb chicken breast",
+    })
+    assert r.status_code == 200
+    body = r.json()
+    statuses = [(x["index"], x["status"]) for x in body["results"]]
+    assert statuses == [
+        (0, "merged"), (1, "merged"),          # into the stored rice
+        (2, "created"), (3, "error"),
+        (4, "merged"),                         # "3 eggs" into item 2
+        (5, "error"), (6, "error"),            # "3 g", "0 cups sugar"
+        (7, "created"),
+    ]
+    assert body["summary"] == {"merged": 3, "created": 2, "error": 3}
+    assert body["results"][5]["error"] == "No ingredient name"
+    assert body["results"][6]["input"] == "0 cups sugar"
+
+    stored = await pantry(client, headers)
+    assert set(stored) == {"rice", "eggs", "Chicken Breast"}
+    # 1 cup + 2 cups + 500 ml, kept in the stored item's unit
+    assert stored["rice"]["unit"] == "cup"
+    assert stored["rice"]["quantity"] == pytest.approx(
+        3 + 500 / 236.5882365, rel=1e-3
+    )
+    assert stored["eggs"]["quantity"] == 5
+
+
+async def test_bulk_create_reports_failed_writes_per_item(client, auth,
+                                                          database):
+    # A unique index stands in for any write Mongo rejects; the other
+    # user's eggs make this user's insert collide
+    await database.ingredients.create_indexes([
+        IndexModel([("name_key", ASCENDING)], unique=True),
+    ])
+    await add(client, auth("user-2"), "eggs", 6, "whole")
+    r = await client.post("/ingredients/bulk", headers=auth("user-1"), json={
+        "ingredients": [
+            {"name": "rice", "quantity": 1, "unit": "cup"},
+            {"name": "eggs", "quantity": 2, "unit": "whole"},
+            {"name": "milk", "quantity": 1, "unit": "l"},
+        ],
+    })
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["status"] for x in results] == ["created", "error", "created"]
+    assert results[1]["error"]
+    assert set(await pantry(client, auth("user-1"))) == {"rice", "milk"}
+
+
+async def test_bulk_requests_are_capped(client, auth):
+    headers = auth("user-1")
+    item = {"name": "rice", "quantity": 1, "unit": "cup"}
+    r = await client.post("/ingredients/bulk", headers=headers, json={
+        "ingredients": [item] * (MAX_BULK_ITEMS + 1),
+    })
+    assert r.status_code == 422
+    # The cap counts items and shopping-list lines together
+    r = await client.post("/ingredients/bulk", headers=headers, json={
+        "ingredients": [item] * (MAX_BULK_ITEMS - 1),
+        "text": "2 eggs\n1 cup milk",
+    })
+    assert r.status_code == 400
+    r = await client.post("/ingredients/bulk", headers=headers, json={
+        "ingredients": [item] * (MAX_BULK_ITEMS - 1), "text": "2 eggs",
+    })
+    assert r.status_code == 200
+
+    ids = [str(ObjectId()) for _ in range(MAX_BULK_ITEMS + 1)]
+    r = await client.request("DELETE", "/ingredients/bulk",
+                             headers=headers, json={"ids": ids})
+    assert r.status_code == 422
+    r = await client.patch("/ingredients/bulk", headers=headers, json={
+        "updates": [{"id": i, "quantity": 1} for i in ids],
+    })
+    assert r.status_code == 422
+
+
+async def test_bulk_update_reports_each_item(client, auth):
+    headers = auth("user-1")
+    rice = await add(client, headers, "rice", 1, "cup")
+    eggs = await add(client, headers, "eggs", 2, "whole")
+    others = await add(client, auth("user-2"), "milk", 1, "l")
+    r = await client.patch("/ingredients/bulk", headers=headers, json={
+        "updates": [
+            {"id": rice, "quantity": 3},
+            {"id": eggs, "quantity": 0},       # 0 needs "to taste"
+            {"id": others, "quantity": 5},     # not this user's
+            {"id": "not-an-id", "quantity": 1},
+            {"id": rice, "unit": "g", "quantity": 400},
+        ],
+    })
+    assert r.status_code == 200
+    body = r.json()
+    assert [x["status"] for x in body["results"]] == [
+        "updated", "error", "not_found", "error", "updated",
+    ]
+    stored = await pantry(client, headers)
+    assert (stored["rice"]["quantity"], stored["rice"]["unit"]) == (400, "g")
+    assert stored["eggs"]["quantity"] == 2
+
+
+async def test_bulk_delete_reports_each_item(client, auth):
+    headers = auth("user-1")
+    rice = await add(client, headers, "rice", 1, "cup")
+    others = await add(client, auth("user-2"), "milk", 1, "l")
+    r = await client.request("DELETE", "/ingredients/bulk", headers=headers,
+                             json={"ids": [rice, others, "bad", rice]})
+    assert r.status_code == 200
+    assert [x["status"] for x in r.json()["results"]] == [
+        "deleted", "not_found", "error", "deleted",
+    ]
+    assert await pantry(client, headers) == {}
+    assert set(await pantry(client, auth("user-2"))) == {"milk"}
+
+
+async def test_bulk_writes_invalidate_the_pantry_cache(client, auth):
+    headers = auth("user-1")
+    rice = await add(client, headers, "rice", 1, "cup")
+    assert set(await pantry(client, headers)) == {"rice"}  # now cached
+
+    await client.post("/ingredients/bulk", headers=headers, json={
+        "text": "2 eggs",
+    })
+    assert set(await pantry(client, headers)) == {"rice", "Eggs"}
+
+    await client.patch("/ingredients/bulk", headers=headers, json={
+        "updates": [{"id": rice, "quantity": 4}],
+    })
+    assert (await pantry(client, headers))["rice"]["quantity"] == 4
+
+    await client.request("DELETE", "/ingredients/bulk", headers=headers,
+                         json={"ids": [rice]})
+    assert set(await pantry(client, headers)) == {"Eggs"}
@@ -0,0 +1,156 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services import generationCache
+from services.generationCache import GenerationCache, generation_key
+
+pytestmark = pytest.mark.anyio
+
+
+def item(name, quantity, unit):
+    return SimpleNamespace(name=name, quantity=quantity, unit=unit)
+
+
+class Upstream:
+    def __init__(self, delay: float = 0.01, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream failed")
+        return {"title": f"Recipe {self.calls}", "steps": ["a"]}
+
+
+def test_key_ignores_order_and_equivalent_units():
+    a = [item("Rice", 1, "cup"), item("eggs", 2, "each")]
+    b = [item("eggs", 2, "each"), item("rice", 16, "tbsp")]
+    assert generation_key(a, "m", 0.7) == generation_key(b, "m", 0.7)
+    assert generation_key(a, "m", 0.7) != generation_key(a, "m", 0.2)
+    assert generation_key(a, "m", 0.7) != generation_key(a[:1], "m", 0.7)
+
+
+async def test_concurrent_identical_requests_share_one_call():
+    cache, upstream = GenerationCache(), Upstream()
+    results = await asyncio.gather(*(
+        cache.get_or_generate("key", upstream) for _ in range(5)
+    ))
+    assert upstream.calls == 1
+    assert all(r == results[0] for r in results)
+    # each caller gets its own copy
+    results[0]["steps"].append("b")
+    assert results[1]["steps"] == ["a"]
+
+
+async def test_results_are_reused_until_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(generationCache.time, "monotonic", lambda: now[0])
+    cache, upstream = GenerationCache(ttl=60), Upstream(delay=0)
+    first = await cache.get_or_generate("key", upstream)
+    now[0] += 59
+    assert await cache.get_or_generate("key", upstream) == first
+    now[0] += 2
+    assert await cache.get_or_generate("key", upstream) != first
+    assert upstream.calls == 2
+
+
+async def test_lru_is_size_bounded():
+    cache, upstream = GenerationCache(max_size=2), Upstream(delay=0)
+    for key in ("a", "b", "a", "c"):
+        await cache.get_or_generate(key, upstream)
+    assert len(cache) == 2
+    await cache.get_or_generate("a", upstream)  # kept: recently used
+    assert upstream.calls == 3
+    await cache.get_or_generate("b", upstream)  # evicted
+    assert upstream.calls == 4
+
+
+async def test_failures_reach_every_waiter_and_are_not_cached():
+    cache, upstream = GenerationCache(), Upstream(fail=True)
+    results = await asyncio.gather(*(
+        cache.get_or_generate("key", upstream) for _ in range(3)
+    ), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert upstream.calls == 1
+    upstream.fail = False
+    assert await cache.get_or_generate("key", upstream)
+    assert upstream.calls == 2
+
+
+async def test_a_cancelled_caller_does_not_cancel_the_others():
+    cache, upstream = GenerationCache(), Upstream(delay=0.05)
+    leaving = asyncio.ensure_future(cache.get_or_generate("key", upstream))
+    staying = asyncio.ensure_future(cache.get_or_generate("key", upstream))
+    await asyncio.sleep(0.01)
+    leaving.cancel()
+    assert (await staying)["title"] == "Recipe 1"
+    assert upstream.calls == 1
+
+
+async def test_identical_generate_requests_make_one_llm_call(client, auth,
+                                                             llm):
+    llm.latency = 0.05
+    body = {"ingredients": [
+        {"name": "rice", "quantity": 1, "unit": "cup"},
+        {"name": "eggs", "quantity": 2, "unit": "whole"},
+    ]}
+    responses = await asyncio.gather(*(
+        client.post("/recipes/generate", json=body, headers=auth(uid))
+        for uid in ("user-1", "user-2", "user-3")
+    ))
+    assert [r.status_code for r in responses] == [201] * 3
+    assert llm.calls == 1
+    # each user still gets their own saved recipe
+    assert len({r.json()["id"] for r in responses}) == 3
+
+
+async def test_generate_calls_the_model_its_cache_key_names(
+        client, auth, llm, monkeypatch):
+    import main
+    from config import get_settings
+
+    requests = []
+    create = llm.create
+
+    async def recording_create(**kwargs):
+        requests.append(kwargs)
+        return await create(**kwargs)
+
+    monkeypatch.setattr(llm, "create", recording_create)
+    settings = get_settings().model_copy(
+        update={"gpt_model": "gpt-test", "gpt_temperature": 0.2}
+    )
+    monkeypatch.setitem(main.app.dependency_overrides, get_settings,
+                        lambda: settings)
+    body = {"ingredients": [{"name": "rice", "quantity": 1, "unit": "cup"}]}
+    r = await client.post("/recipes/generate", json=body,
+                          headers=auth("user-1"))
+    assert r.status_code == 201
+
+    # the streamed and batch routes read the same settings
+    r = await client.post("/recipes/generate/stream", json=body,
+                          headers=auth("user-1"))
+    assert json.loads(r.text.splitlines()[-1])["type"] == "recipe"
+
+    from services.generationJobs import generation_pool
+    try:
+        r = await client.post("/recipes/generate/batch",
+                              json={**body, "count": 1},
+                              headers=auth("user-1"))
+        assert r.status_code == 202
+        job = generation_pool.store.get(r.json()["job_id"])
+        while not job.finished:
+            await asyncio.sleep(0.01)
+    finally:
+        await generation_pool.stop()
+
+    assert [(q["model"], q["temperature"]) for q in requests] == [
+        ("gpt-test", 0.2)
+    ] * 3
+    assert requests[1]["stream"] is True
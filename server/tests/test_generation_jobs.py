@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from services import generationJobs
+from services.generationJobs import (
+    DONE, FAILED, GenerationWorkerPool, InMemoryJobStore, TooManyJobsError,
+    generation_pool,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def rate_limit_error(retry_after_ms: int) -> openai.RateLimitError:
+    response = httpx.Response(
+        429, headers={"retry-after-ms": str(retry_after_ms)},
+        request=httpx.Request("POST", "https://api.openai.com/v1/chat"),
+    )
+    return openai.RateLimitError("rate limited", response=response,
+                                 body=None)
+
+
+class Upstream:
+    """Generate function recording who was served, and when."""
+
+    def __init__(self, rate_limited: int = 0, retry_after_ms: int = 50):
+        self.rate_limited = rate_limited
+        self.retry_after_ms = retry_after_ms
+        self.calls = []  # (first ingredient, monotonic time)
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, ingredients):
+        self.calls.append((ingredients[0], time.monotonic()))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.01)
+            if self.rate_limited:
+                self.rate_limited -= 1
+                raise rate_limit_error(self.retry_after_ms)
+            return {"title": ingredients[0]}
+        finally:
+            self.running -= 1
+
+
+async def finished(*jobs, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not all(job.finished for job in jobs):
+        assert time.monotonic() < deadline, "jobs did not finish"
+        await asyncio.sleep(0.005)
+
+
+@pytest.fixture
+async def pool():
+    pools = []
+
+    def make(upstream, **kwargs):
+        pools.append(GenerationWorkerPool(generate=upstream, **kwargs))
+        return pools[-1]
+
+    yield make
+    for p in pools:
+        await p.stop()
+
+
+async def test_users_take_turns(pool):
+    upstream = Upstream()
+    workers = pool(upstream, concurrency=1)
+    big = await workers.submit("user-a", ["a"], 3)
+    small = await workers.submit("user-b", ["b"], 1)
+    await finished(big, small)
+    assert [name for name, _ in upstream.calls] == ["a", "b", "a", "a"]
+    assert big.status == small.status == DONE
+    assert big.to_dict()["recipes"] == [{"title": "a"}] * 3
+
+
+async def test_concurrency_is_capped(pool):
+    upstream = Upstream()
+    workers = pool(upstream, concurrency=2)
+    jobs = [await workers.submit(f"user-{n}", ["x"], 3) for n in range(3)]
+    await finished(*jobs)
+    assert upstream.max_running == 2
+    assert len(upstream.calls) == 9
+
+
+async def test_rate_limit_pauses_dispatch_then_retries(pool):
+    upstream = Upstream(rate_limited=1, retry_after_ms=100)
+    workers = pool(upstream, concurrency=2)
+    job = await workers.submit("user-a", ["a"], 1)
+    await finished(job)
+    (_, first), (_, retry) = upstream.calls
+    assert retry - first >= 0.1
+    assert job.status == DONE and job.errors == [None]
+
+
+async def test_gives_up_after_max_attempts(pool):
+    upstream = Upstream(rate_limited=10, retry_after_ms=1)
+    workers = pool(upstream, concurrency=1, max_attempts=3)
+    job = await workers.submit("user-a", ["a"], 1)
+    await finished(job)
+    assert len(upstream.calls) == 3
+    assert job.status == FAILED
+    assert job.errors == ["Rate limited by the recipe generator"]
+
+
+async def test_other_failures_are_reported_per_candidate(pool):
+    async def flaky(ingredients):
+        flaky.calls += 1
+        if flaky.calls == 1:
+            raise ValueError("reply did not parse")
+        return {"title": "ok"}
+    flaky.calls = 0
+
+    workers = pool(flaky, concurrency=1)
+    job = await workers.submit("user-a", ["a"], 2)
+    await finished(job)
+    assert job.status == DONE
+    assert job.to_dict()["errors"] == ["reply did not parse"]
+    assert job.to_dict()["recipes"] == [{"title": "ok"}]
+
+
+async def test_active_jobs_per_user_are_limited(pool):
+    gate = asyncio.Event()
+
+    async def blocked(ingredients):
+        await gate.wait()
+        return {}
+
+    workers = pool(blocked, concurrency=1)
+    for _ in range(generationJobs.MAX_ACTIVE_JOBS_PER_USER):
+        await workers.submit("user-a", ["a"], 1)
+    with pytest.raises(TooManyJobsError):
+        await workers.submit("user-a", ["a"], 1)
+    await workers.submit("user-b", ["b"], 1)  # others are unaffected
+    gate.set()
+
+
+def test_finished_jobs_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(generationJobs.time, "monotonic", lambda: now[0])
+    store = InMemoryJobStore(ttl=60)
+    job = generationJobs.GenerationJob("user-a", ["a"], 1)
+    store.put(job)
+    job._complete_one()
+    now[0] += 59
+    assert store.get(job.id) is job
+    now[0] += 2
+    assert store.get(job.id) is None
+
+
+async def test_batch_route_runs_candidates_through_the_llm(client, auth,
+                                                           llm):
+    headers = auth("user-1")
+    body = {"count": 2, "ingredients": [
+        {"name": "rice", "quantity": 1, "unit": "cup"},
+        {"name": "eggs", "quantity": 2, "unit": "whole"},
+    ]}
+    try:
+        r = await client.post("/recipes/generate/batch", json=body,
+                              headers=headers)
+        assert r.status_code == 202
+        job_id = r.json()["job_id"]
+        await finished(generation_pool.store.get(job_id))
+
+        r = await client.get(f"/recipes/generate/batch/{job_id}",
+                             headers=headers)
+        assert r.json()["status"] == DONE
+        assert len(r.json()["recipes"]) == 2
+        assert llm.calls == 2
+
+        r = await client.get(f"/recipes/generate/batch/{job_id}",
+                             headers=auth("user-2"))
+        assert r.status_code == 404
+    finally:
+        await generation_pool.stop()
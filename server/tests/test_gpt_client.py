@@ -0,0 +1,109 @@
+import json
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel, Field
+
+from services.gptClient import (
+    RECIPE_JSON_SCHEMA, parse_recipe_reply, response_format,
+    strict_json_schema,
+)
+from services.metrics import llm_events
+
+
+class Part(BaseModel):
+    title: str = Field(min_length=1)
+    amount: Optional[float] = None
+
+
+class Assembly(BaseModel):
+    name: str = Field("widget", max_length=40)
+    parts: List[Part]
+    spare: Optional[Part] = None
+
+
+def objects(node):
+    if isinstance(node, dict):
+        if node.get("type") == "object":
+            yield node
+        for value in node.values():
+            yield from objects(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from objects(item)
+
+
+def test_strict_schema_requires_everything_and_inlines_refs():
+    schema = strict_json_schema(Assembly)
+    assert "$defs" not in schema
+    assert "$ref" not in json.dumps(schema)
+    nested = list(objects(schema))
+    assert len(nested) == 3  # Assembly, a list Part, the optional Part
+    for node in nested:
+        assert node["required"] == list(node["properties"])
+        assert node["additionalProperties"] is False
+
+    # a field called "title" stays; the keyword and limits are dropped
+    part = schema["properties"]["parts"]["items"]
+    assert set(part["properties"]) == {"title", "amount"}
+    assert "title" not in part
+    assert part["properties"]["title"] == {"type": "string"}
+    assert "default" not in schema["properties"]["name"]
+    assert "maxLength" not in schema["properties"]["name"]
+
+
+def test_recipe_schema_makes_optional_fields_nullable():
+    assert RECIPE_JSON_SCHEMA["required"] == list(
+        RECIPE_JSON_SCHEMA["properties"]
+    )
+    assert {"type": "null"} in (
+        RECIPE_JSON_SCHEMA["properties"]["servings"]["anyOf"]
+    )
+
+
+@pytest.mark.parametrize("model", [
+    "gpt-4o", "gpt-4o-mini", "gpt-4.1-nano", "gpt-5", "o3-mini",
+])
+def test_structured_output_models_get_the_json_schema(model):
+    fmt = response_format(model)
+    assert fmt["type"] == "json_schema"
+    assert fmt["json_schema"]["strict"] is True
+    assert fmt["json_schema"]["schema"] is RECIPE_JSON_SCHEMA
+
+
+@pytest.mark.parametrize("model", ["gpt-3.5-turbo-1106", "gpt-4-turbo"])
+def test_other_models_get_json_mode(model):
+    assert response_format(model) == {"type": "json_object"}
+
+
+RECIPE = {
+    "title": "Fried rice", "description": None,
+    "ingredients": [{"name": "rice", "quantity": 1, "unit": "cup"}],
+    "steps": ["Fry."], "prep_time": 5, "cook_time": 10, "servings": 2,
+    "image_url": None,
+}
+
+
+def test_structured_reply_takes_the_fast_path():
+    before = llm_events.value("parse_fallback")
+    recipe = parse_recipe_reply(json.dumps(RECIPE))
+    assert llm_events.value("parse_fallback") == before
+    assert recipe["description"] == ""
+    assert recipe["ingredients"] == RECIPE["ingredients"]
+
+
+def test_loose_reply_is_repaired_and_counted():
+    loose = dict(RECIPE, ingredients=["2 cups rice", "3 eggs"])
+    reply = "```json\n" + json.dumps(loose)[:-1] + ",}\n```"
+    before = llm_events.value("parse_fallback")
+    recipe = parse_recipe_reply(reply)
+    assert llm_events.value("parse_fallback") == before + 1
+    assert [(i["name"], i["quantity"], i["unit"])
+            for i in recipe["ingredients"]] == [
+        ("Rice", 2.0, "cup"), ("Eggs", 3.0, "units"),
+    ]
+
+
+def test_unusable_reply_still_raises():
+    with pytest.raises(ValueError):
+        parse_recipe_reply("Sorry, I can't help with that.")
@@ -0,0 +1,23 @@
+import pytest
+
+from config import get_settings
+from services import gptClient, health
+
+pytestmark = pytest.mark.anyio
+
+
+def with_key(monkeypatch, key):
+    settings = get_settings().model_copy(update={"openai_api_key": key})
+    monkeypatch.setattr(health, "get_settings", lambda: settings)
+
+
+async def test_llm_check_reads_the_key_without_building_a_client(
+        monkeypatch):
+    monkeypatch.setattr(gptClient, "client", None)
+    with_key(monkeypatch, "sk-test")
+    await health.check_llm()
+    assert gptClient.client is None
+
+    with_key(monkeypatch, None)
+    with pytest.raises(RuntimeError):
+        await health.check_llm()
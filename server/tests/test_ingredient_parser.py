@@ -0,0 +1,48 @@
+import pytest
+
+from bench_ingredient_parser import load_golden
+from services.ingredientParser import (
+    parse_ingredient_lines, parse_ingredient_string
+)
+
+GOLDEN = load_golden()
+
+
+def test_golden_corpus():
+    mismatches = [
+        (g["line"], g["expected"], got)
+        for g in GOLDEN
+        if (got := parse_ingredient_string(g["line"])) != g["expected"]
+    ]
+    assert len(GOLDEN) > 3000
+    assert mismatches == []
+
+
+def test_batch_matches_per_line():
+    lines = [g["line"] for g in GOLDEN]
+    assert parse_ingredient_lines(lines) == [g["expected"] for g in GOLDEN]
+
+
+@pytest.mark.parametrize("line, unit", [
+    ("1 T butter", "tbsp"),
+    ("1 T. sugar", "tbsp"),
+    ("1 t salt", "tsp"),
+    ("1 t. vanilla", "tsp"),
+    ("2 TBSP butter", "tbsp"),
+    ("2 TSP salt", "tsp"),
+])
+def test_single_letter_spoons_are_case_sensitive(line, unit):
+    assert parse_ingredient_string(line)["unit"] == unit
+
+
+def test_bare_unit_keeps_the_unit_with_no_name():
+    assert parse_ingredient_string("3 g") == {
+        "name": "", "quantity": 3.0, "unit": "g"
+    }
+    assert parse_ingredient_string("2 fl oz")["unit"] == "fl oz"
+
+
+def test_unparseable_lines():
+    with pytest.raises(ValueError):
+        parse_ingredient_string("   ")
+    assert parse_ingredient_lines(["", "2 eggs"])[0] is None
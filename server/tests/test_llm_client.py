@@ -0,0 +1,203 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from loadtest import FakeLLM
+from services import gptClient, llmClient
+from services.gptClient import parse_recipe_reply
+from services.llmClient import (
+    CircuitBreaker, LLMTimeoutError, LLMUnavailableError, ResilientLLM
+)
+
+pytestmark = pytest.mark.anyio
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat")
+MESSAGES = [{"role": "user", "content": "rice, eggs, onion"}]
+
+
+def connection_error():
+    return openai.APIConnectionError(request=REQUEST)
+
+
+def server_error():
+    return openai.InternalServerError(
+        "upstream 503", response=httpx.Response(503, request=REQUEST),
+        body=None,
+    )
+
+
+def rate_limit_error():
+    return openai.RateLimitError(
+        "slow down", response=httpx.Response(429, request=REQUEST),
+        body=None,
+    )
+
+
+class ScriptedLLM(FakeLLM):
+    """FakeLLM whose next calls raise, or stall, as scripted."""
+
+    def __init__(self, *script):
+        super().__init__(latency=0, tokens_per_second=1e6)
+        self.script = list(script)
+        self.requests = []
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        step = self.script.pop(0) if self.script else None
+        if isinstance(step, BaseException):
+            self.calls += 1
+            raise step
+        if step is not None:
+            await asyncio.sleep(step)  # seconds before answering
+        return await super().create(**kwargs)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llmClient, "_backoff", lambda attempt: 0)
+
+
+def policy(**kwargs) -> ResilientLLM:
+    kwargs.setdefault("breaker", CircuitBreaker(failures=100,
+                                                reset_after=30))
+    kwargs.setdefault("hedge_percentile", None)
+    return ResilientLLM(**kwargs)
+
+
+async def test_transient_errors_are_retried():
+    llm = ScriptedLLM(connection_error(), server_error())
+    response = await policy(max_retries=2).complete(llm, messages=MESSAGES)
+    assert response.choices[0].message.content
+    assert llm.calls == 3
+
+
+async def test_gives_up_after_max_retries():
+    llm = ScriptedLLM(*(server_error() for _ in range(5)))
+    with pytest.raises(LLMUnavailableError):
+        await policy(max_retries=2).complete(llm, messages=MESSAGES)
+    assert llm.calls == 3
+
+
+async def test_rate_limits_are_raised_without_retrying():
+    llm = ScriptedLLM(rate_limit_error())
+    with pytest.raises(openai.RateLimitError):
+        await policy(max_retries=2).complete(llm, messages=MESSAGES)
+    assert llm.calls == 1
+
+
+async def test_deadline_covers_the_whole_call():
+    llm = FakeLLM(latency=1, tokens_per_second=1e6)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        await policy(deadline=0.05).complete(llm, messages=MESSAGES)
+    assert time.monotonic() - started < 0.5
+
+
+async def test_breaker_opens_fails_fast_and_recovers():
+    breaker = CircuitBreaker(failures=2, reset_after=0.05)
+    llm = ScriptedLLM(server_error(), server_error(), server_error())
+    resilient = policy(max_retries=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            await resilient.complete(llm, messages=MESSAGES)
+    assert breaker.state == "open"
+
+    with pytest.raises(LLMUnavailableError):
+        await resilient.complete(llm, messages=MESSAGES)
+    assert llm.calls == 2  # failed fast
+
+    # A failed probe re-opens it; a successful one closes it
+    await asyncio.sleep(0.06)
+    with pytest.raises(LLMUnavailableError):
+        await resilient.complete(llm, messages=MESSAGES)
+    assert breaker.state == "open" and llm.calls == 3
+    await asyncio.sleep(0.06)
+    await resilient.complete(llm, messages=MESSAGES)
+    assert breaker.state == "closed" and llm.calls == 4
+
+
+async def test_unparseable_reply_is_repaired_once():
+    replies = []
+
+    def parse(content):
+        replies.append(content)
+        if len(replies) == 1:
+            raise ValueError("missing steps")
+        return parse_recipe_reply(content)
+
+    llm = ScriptedLLM()
+    recipe = await policy(max_repairs=1).complete_json(
+        llm, parse, messages=MESSAGES
+    )
+    assert recipe["title"] == "Skillet rice"
+    repair = llm.requests[1]["messages"]
+    assert repair[:1] == MESSAGES
+    assert repair[1] == {"role": "assistant", "content": replies[0]}
+    assert "missing steps" in repair[2]["content"]
+
+
+async def test_repairs_are_bounded():
+    def parse(content):
+        raise ValueError("still broken")
+
+    llm = ScriptedLLM()
+    with pytest.raises(ValueError):
+        await policy(max_repairs=1).complete_json(llm, parse,
+                                                  messages=MESSAGES)
+    assert llm.calls == 2
+
+
+async def test_slow_attempt_is_hedged():
+    resilient = policy(hedge_percentile=95)
+    for _ in range(llmClient.HEDGE_MIN_SAMPLES):
+        resilient.latency.add(0.01)
+    llm = ScriptedLLM(1.0)  # the first attempt stalls, the hedge does not
+    started = time.monotonic()
+    response = await resilient.complete(llm, messages=MESSAGES)
+    assert response.choices[0].message.content
+    assert time.monotonic() - started < 0.5
+    assert len(llm.requests) == 2
+
+
+async def test_no_hedge_without_enough_samples():
+    llm = ScriptedLLM(0.05)
+    await policy(hedge_percentile=95).complete(llm, messages=MESSAGES)
+    assert len(llm.requests) == 1
+
+
+async def test_open_stream_trips_the_breaker_on_failure():
+    breaker = CircuitBreaker(failures=1, reset_after=30)
+    llm = ScriptedLLM(connection_error())
+    with pytest.raises(LLMUnavailableError) as caught:
+        await policy(breaker=breaker).open_stream(llm, messages=MESSAGES,
+                                                  stream=True)
+    assert isinstance(caught.value.__cause__, openai.APIConnectionError)
+    assert breaker.state == "open"
+
+
+async def test_open_stream_raises_rate_limits_as_is():
+    breaker = CircuitBreaker(failures=1, reset_after=30)
+    llm = ScriptedLLM(rate_limit_error())
+    with pytest.raises(openai.RateLimitError):
+        await policy(breaker=breaker).open_stream(llm, messages=MESSAGES,
+                                                  stream=True)
+    assert breaker.state == "closed"
+
+
+async def test_upstream_rate_limit_on_generate_is_a_503(client, auth,
+                                                        monkeypatch):
+    error = openai.RateLimitError(
+        "org-secret quota exceeded", body=None, response=httpx.Response(
+            429, headers={"retry-after": "7"}, request=REQUEST,
+        ),
+    )
+    monkeypatch.setattr(gptClient, "client", ScriptedLLM(error))
+    body = {"ingredients": [{"name": "rice", "quantity": 1, "unit": "cup"}]}
+    r = await client.post("/recipes/generate", json=body,
+                          headers=auth("user-1"))
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "7"
+    assert "org-secret" not in r.text
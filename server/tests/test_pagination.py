@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from pagination import (
+    INGREDIENT_SORT, NEXT_CURSOR_HEADER, RECIPE_SORT, after_cursor,
+    decode_cursor, encode_cursor,
+)
+
+pytestmark = pytest.mark.anyio
+
+WHEN = datetime(2024, 3, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+
+
+def test_cursor_round_trips_each_value_type():
+    oid = ObjectId()
+    sort = [("created_at", -1), ("title", 1), ("servings", 1), ("_id", -1)]
+    cursor = encode_cursor({"created_at": WHEN, "title": "Crêpes / 2?",
+                            "servings": None, "_id": oid}, sort)
+    assert "=" not in cursor
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+                              "abcdefghijklmnopqrstuvwxyz0123456789-_")
+    assert decode_cursor(cursor, sort) == [WHEN, "Crêpes / 2?", None, oid]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor", "e30", encode_cursor({"_id": ObjectId()}, INGREDIENT_SORT),
+])
+def test_bad_cursors_are_a_400(cursor):
+    # the last one is valid, but for a sort with one key, not two
+    with pytest.raises(HTTPException) as caught:
+        decode_cursor(cursor, RECIPE_SORT)
+    assert caught.value.status_code == 400
+
+
+def test_after_cursor_breaks_ties_on_the_next_key():
+    oid = ObjectId()
+    cursor = encode_cursor({"created_at": WHEN, "_id": oid}, RECIPE_SORT)
+    assert after_cursor(cursor, RECIPE_SORT) == {"$or": [
+        {"created_at": {"$lt": WHEN}},
+        {"created_at": WHEN, "_id": {"$lt": oid}},
+    ]}
+    cursor = encode_cursor({"_id": oid}, INGREDIENT_SORT)
+    assert after_cursor(cursor, INGREDIENT_SORT) == {"_id": {"$gt": oid}}
+    assert after_cursor(None, RECIPE_SORT) == {}
+
+
+async def pages(client, headers, path, limit):
+    seen, cursor = [], None
+    while True:
+        query = f"limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        r = await client.get(f"{path}?{query}", headers=headers)
+        assert r.status_code == 200
+        seen.append([item["title"] for item in r.json()])
+        cursor = r.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return seen
+
+
+async def test_recipes_with_the_same_timestamp_page_without_gaps(
+        client, auth, database):
+    # five share a created_at, so only _id orders them
+    docs = [
+        {"user_id": "user-1", "title": f"Recipe {n}", "steps": ["a"],
+         "ingredients": [], "created_at": WHEN + timedelta(minutes=n // 5),
+         "updated_at": WHEN}
+        for n in range(7)
+    ]
+    await database.recipes.insert_many(docs)
+    seen = await pages(client, auth("user-1"), "/recipes/", limit=2)
+    assert seen == [["Recipe 6", "Recipe 5"], ["Recipe 4", "Recipe 3"],
+                    ["Recipe 2", "Recipe 1"], ["Recipe 0"]]
+
+
+async def test_a_full_last_page_has_no_next_cursor(client, auth, database):
+    await database.recipes.insert_many([
+        {"user_id": "user-1", "title": f"Recipe {n}", "steps": ["a"],
+         "ingredients": [], "created_at": WHEN, "updated_at": WHEN}
+        for n in range(4)
+    ])
+    seen = await pages(client, auth("user-1"), "/recipes/", limit=2)
+    assert [len(page) for page in seen] == [2, 2]
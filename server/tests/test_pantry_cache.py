@@ -0,0 +1,123 @@
+import pytest
+
+from services import pantryCache
+from services.pantryCache import InMemoryPantryStore, PantryCache
+
+pytestmark = pytest.mark.anyio
+
+
+async def add(database, user_id, name, position):
+    await database.ingredients.insert_one({
+        "user_id": user_id, "name": name, "quantity": 1, "unit": "cup",
+        "position": position,
+    })
+
+
+def names(snapshot):
+    return [doc["name"] for doc in snapshot.docs]
+
+
+async def test_snapshots_expire_after_the_ttl(database, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(pantryCache.time, "monotonic", lambda: now[0])
+    cache = PantryCache(InMemoryPantryStore(), ttl=5)
+    await add(database, "user-1", "rice", 0)
+    first = await cache.get_pantry(database, "user-1")
+
+    await add(database, "user-1", "eggs", 1)  # not invalidated
+    now[0] += 4
+    assert await cache.get_pantry(database, "user-1") is first
+    now[0] += 2
+    assert names(await cache.get_pantry(database, "user-1")) == [
+        "rice", "eggs"
+    ]
+
+
+async def test_zero_ttl_reads_mongo_every_time(database):
+    cache = PantryCache(InMemoryPantryStore(), ttl=0)
+    await add(database, "user-1", "rice", 0)
+    first = await cache.get_pantry(database, "user-1")
+    assert await cache.get_pantry(database, "user-1") is not first
+    assert len(cache.store) == 0
+
+
+async def test_invalidation_drops_the_snapshot(database):
+    cache = PantryCache(InMemoryPantryStore(), ttl=60)
+    await add(database, "user-1", "rice", 0)
+    await cache.get_pantry(database, "user-1")
+    await add(database, "user-1", "eggs", 1)
+    cache.invalidate("user-1")
+    assert names(await cache.get_pantry(database, "user-1")) == [
+        "rice", "eggs"
+    ]
+
+
+async def test_a_load_that_raced_a_write_is_not_stored(database,
+                                                       monkeypatch):
+    cache = PantryCache(InMemoryPantryStore(), ttl=60)
+    await add(database, "user-1", "rice", 0)
+    load = cache._load
+
+    async def write_during_load(db, user_id):
+        snapshot = await load(db, user_id)  # read before the write...
+        await add(database, user_id, "eggs", 1)
+        cache.invalidate(user_id)           # ...which lands meanwhile
+        return snapshot
+
+    monkeypatch.setattr(cache, "_load", write_during_load)
+    stale = await cache.get_pantry(database, "user-1")
+    assert names(stale) == ["rice"]
+    assert cache.store.get("user-1") is None
+
+    monkeypatch.setattr(cache, "_load", load)
+    assert names(await cache.get_pantry(database, "user-1")) == [
+        "rice", "eggs"
+    ]
+
+
+def test_versions_survive_eviction():
+    store = InMemoryPantryStore(max_size=1)
+    version = store.version("user-1")
+    store.invalidate("user-1")
+    store.put("user-2", store.version("user-2"), object())
+    assert not store.put("user-1", version, object())
+
+
+async def test_if_none_match_gets_a_304(client, auth):
+    headers = auth("user-1")
+    await client.post("/ingredients/", headers=headers,
+                      json={"name": "rice", "quantity": 1, "unit": "cup"})
+    r = await client.get("/ingredients/", headers=headers)
+    etag = r.headers["etag"]
+
+    for tag in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        r = await client.get("/ingredients/",
+                             headers={**headers, "If-None-Match": tag})
+        assert r.status_code == 304
+        assert r.content == b""
+        assert r.headers["etag"] == etag
+
+    await client.post("/ingredients/", headers=headers,
+                      json={"name": "eggs", "quantity": 2, "unit": "whole"})
+    r = await client.get("/ingredients/",
+                         headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert [i["name"] for i in r.json()] == ["rice", "eggs"]
+
+
+async def test_only_the_full_list_is_served_from_the_cache(client, auth,
+                                                           database):
+    headers = auth("user-1")
+    await client.post("/ingredients/", headers=headers,
+                      json={"name": "rice", "quantity": 1, "unit": "cup"})
+    r = await client.get("/ingredients/", headers=headers)
+    assert [i["name"] for i in r.json()] == ["rice"]
+
+    # a write that skips the routes, so nothing invalidates the snapshot
+    await add(database, "user-1", "eggs", 1)
+    r = await client.get("/ingredients/", headers=headers)
+    assert [i["name"] for i in r.json()] == ["rice"]
+    r = await client.get("/ingredients/?limit=10", headers=headers)
+    assert [i["name"] for i in r.json()] == ["rice", "eggs"]
+    assert "etag" not in r.headers
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services import promptBuilder
+from services.promptBuilder import estimate_tokens, select_ingredients
+
+
+def item(name, quantity, unit):
+    return SimpleNamespace(name=name, quantity=quantity, unit=unit)
+
+
+class WordEncoding:
+    """Stands in for a tiktoken encoding when none can be loaded."""
+
+    def encode(self, text):
+        return text.split()
+
+
+@pytest.fixture(params=["heuristic", "tiktoken"])
+def encoding(request, monkeypatch):
+    if request.param == "heuristic":
+        monkeypatch.setattr(promptBuilder, "_encoding", None)
+        return None
+    try:
+        import tiktoken
+        found = tiktoken.get_encoding("cl100k_base")
+    except Exception:  # not installed, or no cached encoding offline
+        found = WordEncoding()
+    monkeypatch.setattr(promptBuilder, "_encoding", found)
+    return found
+
+
+def test_estimates_use_the_encoding_when_there_is_one(encoding):
+    line = "2 cup all-purpose flour"
+    if encoding is None:
+        assert estimate_tokens(line) == 7  # "purpose" counts twice
+    else:
+        assert estimate_tokens(line) == len(encoding.encode(line))
+
+
+def test_duplicates_merge_across_units_and_spellings():
+    selected = select_ingredients([
+        item("Milk", 1, "cup"),
+        item("milk ", 250, "ml"),
+        item("salt", 0, "to taste"),
+        item("Salt", 0, "to taste"),
+        item("eggs", 2, "whole"),
+        item("Eggs", 3, "units"),
+    ], budget=1000)
+    assert selected.total == 3
+    assert sorted(selected.lines) == ["2.057 cup Milk", "5 whole eggs",
+                                      "salt"]
+
+
+def test_preferred_then_perishable_items_rank_first():
+    pantry = [item("rice", 2, "cup"), item("eggs", 6, "units"),
+              item("salmon", 300, "g"), item("quinoa", 1, "cup")]
+    lines = select_ingredients(pantry, budget=1000).lines
+    assert [line.split()[-1] for line in lines] == [
+        "salmon", "eggs", "quinoa", "rice",
+    ]
+    lines = select_ingredients(pantry, preferences=["Rice"],
+                               budget=1000).lines
+    assert lines[0] == "2 cup rice"
+
+
+def test_lines_are_cut_to_the_token_budget(encoding):
+    pantry = [item("chicken thighs", 500, "g"),      # perishable: first
+              item("spinach", 200, "g"),
+              item("eggs", 6, "units"),
+              item("granulated white sugar", 1, "cup"),
+              item("rice", 2, "cup")]
+    everything = select_ingredients(pantry, budget=1000)
+    assert everything.dropped == 0
+
+    first, second, *_ = everything.lines
+    budget = estimate_tokens(first) + 1 + estimate_tokens(second)
+    selected = select_ingredients(pantry, budget=budget)
+    assert selected.lines[:2] == [first, second]
+    assert selected.tokens <= budget
+    assert selected.dropped == selected.total - len(selected.lines) > 0
+
+
+def test_a_shorter_line_further_down_still_fits(encoding):
+    pantry = [item("fresh atlantic salmon fillets", 300, "g"),
+              item("extra virgin olive oil, cold pressed", 1, "cup"),
+              item("salt", 0, "to taste")]
+    head = select_ingredients(pantry, budget=1000).lines[0]
+    budget = estimate_tokens(head) + 1 + estimate_tokens("salt")
+    assert select_ingredients(pantry, budget=budget).lines == [head, "salt"]
+
+
+def test_the_top_line_is_kept_even_over_budget(encoding):
+    selected = select_ingredients([item("chicken breast", 1, "lb")],
+                                  budget=1)
+    assert selected.lines == ["1 lb chicken breast"]
+    assert selected.dropped == 0
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+import routes.recipes
+from services import rateLimit
+from services.rateLimit import (
+    GENERATE, AdmissionGate, InMemoryRateLimitStore, OverloadedError,
+    RateLimitedError, RateLimiter, RateLimitPolicy,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rateLimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    store = InMemoryRateLimitStore()
+    rate = 2.0  # tokens per second
+    assert [store.take("k", rate, 3) for _ in range(3)] == [0, 0, 0]
+    assert store.take("k", rate, 3) == pytest.approx(0.5)
+    clock[0] += 0.5
+    assert store.take("k", rate, 3) == 0
+    clock[0] += 60  # never refills past the burst
+    assert [store.take("k", rate, 3) for _ in range(4)][-1] > 0
+
+
+def test_bucket_store_is_size_bounded(clock):
+    store = InMemoryRateLimitStore(max_size=2)
+    for key in ("a", "b", "c"):
+        store.take(key, 1.0, 1)
+    assert list(store._buckets) == ["b", "c"]
+
+
+def test_limiter_raises_with_retry_after_per_user(clock):
+    limiter = RateLimiter()
+    policy = RateLimitPolicy("generate", per_minute=6, burst=2)
+    limiter.check(policy, "user-a")
+    limiter.check(policy, "user-a")
+    with pytest.raises(RateLimitedError) as e:
+        limiter.check(policy, "user-a")
+    assert e.value.retry_after == pytest.approx(10)
+    limiter.check(policy, "user-b")  # buckets are per user
+
+
+def test_cost_is_capped_at_the_burst(clock):
+    limiter = RateLimiter()
+    policy = RateLimitPolicy("generate", per_minute=60, burst=3)
+    limiter.check(policy, "user-a", cost=10)  # a full bucket, not never
+    with pytest.raises(RateLimitedError):
+        limiter.check(policy, "user-a")
+
+
+def test_zero_rate_turns_a_scope_off():
+    limiter = RateLimiter()
+    policy = RateLimitPolicy("crud", per_minute=0, burst=1)
+    for _ in range(10):
+        limiter.check(policy, "user-a")
+
+
+def test_retry_after_header_rounds_up():
+    assert rateLimit.retry_after_header(0.2) == {"Retry-After": "1"}
+    assert rateLimit.retry_after_header(4.1) == {"Retry-After": "5"}
+
+
+async def test_gate_queues_then_sheds_when_the_queue_is_full():
+    gate = AdmissionGate(max_concurrent=1, max_queue=1, queue_timeout=1,
+                         retry_after=7)
+    await gate.acquire()
+    waiter = asyncio.ensure_future(gate.acquire())
+    await asyncio.sleep(0)
+    assert gate.waiting == 1
+    with pytest.raises(OverloadedError) as e:
+        await gate.acquire()
+    assert e.value.retry_after == 7
+
+    gate.release()
+    await waiter  # the queued request got the slot
+    assert gate.waiting == 0
+    gate.release()
+
+
+async def test_gate_sheds_after_the_queue_timeout():
+    gate = AdmissionGate(max_concurrent=1, max_queue=5, queue_timeout=0.02)
+    async with gate:
+        with pytest.raises(OverloadedError):
+            await gate.acquire()
+    assert gate.waiting == 0
+    async with gate:  # the slot came back
+        pass
+
+
+async def test_held_slot_releases_once():
+    gate = AdmissionGate(max_concurrent=1, max_queue=0, queue_timeout=0)
+    slot = await gate.hold()
+    slot.release()
+    slot.release()
+    assert gate._semaphore._value == 1
+
+
+GENERATE_BODY = {"ingredients": [
+    {"name": "rice", "quantity": 1, "unit": "cup"},
+]}
+
+
+async def test_generate_route_answers_429_with_retry_after(
+        client, auth, llm, monkeypatch):
+    monkeypatch.setattr(GENERATE, "burst", 2)
+    monkeypatch.setattr(GENERATE, "rate", 1 / 30)
+    headers = auth("user-1")
+    codes = []
+    for _ in range(3):
+        r = await client.post("/recipes/generate", json=GENERATE_BODY,
+                              headers=headers)
+        codes.append(r.status_code)
+    assert codes == [201, 201, 429]
+    assert int(r.headers["retry-after"]) > 0
+
+    r = await client.post("/recipes/generate", json=GENERATE_BODY,
+                          headers=auth("user-2"))
+    assert r.status_code == 201
+
+
+async def test_generate_route_sheds_with_503_when_overloaded(
+        client, auth, llm, monkeypatch):
+    gate = AdmissionGate(max_concurrent=1, max_queue=0, queue_timeout=0,
+                         retry_after=3)
+    monkeypatch.setattr(routes.recipes, "generation_gate", gate)
+    llm.latency = 0.05
+    first = asyncio.ensure_future(client.post(
+        "/recipes/generate", json=GENERATE_BODY, headers=auth("user-1")
+    ))
+    await asyncio.sleep(0.01)
+    body = {"ingredients": [{"name": "eggs", "quantity": 2,
+                             "unit": "whole"}]}
+    r = await client.post("/recipes/generate", json=body,
+                          headers=auth("user-2"))
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "3"
+    assert (await first).status_code == 201
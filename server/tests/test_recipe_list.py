@@ -0,0 +1,34 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+# Written by an older build: image_url saved as the string "None" and the
+# timestamps as ISO strings
+LEGACY = {
+    "user_id": "user-1", "title": "Fried rice", "description": "",
+    "ingredients": [{"name": "rice", "quantity": 2, "unit": "cup"}],
+    "steps": ["Fry."], "image_url": "None",
+    "created_at": "2024-03-01T12:00:00+00:00",
+    "updated_at": "2024-03-01T12:00:00+00:00",
+}
+
+
+async def test_fields_view_is_normalized_like_the_full_view(client, auth,
+                                                            database):
+    await database.recipes.insert_one(dict(LEGACY))
+    headers = auth("user-1")
+    full = (await client.get("/recipes/", headers=headers)).json()[0]
+    r = await client.get("/recipes/?fields=title,image_url,created_at",
+                         headers=headers)
+    assert r.status_code == 200
+    (summary,) = r.json()
+    assert set(summary) == {"id", "title", "image_url", "created_at"}
+    assert summary["image_url"] is None
+    assert {k: full[k] for k in summary} == summary
+    assert summary["created_at"] == "2024-03-01T12:00:00Z"
+
+
+async def test_fields_view_rejects_unknown_fields(client, auth):
+    r = await client.get("/recipes/?fields=title,password",
+                         headers=auth("user-1"))
+    assert r.status_code == 400
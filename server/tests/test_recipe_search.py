@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import routes.recipes
+from models.recipe import SUMMARY_FIELDS
+from services.recipeSearch import search_pipeline
+
+pytestmark = pytest.mark.anyio
+
+
+def stages(pipeline):
+    return [next(iter(stage)) for stage in pipeline]
+
+
+def test_pipeline_without_a_query():
+    pipeline = search_pipeline("user-1", ["eggs", "rice"], limit=5)
+    assert pipeline[0] == {"$match": {"user_id": "user-1"}}
+    assert stages(pipeline) == ["$match", "$addFields", "$addFields",
+                                "$addFields", "$sort", "$limit", "$project"]
+    assert list(pipeline[-3]["$sort"]) == ["coverage", "created_at", "_id"]
+    assert pipeline[-2] == {"$limit": 5}
+    projection = pipeline[-1]["$project"]
+    assert set(projection) == SUMMARY_FIELDS | {"coverage", "missing"}
+
+
+def test_pipeline_with_a_query_and_min_coverage():
+    pipeline = search_pipeline("user-1", ["rice"], q="fried rice",
+                               min_coverage=0.5)
+    assert pipeline[0]["$match"]["$text"] == {"$search": "fried rice"}
+    assert {"$addFields": {"score": {"$meta": "textScore"}}} in pipeline
+    assert {"$match": {"coverage": {"$gte": 0.5}}} in pipeline
+    # the coverage filter runs before the sort and the limit
+    assert stages(pipeline)[-4:] == ["$match", "$sort", "$limit",
+                                     "$project"]
+    assert list(pipeline[-3]["$sort"]) == ["coverage", "score",
+                                           "created_at", "_id"]
+    assert pipeline[-1]["$project"]["score"] == 1
+
+
+def ingredients(*names):
+    return [{"name": n, "quantity": 1, "unit": "cup"} for n in names]
+
+
+async def seed(database):
+    when = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    await database.recipes.insert_many([
+        {"user_id": "user-1", "title": "Fried rice", "steps": ["Fry."],
+         "ingredients": ingredients("Rice", "Eggs"), "image_url": "None",
+         "created_at": when, "updated_at": when},
+        {"user_id": "user-1", "title": "Chicken rice bowl", "steps": ["a"],
+         "ingredients": ingredients("rice", "eggs", "chicken", "onion"),
+         "created_at": when, "updated_at": when},
+        {"user_id": "user-2", "title": "Plain rice", "steps": ["Boil."],
+         "ingredients": ingredients("rice"),
+         "created_at": when, "updated_at": when},
+    ])
+
+
+async def stock(client, headers, *names):
+    for name in names:
+        await client.post("/ingredients/", headers=headers,
+                          json={"name": name, "quantity": 2, "unit": "cup"})
+
+
+async def test_search_ranks_by_pantry_coverage(client, auth, database):
+    await seed(database)
+    headers = auth("user-1")
+    await stock(client, headers, "rice", "eggs")
+
+    r = await client.get("/recipes/search", headers=headers)
+    assert r.status_code == 200
+    results = r.json()
+    assert [(x["title"], x["coverage"]) for x in results] == [
+        ("Fried rice", 1.0), ("Chicken rice bowl", 0.5),
+    ]
+    assert sorted(results[1]["missing"]) == ["chicken", "onion"]
+    # normalized like GET /recipes
+    assert results[0]["image_url"] is None
+    assert results[0]["created_at"] == "2024-03-01T00:00:00Z"
+    assert "score" not in results[0]
+
+    r = await client.get("/recipes/search?min_coverage=1", headers=headers)
+    assert [x["title"] for x in r.json()] == ["Fried rice"]
+
+
+async def test_search_with_a_query(client, auth, database, monkeypatch):
+    # mongomock has no $text; run the rest of the pipeline the route built
+    built = []
+
+    def without_text(*args, **kwargs):
+        pipeline = search_pipeline(*args, **kwargs)
+        built.append(pipeline)
+        match = {k: v for k, v in pipeline[0]["$match"].items()
+                 if k != "$text"}
+        return [{"$match": match}] + [
+            s for s in pipeline[1:]
+            if s != {"$addFields": {"score": {"$meta": "textScore"}}}
+        ]
+
+    monkeypatch.setattr(routes.recipes, "search_pipeline", without_text)
+    await seed(database)
+    headers = auth("user-1")
+    await stock(client, headers, "rice")
+
+    r = await client.get("/recipes/search?q=rice&limit=1", headers=headers)
+    assert r.status_code == 200
+    (pipeline,) = built
+    assert pipeline[0]["$match"] == {"user_id": "user-1",
+                                     "$text": {"$search": "rice"}}
+    assert pipeline[-2] == {"$limit": 1}
+    assert [x["title"] for x in r.json()] == ["Fried rice"]
+
+
+async def test_search_validates_its_parameters(client, auth):
+    headers = auth("user-1")
+    for query in ("q=", "min_coverage=1.5", "limit=0"):
+        r = await client.get(f"/recipes/search?{query}", headers=headers)
+        assert r.status_code == 422
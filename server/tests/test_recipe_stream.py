@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from loadtest import FakeLLM
+from services import gptClient
+from services.rateLimit import generation_gate
+from services.recipeStream import IncrementalRecipeParser
+
+pytestmark = pytest.mark.anyio
+
+PANTRY = {"ingredients": [
+    {"name": "rice", "quantity": 2, "unit": "cup"},
+    {"name": "eggs", "quantity": 6, "unit": "whole"},
+    {"name": "onion", "quantity": 1, "unit": "whole"},
+]}
+
+
+def feed_in_pieces(text: str, size: int):
+    parser = IncrementalRecipeParser()
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 7, 10_000])
+def test_parser_reports_each_value_once_complete(size):
+    reply = "```json\n" + FakeLLM.reply("rice, eggs, onion") + "\n```"
+    events = feed_in_pieces(reply, size)
+    assert [e["type"] for e in events] == (
+        ["title"] + ["ingredient"] * 3 + ["step"] * 6
+    )
+    assert events[0]["title"] == "Skillet rice"
+    assert events[1]["ingredient"] == {
+        "name": "rice", "quantity": 1.0, "unit": "cup"
+    }
+    assert [e["index"] for e in events[4:]] == list(range(6))
+
+
+def test_parser_handles_escapes_and_string_ingredients():
+    reply = json.dumps({
+        "title": 'The "best" {rice}',
+        "ingredients": ["2 cups rice", "3 eggs"],
+        "steps": ["Boil [then] stir, \\ serve"],
+    })
+    events = feed_in_pieces(reply, 3)
+    assert events[0] == {"type": "title", "title": 'The "best" {rice}'}
+    assert [e["ingredient"]["name"] for e in events[1:3]] == ["Rice",
+                                                              "Eggs"]
+    assert events[3]["step"] == "Boil [then] stir, \\ serve"
+
+
+async def post_stream(client, headers):
+    r = await client.post("/recipes/generate/stream", json=PANTRY,
+                          headers=headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in r.text.splitlines()]
+
+
+async def test_stream_sends_ndjson_events_then_the_saved_recipe(
+        client, auth, llm, database):
+    events = await post_stream(client, auth("user-1"))
+    assert [e["type"] for e in events] == (
+        ["title"] + ["ingredient"] * 3 + ["step"] * 6 + ["recipe"]
+    )
+    recipe = events[-1]["recipe"]
+    assert recipe["user_id"] == "user-1"
+    assert await database.recipes.count_documents({}) == 1
+    assert not generation_gate._semaphore.locked()
+
+
+async def test_stream_ends_with_an_error_event_on_a_bad_reply(
+        client, auth, monkeypatch, database):
+    class Garbled(FakeLLM):
+        @staticmethod
+        def reply(prompt):
+            return '{"title": "Half a recipe", "ingredients": ['
+
+    monkeypatch.setattr(gptClient, "client", Garbled(0, 1e6))
+    events = await post_stream(client, auth("user-1"))
+    assert events[0] == {"type": "title", "title": "Half a recipe"}
+    assert events[-1]["type"] == "error"
+    assert await database.recipes.count_documents({}) == 0
@@ -0,0 +1,92 @@
+import pytest
+
+from db import CountingDatabase, insert_returning, start_round_trip_count
+
+pytestmark = pytest.mark.anyio
+
+RECIPE = {
+    "title": "Fried rice",
+    "description": "Leftover rice, eggs and onion.",
+    "ingredients": [
+        {"name": "rice", "quantity": 2, "unit": "cup"},
+        {"name": "eggs", "quantity": 2, "unit": "whole"},
+    ],
+    "steps": ["Fry the onion.", "Add rice and eggs."],
+    "prep_time": 5, "cook_time": 10, "servings": 2,
+}
+
+
+async def test_each_awaited_collection_call_counts_once(database):
+    counting = CountingDatabase(database)
+    counter = start_round_trip_count()
+    saved = await insert_returning(counting.recipes, {"title": "a"})
+    assert saved["_id"] is not None  # no read-back
+    await counting.recipes.find({}).sort("_id", -1).limit(5).to_list(None)
+    await counting["recipes"].find_one({"_id": saved["_id"]})
+    assert counter.count == 3
+
+    # Building a cursor is free; only fetching it is a round trip
+    counting.recipes.find({}).sort("_id", 1)
+    assert counter.count == 3
+
+
+async def test_calls_that_bypass_get_db_are_not_counted(database):
+    counter = start_round_trip_count()
+    await database.recipes.insert_one({"title": "direct"})
+    assert counter.count == 0
+
+
+def round_trips(response) -> int:
+    return int(response.headers["x-db-round-trips"])
+
+
+async def test_recipe_crud_makes_one_round_trip_each(client, auth):
+    headers = auth("user-1")
+    r = await client.post("/recipes/", json=RECIPE, headers=headers)
+    assert r.status_code == 201 and round_trips(r) == 1
+    recipe_id = r.json()["id"]
+
+    r = await client.get(f"/recipes/{recipe_id}", headers=headers)
+    assert r.status_code == 200 and round_trips(r) == 1
+
+    r = await client.put(f"/recipes/{recipe_id}",
+                         json=RECIPE | {"title": "Egg fried rice"},
+                         headers=headers)
+    assert r.status_code == 200 and round_trips(r) == 1
+    assert r.json()["title"] == "Egg fried rice"
+
+    r = await client.get("/recipes/", headers=headers)
+    assert r.status_code == 200 and round_trips(r) == 1
+
+    r = await client.delete(f"/recipes/{recipe_id}", headers=headers)
+    assert r.status_code == 204 and round_trips(r) == 1
+
+
+async def test_ingredient_writes_make_one_round_trip_each(client, auth):
+    headers = auth("user-1")
+    r = await client.post("/ingredients/", headers=headers,
+                          json={"name": "rice", "quantity": 1,
+                                "unit": "cup"})
+    assert r.status_code == 200 and round_trips(r) == 1
+    ingredient_id = r.json()["_id"]
+
+    r = await client.put(f"/ingredients/{ingredient_id}", headers=headers,
+                         json={"name": "rice", "quantity": 3,
+                               "unit": "cup"})
+    assert r.status_code == 200 and round_trips(r) == 1
+
+    r = await client.delete(f"/ingredients/{ingredient_id}",
+                            headers=headers)
+    assert r.status_code == 204 and round_trips(r) == 1
+
+
+async def test_created_recipe_reads_back_with_the_same_timestamps(client,
+                                                                  auth):
+    headers = auth("user-1")
+    created = (await client.post("/recipes/", json=RECIPE,
+                                 headers=headers)).json()
+    read = (await client.get(f"/recipes/{created['id']}",
+                             headers=headers)).json()
+    assert created["created_at"] == read["created_at"]
+    assert created["updated_at"] == read["updated_at"]
+    assert read["created_at"].endswith("Z")
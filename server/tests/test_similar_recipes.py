@@ -0,0 +1,157 @@
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from services.similarRecipes import (
+    GENERATED, SimilarRecipeIndex, pantry_amounts
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def recipe(owner, *ingredients, source=GENERATED):
+    return {
+        "_id": ObjectId(), "user_id": owner, "source": source,
+        "ingredients": [
+            {"name": name, "quantity": quantity, "unit": unit}
+            for name, quantity, unit in ingredients
+        ],
+    }
+
+
+def pantry(*items):
+    return pantry_amounts(
+        SimpleNamespace(name=name, quantity=quantity, unit=unit)
+        for name, quantity, unit in items
+    )
+
+
+FRIED_RICE = (("rice", 1, "cup"), ("eggs", 2, "whole"),
+              ("onion", 1, "whole"), ("soy sauce", 2, "tbsp"))
+FULL_PANTRY = pantry(("rice", 3, "cup"), ("eggs", 6, "whole"),
+                     ("onion", 2, "whole"), ("soy sauce", 100, "ml"))
+
+
+def index_of(*docs, min_coverage=0.9):
+    index = SimilarRecipeIndex(max_size=10, min_coverage=min_coverage)
+    for doc in docs:
+        index.add(doc)
+    return index
+
+
+def ids(matches):
+    return [m.recipe_id for m in matches]
+
+
+def test_full_coverage_matches():
+    doc = recipe("user-1", *FRIED_RICE)
+    (match,) = index_of(doc).match(FULL_PANTRY)
+    assert match.recipe_id == str(doc["_id"])
+    assert match.coverage == 1.0 and match.covered == 4
+
+
+def test_coverage_threshold():
+    doc = recipe("user-1", *FRIED_RICE)
+    three_of_four = pantry(("rice", 3, "cup"), ("eggs", 6, "whole"),
+                           ("onion", 2, "whole"))
+    assert index_of(doc).match(three_of_four) == []
+    (match,) = index_of(doc, min_coverage=0.75).match(three_of_four)
+    assert match.coverage == 0.75
+
+
+def test_amounts_must_cover_the_recipe():
+    doc = recipe("user-1", *FRIED_RICE)
+    one_egg = pantry(("rice", 3, "cup"), ("eggs", 1, "whole"),
+                     ("onion", 2, "whole"), ("soy sauce", 100, "ml"))
+    assert index_of(doc).match(one_egg) == []
+    # amounts are compared in base units: 250 ml is more than a cup
+    in_ml = pantry(("rice", 250, "ml"), ("eggs", 2, "whole"),
+                   ("onion", 1, "whole"), ("soy sauce", 30, "ml"))
+    assert ids(index_of(doc).match(in_ml)) == [str(doc["_id"])]
+
+
+def test_different_dimensions_only_need_the_name():
+    doc = recipe("user-1", *FRIED_RICE)
+    rice_by_weight = pantry(("rice", 1, "g"), ("eggs", 6, "whole"),
+                            ("onion", 2, "whole"), ("soy sauce", 100, "ml"))
+    assert ids(index_of(doc).match(rice_by_weight)) == [str(doc["_id"])]
+
+
+def test_exclude_user_skips_their_own_recipes():
+    own = recipe("user-1", *FRIED_RICE)
+    other = recipe("user-2", *FRIED_RICE)
+    index = index_of(own, other)
+    assert ids(index.match(FULL_PANTRY, exclude_user="user-1")) == [
+        str(other["_id"])
+    ]
+
+
+def test_required_ingredients_must_be_in_the_recipe():
+    doc = recipe("user-1", *FRIED_RICE)
+    index = index_of(doc)
+    assert ids(index.match(FULL_PANTRY, required=["Eggs "])) == [
+        str(doc["_id"])
+    ]
+    assert index.match(FULL_PANTRY, required=["chicken"]) == []
+
+
+def test_only_generated_recipes_with_enough_ingredients_are_indexed():
+    index = index_of(
+        recipe("user-1", *FRIED_RICE, source="reused"),
+        recipe("user-1", ("rice", 1, "cup"), ("eggs", 2, "whole")),
+    )
+    assert len(index) == 0
+
+
+def test_size_is_bounded_oldest_first():
+    index = SimilarRecipeIndex(max_size=2)
+    docs = [recipe("user-1", *FRIED_RICE) for _ in range(3)]
+    for doc in docs:
+        index.add(doc)
+    assert set(ids(index.match(FULL_PANTRY))) == {
+        str(doc["_id"]) for doc in docs[1:]
+    }
+
+
+PANTRY = [
+    {"name": "rice", "quantity": 2, "unit": "cup"},
+    {"name": "eggs", "quantity": 2, "unit": "cup"},
+    {"name": "onion", "quantity": 2, "unit": "cup"},
+]
+
+
+async def generate(client, headers, **body):
+    return await client.post("/recipes/generate", headers=headers,
+                             json={"ingredients": PANTRY} | body)
+
+
+async def test_generate_reuses_another_users_recipe(client, auth, llm):
+    first = await generate(client, auth("user-1"))
+    assert first.status_code == 201 and llm.calls == 1
+
+    r = await generate(client, auth("user-2"), reuse_similar=True)
+    assert r.status_code == 201
+    assert r.headers["x-reused-from"] == first.json()["id"]
+    assert r.json()["id"] != first.json()["id"]
+    assert r.json()["title"] == first.json()["title"]
+    assert llm.calls == 1
+
+    # the copy is not offered again, and the owner is never offered their own
+    r = await generate(client, auth("user-1"), reuse_similar=True)
+    assert "x-reused-from" not in r.headers
+
+
+async def test_edited_recipe_is_no_longer_reused(client, auth, llm,
+                                                 database):
+    first = (await generate(client, auth("user-1"))).json()
+    edit = {k: first[k] for k in ("title", "ingredients", "steps")}
+    r = await client.put(f"/recipes/{first['id']}", headers=auth("user-1"),
+                         json=edit | {"title": "My fried rice"})
+    assert r.status_code == 200
+    doc = await database.recipes.find_one({"_id": ObjectId(first["id"])})
+    assert doc["source"] == "edited"
+
+    r = await generate(client, auth("user-2"), reuse_similar=True)
+    assert r.status_code == 201
+    assert "x-reused-from" not in r.headers
@@ -0,0 +1,131 @@
+import time
+
+import jwt
+import pytest
+
+from loadtest import LocalSigner
+from services import tokenVerifier
+from services.tokenVerifier import (
+    SigningKeyCache, SigningKeyError, TokenVerificationError, TokenVerifier
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class CountingFetch:
+    def __init__(self, *cert_sets, max_age: int = 3600):
+        self.cert_sets = list(cert_sets)
+        self.max_age = max_age
+        self.calls = 0
+
+    def __call__(self):
+        certs = self.cert_sets[min(self.calls, len(self.cert_sets) - 1)]
+        self.calls += 1
+        return certs, self.max_age
+
+
+async def test_valid_token_gives_firebase_shaped_claims(signer, verifier):
+    claims = await verifier.verify(signer.token("user-1"))
+    assert claims["uid"] == claims["sub"] == "user-1"
+    assert claims["aud"] == signer.project_id
+
+
+async def test_verified_token_is_cached_until_exp(signer, verifier,
+                                                  monkeypatch):
+    decoded = []
+    decode = verifier._decode
+    monkeypatch.setattr(verifier, "_decode",
+                        lambda *a: decoded.append(1) or decode(*a))
+    token = signer.token("user-1")
+    await verifier.verify(token)
+    await verifier.verify(token)
+    assert len(decoded) == 1
+
+    # Past exp the cached result is dropped and the token checked again
+    later = time.time() + 7200
+    monkeypatch.setattr(tokenVerifier.time, "time", lambda: later)
+    await verifier.verify(token)
+    assert len(decoded) == 2
+
+
+@pytest.mark.parametrize("claims", [
+    {"aud": "another-project"},
+    {"iss": "https://securetoken.google.com/another-project"},
+    {"exp": 1000},
+    {"sub": ""},
+    {"auth_time": int(time.time()) + 3600},
+])
+async def test_rejects_bad_claims(signer, verifier, claims):
+    with pytest.raises(TokenVerificationError):
+        await verifier.verify(signer.token("user-1", **claims))
+
+
+async def test_rejects_tokens_not_signed_with_rs256(verifier):
+    token = jwt.encode({"sub": "user-1"}, "x" * 32, algorithm="HS256",
+                       headers={"kid": "loadtest-key"})
+    with pytest.raises(TokenVerificationError):
+        await verifier.verify(token)
+    with pytest.raises(TokenVerificationError):
+        await verifier.verify("not a token")
+
+
+async def test_rejects_token_signed_by_another_key(signer):
+    other = LocalSigner(signer.project_id)
+    verifier = TokenVerifier(
+        project_id=signer.project_id,
+        keys=SigningKeyCache(fetch=CountingFetch(
+            {"loadtest-key": other.cert_pem}
+        )),
+    )
+    with pytest.raises(TokenVerificationError):
+        await verifier.verify(signer.token("user-1"))
+
+
+async def test_unknown_kid_refetches_rotated_keys(signer, monkeypatch):
+    monkeypatch.setattr(tokenVerifier, "MIN_FORCED_REFRESH_INTERVAL", 0)
+    fetch = CountingFetch(
+        {"old-key": signer.cert_pem},
+        {"old-key": signer.cert_pem, "loadtest-key": signer.cert_pem},
+    )
+    verifier = TokenVerifier(project_id=signer.project_id,
+                             keys=SigningKeyCache(fetch=fetch))
+    claims = await verifier.verify(signer.token("user-1"))
+    assert claims["uid"] == "user-1"
+    assert fetch.calls == 2
+
+
+async def test_unknown_kid_refetch_is_rate_limited(signer):
+    fetch = CountingFetch({"old-key": signer.cert_pem})
+    verifier = TokenVerifier(project_id=signer.project_id,
+                             keys=SigningKeyCache(fetch=fetch))
+    for _ in range(3):
+        with pytest.raises(TokenVerificationError):
+            await verifier.verify(signer.token("user-1"))
+    assert fetch.calls == 1
+
+
+async def test_keys_near_expiry_refresh_in_the_background(signer):
+    fetch = CountingFetch({"loadtest-key": signer.cert_pem}, max_age=60)
+    keys = SigningKeyCache(fetch=fetch, refresh_ahead=300)
+    await keys.refresh()
+    await keys.get_key("loadtest-key")  # served at once, refresh started
+    await keys._background
+    assert fetch.calls == 2
+
+
+async def test_fetch_failure_is_a_signing_key_error(signer):
+    def fail():
+        raise OSError("network down")
+
+    verifier = TokenVerifier(project_id=signer.project_id,
+                             keys=SigningKeyCache(fetch=fail))
+    with pytest.raises(SigningKeyError):
+        await verifier.verify(signer.token("user-1"))
+
+
+async def test_route_auth(client, auth):
+    r = await client.get("/recipes/", headers=auth("user-1"))
+    assert r.status_code == 200
+    r = await client.get("/recipes/",
+                         headers={"Authorization": "Bearer nope"})
+    assert r.status_code == 401
@@ -0,0 +1,67 @@
+import pytest
+
+from services.units import (
+    TO_TASTE, UNITS, canonical_fields, dimension_of, from_base, merge_amounts,
+    normalize_unit, to_base, with_canonical,
+)
+
+
+@pytest.mark.parametrize("unit", sorted(UNITS))
+@pytest.mark.parametrize("quantity", [0.25, 1.5, 12.5])
+def test_to_base_and_back(unit, quantity):
+    base_qty, _ = to_base(quantity, unit)
+    assert from_base(base_qty, unit) == pytest.approx(quantity, abs=1e-3)
+
+
+@pytest.mark.parametrize("unit, expected", [
+    ("Cups", (473.176, "ml")),
+    ("tbsp.", (29.5736, "ml")),
+    ("fluid ounces", (59.147, "ml")),
+    ("lbs", (907.184, "g")),
+    ("whole", (2.0, "each")),
+    ("cloves", (2.0, "clove")),
+    ("handfulls", (2.0, "handfulls")),  # unknown: counts as itself
+])
+def test_to_base_normalizes_the_unit(unit, expected):
+    assert to_base(2, unit) == expected
+
+
+def test_from_base_rounds_conversion_noise():
+    assert from_base(to_base(1.5, "cup")[0], "cup") == 1.5
+    assert from_base(354.882, "cup") == 1.5
+    assert from_base(7, "sprigs") == 7.0
+
+
+def test_dimensions():
+    assert dimension_of("TSP") == "volume"
+    assert dimension_of("kg") == "mass"
+    assert dimension_of("each") == "count"
+    assert dimension_of("to taste") is None
+    assert normalize_unit("Fl.  Oz") == "fl oz"
+
+
+def doc(name, quantity, unit):
+    return with_canonical({"name": name, "quantity": quantity, "unit": unit})
+
+
+def test_merge_keeps_the_first_unit():
+    a, b = doc("Milk", 1, "cup"), doc("milk", 250, "ml")
+    merged = merge_amounts(a, b)
+    assert merged["unit"] == "cup"
+    assert merged["base_qty"] == pytest.approx(486.588)
+    assert merged["quantity"] == 2.057
+    # neither argument is modified
+    assert (a["quantity"], b["quantity"]) == (1, 250)
+
+    back = merge_amounts(b, a)
+    assert back["unit"] == "ml"
+    assert back["quantity"] == pytest.approx(486.588)
+
+
+def test_to_taste_items_merge_without_amounts():
+    salt = doc("salt", 0, "To Taste")
+    assert (salt["base_qty"], salt["base_unit"]) == (0.0, TO_TASTE)
+    assert merge_amounts(salt, doc("Salt", 0, TO_TASTE)) == salt
+    assert canonical_fields("Salt ", 5, TO_TASTE) == {
+        "name_key": "salt", "base_qty": 0.0, "base_unit": TO_TASTE,
+    }